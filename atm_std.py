@@ -8,15 +8,9 @@
 
 
 from __future__ import unicode_literals
-from matplotlib.pyplot import *
-import control 
-from control.matlab import *
 from math import *
-from scipy.interpolate import interp1d
-from pylab import *
-from matplotlib.widgets import Slider
+import os
 import numpy as np
-import scipy.interpolate
 
 # acclération de la pesanteur (m/s^2) 
 g0=9.81
@@ -26,32 +20,41 @@ Rayon_terre=6370e3
 ft=0.3048
 
 deg=pi/180.0
-ussa76ut86=np.loadtxt('ussa76ut86.txt')
-#    1            2 3 4  5                6             7                           8
-# altitude (km)          temperature (K)  Pression (Pa) masse volumique (kg/m^3)  vitesse du son (m/s)
-
-
-
-
-geoaltus76=ussa76ut86[:,0]*1000.0
 # earth radius for geopotential altitude calculation
 RE=6356000
 # rayon moyen de la Terre (m)
 R0=6356.766*1000
 
-altus76=RE*geoaltus76/(RE+geoaltus76)
-Tus76=ussa76ut86[:,4]
-Pus76=ussa76ut86[:,5]
-rhous76=ussa76ut86[:,6]
-aus76=ussa76ut86[:,7]
+# table ussa76ut86 chargée au premier appel de get_cte_atm (pas d'E/S à l'import)
+_table=None
+
 
-# densité de l'air (kg/m**3) 	
-rhoInterp=scipy.interpolate.interp1d(altus76,rhous76)
-# vitesse du son (m/s)
-aInterp=scipy.interpolate.interp1d(altus76,aus76)
+def load_table():
+    global _table
+    if _table is None:
+        import scipy.interpolate
+        path=os.path.join(os.path.dirname(os.path.abspath(__file__)),'ussa76ut86.txt')
+        if not os.path.exists(path):
+            path='ussa76ut86.txt'
+        ussa76ut86=np.loadtxt(path)
+        #    1            2 3 4  5                6             7                           8
+        # altitude (km)          temperature (K)  Pression (Pa) masse volumique (kg/m^3)  vitesse du son (m/s)
+        geoaltus76=ussa76ut86[:,0]*1000.0
+        altus76=RE*geoaltus76/(RE+geoaltus76)
+        Tus76=ussa76ut86[:,4]
+        Pus76=ussa76ut86[:,5]
+        rhous76=ussa76ut86[:,6]
+        aus76=ussa76ut86[:,7]
+        # densité de l'air (kg/m**3) 	
+        rhoInterp=scipy.interpolate.interp1d(altus76,rhous76)
+        # vitesse du son (m/s)
+        aInterp=scipy.interpolate.interp1d(altus76,aus76)
+        _table=(geoaltus76,altus76,Tus76,Pus76,rhous76,aus76,rhoInterp,aInterp)
+    return _table
 
 
 def get_cte_atm(z):
+    geoaltus76,altus76,Tus76,Pus76,rhous76,aus76,rhoInterp,aInterp=load_table()
     # altitude géopotentielle (m)
     hgeo=R0*z/(R0+z)
     # densité de l'air à l'altitude courante (kg/m**3)
@@ -61,6 +64,8 @@ def get_cte_atm(z):
     return hgeo,rho,a
 
 if(0):
+    from pylab import *
+    geoaltus76,altus76,Tus76,Pus76,rhous76,aus76,rhoInterp,aInterp=load_table()
     #rc('text', usetex=False)
     figure(1)
     plot(altus76,rhous76,'b',geoaltus76,rhous76,'r:',lw=2)
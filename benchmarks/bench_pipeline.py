@@ -0,0 +1,357 @@
+'''
+Benchmark suite of the autopilot pipeline: every stage, from the trim to the figures, is timed at several batch sizes
+(number of flight conditions, systems or responses handled) and the results are saved as JSON to compare commits.
+
+    python benchmarks/bench_pipeline.py --batches 1,10,100 --output benchmarks/results/current.json
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/baseline.json
+
+The disk cache is disabled, so every stage is really computed. Stages running one item at a time report the time of
+the whole batch, the batched stages (envelope trim, gamma_max_batch, washout_sweep, step_metrics) handle the batch in one call.
+'''
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+from src.aircraft.envelope import EnvelopeStability
+from src.autopilot.autopilot import AutoPilot, DEFAULT_GAINS
+from src.autopilot.root_finding import RootFinding, gamma_max_batch
+from src.autopilot.state_space import StateSpace
+from src.autopilot.washout import WashoutDesign
+from src.flight_dynamics.Phugoid import Phugoid
+from src.flight_dynamics.ShortPeriod import ShortPeriod
+from src.flight_dynamics.frequency import loop_responses
+from src.flight_dynamics.simulation import simulator
+from src.flight_dynamics.step_metrics import step_info, step_metrics
+from src.misc.cache import cache
+from src.misc.figures import rendering
+from src.misc.report_generator import GenerateReport
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+
+def flight_conditions(n):
+    '''
+    :return: n (Mach, altitude) pairs spread over the envelope around the study point
+    '''
+    rng = np.random.default_rng(0)
+    return rng.uniform(0.6, 0.9, n), rng.uniform(3000, 9000, n)
+
+
+def trimmed(mach, altitude):
+    aircraft = AircraftStability(mach, altitude)
+    aircraft.compute_equilibrium()
+    return aircraft
+
+
+def pipeline(mach, altitude):
+    '''
+    :return: every intermediate result of main.py for one flight condition
+    '''
+    aircraft = trimmed(mach, altitude)
+    model = StateSpaceModel(aircraft)
+    A, B, C, D, eigen_values = model.model()
+    sys_, damping = model.control()
+    auto_pilot = AutoPilot(A, B)
+    q = auto_pilot.compute_q_feedback()
+    gamma = auto_pilot.compute_gamma_feedback(*q[:4])
+    z = auto_pilot.compute_z_feedback(*gamma[:4])
+    return {'aircraft': aircraft, 'model': model, 'A': A, 'B': B, 'C': C, 'D': D, 'eigen_values': eigen_values,
+            'sys': sys_, 'damping': damping, 'auto_pilot': auto_pilot, 'q': q, 'gamma': gamma, 'z': z}
+
+
+# every stage builds its inputs for a batch and returns the call to time
+def stage_compute_equilibrium(n):
+    mach, altitude = flight_conditions(n)
+    return lambda: [trimmed(m, h) for m, h in zip(mach, altitude)]
+
+
+def stage_envelope_equilibrium(n):
+    mach, altitude = flight_conditions(n)
+    return lambda: EnvelopeStability(AircraftStability.p, mach, altitude).compute_equilibrium()
+
+
+def stage_envelope_equilibrium_newton(n):
+    mach, altitude = flight_conditions(n)
+    return lambda: EnvelopeStability(AircraftStability.p, mach, altitude).compute_equilibrium_newton()
+
+
+def stage_state_space_model(n):
+    aircraft = [trimmed(m, h) for m, h in zip(*flight_conditions(n))]
+    return lambda: [StateSpaceModel(a).model() for a in aircraft]
+
+
+def stage_state_space_control(n):
+    models = [StateSpaceModel(trimmed(m, h)) for m, h in zip(*flight_conditions(n))]
+    for model in models:
+        model.model()
+    return lambda: [model.control() for model in models]
+
+
+def stage_short_period_tf(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    periods = [ShortPeriod(r['A'], r['B']) for r in runs]
+    return lambda: [(s.compute_tf(), s.compute_tf_q(), s.compute_dcgain(), s.compute_damp()) for s in periods]
+
+
+def stage_phugoid_tf(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    phugoids = [Phugoid(r['A'], r['B']) for r in runs]
+    return lambda: [(p.compute_tf(), p.compute_tf_g(), p.compute_dcgain(), p.compute_damp()) for p in phugoids]
+
+
+def stage_q_feedback(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    return lambda: [r['auto_pilot'].compute_q_feedback() for r in runs]
+
+
+def stage_gamma_feedback(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    return lambda: [r['auto_pilot'].compute_gamma_feedback(*r['q'][:4]) for r in runs]
+
+
+def stage_z_feedback(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    return lambda: [r['auto_pilot'].compute_z_feedback(*r['gamma'][:4]) for r in runs]
+
+
+def stage_loops_state_space(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    pilots = [AutoPilot(r['A'], r['B'], state_space=True) for r in runs]
+
+    def loops(auto_pilot):
+        q = auto_pilot.compute_q_feedback()
+        gamma = auto_pilot.compute_gamma_feedback(*q[:4])
+        return auto_pilot.compute_z_feedback(*gamma[:4])
+
+    return lambda: [loops(auto_pilot) for auto_pilot in pilots]
+
+
+def _gamma_loop(run):
+    import control
+    return control.ss(*run['gamma'][:4])
+
+
+def stage_root_finding_newton(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    finders = [RootFinding(_gamma_loop(r), 0.17) for r in runs]
+    return lambda: [f.newton(f.saturation, f.derivative) for f in finders]
+
+
+def stage_gamma_max_batch(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    A, B, C, D = (np.stack([r['gamma'][i] for r in runs]) for i in range(4))
+    t = np.arange(0, 10, 0.01)
+    return lambda: gamma_max_batch(A, B, C, D, [0.17], t)
+
+
+def stage_loop_margins(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    A = np.stack([np.asarray(r['A'])[1:, 1:] for r in runs])
+    B = np.stack([np.asarray(r['B'])[1:] for r in runs])
+    w = np.logspace(-3, 3, 2000)
+    return lambda: loop_responses(A, B, DEFAULT_GAINS, w)
+
+
+def stage_washout_sweep(n):
+    # n washout time constants of one flight condition, simulated in one batch
+    run = pipeline(*(x[0] for x in flight_conditions(1)))
+    short_period = ShortPeriod(run['A'], run['B'])
+    TqDm_ss = StateSpace(short_period.As, short_period.Bs, short_period.Csq, short_period.Ds)
+    auto_pilot = run['auto_pilot']
+    design = WashoutDesign(auto_pilot.A, auto_pilot.B, TqDm_ss, auto_pilot.Kr)
+    taus = np.linspace(0.1, 5.0, n)
+    return lambda: design.sweep(taus)
+
+
+def _responses(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    t = np.arange(0, 10, 0.01)
+    Y = np.stack([simulator.step(*r['gamma'][:4], t)[:, 0, 0] for r in runs])
+    return t, Y
+
+
+def stage_step_info(n):
+    t, Y = _responses(n)
+    return lambda: [step_info(t, y) for y in Y]
+
+
+def stage_step_metrics(n):
+    t, Y = _responses(n)
+    return lambda: step_metrics(t, Y)
+
+
+def stage_report_write(n):
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    reports = [GenerateReport(r['A'], r['B'], r['C'], r['D'], r['eigen_values'], r['damping'], r['sys']) for r in runs]
+    output_dir = tempfile.mkdtemp(prefix='bench-report-')
+    return lambda: [report.write(f"report-{i}", output_dir, force=True) for i, report in enumerate(reports)]
+
+
+def figure_render(n, fast):
+    # phugoid figures, the longest responses (7000 samples per curve), rendered the same way by both stages so that
+    # they only differ by the rendering mode
+    runs = [pipeline(m, h) for m, h in zip(*flight_conditions(n))]
+    data = [Phugoid(r['A'], r['B']).responses() for r in runs]
+    output_dir = tempfile.mkdtemp(prefix='bench-figure-')
+
+    def render():
+        rendering.fast = fast
+        try:
+            return [Phugoid.render(d, output_dir=output_dir, show=False) for d in data]
+        finally:
+            rendering.fast = False
+
+    return render
+
+
+def stage_figure_render(n):
+    return figure_render(n, fast=False)
+
+
+def stage_figure_render_fast(n):
+    return figure_render(n, fast=True)
+
+
+# name: (setup, largest batch worth running or None)
+STAGES = {
+    'compute_equilibrium': (stage_compute_equilibrium, None),
+    'envelope_equilibrium': (stage_envelope_equilibrium, None),
+    'envelope_equilibrium_newton': (stage_envelope_equilibrium_newton, None),
+    'state_space_model': (stage_state_space_model, None),
+    'state_space_control': (stage_state_space_control, None),
+    'short_period_tf': (stage_short_period_tf, None),
+    'phugoid_tf': (stage_phugoid_tf, None),
+    'q_feedback': (stage_q_feedback, None),
+    'gamma_feedback': (stage_gamma_feedback, None),
+    'z_feedback': (stage_z_feedback, None),
+    'loops_state_space': (stage_loops_state_space, None),
+    'root_finding_newton': (stage_root_finding_newton, 100),
+    'gamma_max_batch': (stage_gamma_max_batch, None),
+    'loop_margins': (stage_loop_margins, None),
+    'washout_sweep': (stage_washout_sweep, None),
+    'step_info': (stage_step_info, None),
+    'step_metrics': (stage_step_metrics, None),
+    'report_write': (stage_report_write, 10),
+    'figure_render': (stage_figure_render, 10),
+    'figure_render_fast': (stage_figure_render_fast, 10),
+}
+
+
+def measure(setup, n, repeat):
+    '''
+    :return: durations (s) of repeat runs of the stage on a batch of n items
+    '''
+    run = setup(n)
+    run()  # warm up (lazy imports, discretization cache)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    '''
+    Print the ratio of every stage to the baseline
+    :return: number of regressions, i.e. stages slower than the baseline by more than the tolerance
+    '''
+    with open(baseline_path) as f:
+        baseline = {(r['stage'], r['batch']): r for r in json.load(f)['results']}
+    regressions = 0
+    print(f"------------------- Comparison with {baseline_path} -------------------")
+    for r in results:
+        reference = baseline.get((r['stage'], r['batch']))
+        if reference is None:
+            continue
+        ratio = r['best'] / reference['best']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{r['stage']:>22} x{r['batch']:<5} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the autopilot pipeline")
+    parser.add_argument('--batches', default='1,10,100', help="comma separated batch sizes")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage and batch size")
+    parser.add_argument('--stages', default=None, help="comma separated stages (default: all)")
+    parser.add_argument('--output', default=None, help="JSON file (default: benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument('--compare', default=None, help="JSON file of a previous run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    cache.enabled = False
+    batches = [int(batch) for batch in args.batches.split(',')]
+    stages = list(STAGES) if args.stages is None else args.stages.split(',')
+    for stage in stages:
+        if stage not in STAGES:
+            raise Exception(f"Unknown stage {stage}, available stages: {', '.join(STAGES)}")
+
+    results = []
+    for stage in stages:
+        setup, max_batch = STAGES[stage]
+        for n in batches:
+            if max_batch is not None and n > max_batch:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                durations = measure(setup, n, args.repeat)
+            result = {'stage': stage, 'batch': n, 'best': min(durations), 'mean': float(np.mean(durations)),
+                      'per_item': min(durations) / n, 'durations': durations}
+            results.append(result)
+            print(f"{stage:>22} x{n:<5} best {result['best'] * 1e3:10.3f} ms, "
+                  f"per item {result['per_item'] * 1e6:10.1f} µs")
+
+    run = {
+        'commit': commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.date.today().isoformat()}-{run['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare is not None and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
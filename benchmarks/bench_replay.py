@@ -0,0 +1,119 @@
+'''
+Throughput benchmark of TelemetryReplay: a synthetic flight-test log (altitude commands through the closed z loop, or
+elevator doublets through the aircraft alone, plus sensor noise) is written chunk by chunk to a .npy or .csv file, then
+replayed through the same model. The residual std must match the noise, and the memory traced during the replay stays
+that of a few chunks whatever the length of the log.
+
+    python benchmarks/bench_replay.py --samples 5000000 --formats npy,csv --chunk-size 65536
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+from src.autopilot.autopilot import AutoPilot
+from src.autopilot.gain_schedule import design_gains
+from src.autopilot.replay import TelemetryLog, TelemetryReplay
+
+TRIM_ALTITUDE = 5000.0
+
+
+def replay_model(model, dt, block):
+    with contextlib.redirect_stdout(io.StringIO()):
+        aircraft = AircraftStability()
+        aircraft.compute_equilibrium()
+        A, B, C, D, eigen_values = StateSpaceModel(aircraft).model()
+        # gains designed at this trim, the closed loop of the default gains is not stable here
+        auto_pilot = AutoPilot(A, B, gains=design_gains(A[1:, 1:], B[1:]), state_space=True)
+        if model == 'open':
+            return TelemetryReplay.open_loop(auto_pilot, dt, offsets={'altitude': TRIM_ALTITUDE}, block=block)
+        Aq, Bq, Cq, Dq = auto_pilot.compute_q_feedback()[:4]
+        Agamma, Bgamma, Cgamma, Dgamma = auto_pilot.compute_gamma_feedback(Aq, Bq, Cq, Dq)[:4]
+        Az, Bz, Cz, Dz = auto_pilot.compute_z_feedback(Agamma, Bgamma, Cgamma, Dgamma)[:4]
+    return TelemetryReplay.closed_loop(Az, Bz, Cz, Dz, dt, offsets={'altitude': TRIM_ALTITUDE, 'z_c': TRIM_ALTITUDE},
+                                       block=block)
+
+
+def write_log(replay, path, n_samples, chunk_size, noise, hold, seed=0):
+    '''
+    Simulate the model chunk by chunk and write inputs and noisy outputs, never holding the whole log
+    :param hold: number of samples an input value is held
+    '''
+    rng = np.random.default_rng(seed)
+    columns = replay.inputs + replay.outputs
+    replay.reset()
+    array = np.lib.format.open_memmap(path, mode='w+', shape=(n_samples, len(columns))) \
+        if path.endswith('.npy') else None
+    with contextlib.ExitStack() as stack:
+        if array is None:
+            f = stack.enter_context(open(path, 'w'))
+            f.write(','.join(columns) + '\n')
+        for start in range(0, n_samples, chunk_size):
+            n = min(chunk_size, n_samples - start)
+            steps = rng.normal(0.0, 0.01 if replay.inputs[0] == 'elevator' else 50.0, n // hold + 2)
+            # held values, doublets for the elevator so that the open loop does not drift away
+            u = np.repeat(steps, hold)[(start % hold):(start % hold) + n]
+            if replay.inputs[0] == 'elevator':
+                u = u * np.where((np.arange(start, start + n) // hold) % 2, -1.0, 1.0)
+            y = replay.predict(u[:, None]) + rng.normal(0.0, noise, (n, len(replay.outputs)))
+            chunk = np.column_stack((u, y)) + replay.offsets
+            if array is None:
+                np.savetxt(f, chunk, delimiter=',', fmt='%.10g')
+            else:
+                array[start:start + n] = chunk
+    if array is not None:
+        array.flush()
+        del array
+    replay.reset()
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the streaming telemetry replay")
+    parser.add_argument('--samples', type=int, default=5_000_000, help="number of samples of the log")
+    parser.add_argument('--formats', default='npy,csv', help="comma separated log formats: npy, csv")
+    parser.add_argument('--model', choices=('closed', 'open'), default='closed',
+                        help="closed z loop (command z_c) or aircraft alone (elevator)")
+    parser.add_argument('--rate', type=float, default=100.0, help="sample rate of the log (Hz)")
+    parser.add_argument('--chunk-size', type=int, default=1 << 16, help="samples per chunk")
+    parser.add_argument('--block', type=int, default=128, help="samples propagated together")
+    parser.add_argument('--noise', type=float, default=1e-3, help="std of the sensor noise added to the outputs")
+    args = parser.parse_args()
+
+    replay = replay_model(args.model, 1 / args.rate, args.block)
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in args.formats.split(','):
+            path = os.path.join(directory, f'log.{extension}')
+            columns = write_log(replay, path, args.samples, args.chunk_size, args.noise, hold=int(5 * args.rate))
+            log = TelemetryLog(path, columns=columns if extension == 'npy' else None)
+
+            start = time.perf_counter()
+            stats = replay.run(log, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - start
+            replay.reset()
+            # the memory is traced on a second run, tracemalloc slows the csv parsing down by an order of magnitude
+            tracemalloc.start()
+            replay.run(log, chunk_size=args.chunk_size)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            replay.reset()
+
+            size = os.path.getsize(path) / 2 ** 20
+            print(f"{extension}: {args.samples} samples ({size:.0f} MiB) in {elapsed:.2f} s, "
+                  f"{args.samples / elapsed / 1e6:.2f} M samples/s, peak memory {peak / 2 ** 20:.1f} MiB")
+            for name, residual in stats.items():
+                print(f"    {name:>8}: residual mean {residual['mean']:+.2e}, std {residual['std']:.3e} "
+                      f"(noise {args.noise:.1e}), max |r| {residual['max_abs']:.2e}")
+
+
+if __name__ == '__main__':
+    main()
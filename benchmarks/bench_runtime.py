@@ -0,0 +1,81 @@
+'''
+Latency benchmark of DiscreteAutoPilot.tick(): the controller flies the linearized aircraft (discretized with a
+zero-order hold at the controller rate) through a flight path angle step, every tick being timed on its own. The memory
+traced over the ticks shows that the hot path keeps nothing allocated.
+
+    python benchmarks/bench_runtime.py --rates 100,1000 --duration 20
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+from src.autopilot.runtime import DiscreteAutoPilot
+from src.flight_dynamics.simulation import simulator
+
+
+def reduced_model():
+    with contextlib.redirect_stdout(io.StringIO()):
+        aircraft = AircraftStability()
+        aircraft.compute_equilibrium()
+        A, B, C, D, eigen_values = StateSpaceModel(aircraft).model()
+    return A[1:, 1:], B[1:]
+
+
+def run(A, B, rate, duration, washout_tau):
+    '''
+    :return: duration of every tick (µs), flight path angle at the end (rad), net memory allocated by the ticks (bytes)
+    '''
+    autopilot = DiscreteAutoPilot(rate=rate, washout_tau=washout_tau)
+    autopilot.set_command(gamma_c=0.01)
+    Ad, Bd = simulator.discretize(A, B, autopilot.dt)
+    n_ticks = int(duration * rate)
+
+    x = np.zeros(A.shape[0])
+    ticks = np.empty(n_ticks)
+    clock = time.perf_counter_ns
+    for k in range(n_ticks):
+        measurements = x.tolist()
+        start = clock()
+        delta_m = autopilot.tick(measurements)
+        ticks[k] = clock() - start
+        x = Ad @ x + Bd[:, 0] * delta_m
+
+    # same measurements over and over, only the controller allocates here
+    measurements = x.tolist()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(n_ticks):
+        autopilot.tick(measurements)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return ticks / 1000, x[0], allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per tick cost of the discrete autopilot")
+    parser.add_argument('--rates', default='100,1000', help="comma separated controller rates (Hz)")
+    parser.add_argument('--duration', type=float, default=20.0, help="simulated time (s)")
+    parser.add_argument('--washout-tau', type=float, default=0.0,
+                        help="time constant (s) of the washout filter on q (0.7 in AutoPilot), 0 to disable")
+    args = parser.parse_args()
+
+    A, B = reduced_model()
+    for rate in (float(rate) for rate in args.rates.split(',')):
+        ticks, gamma, allocated = run(A, B, rate, args.duration, args.washout_tau or None)
+        p50, p99 = np.percentile(ticks, [50, 99])
+        print(f"{rate:7.0f} Hz: {len(ticks)} ticks, mean {ticks.mean():.2f} µs, p50 {p50:.2f} µs, "
+              f"p99 {p99:.2f} µs, max {ticks.max():.2f} µs, jitter (std) {ticks.std():.2f} µs, "
+              f"𝛾(end) = {gamma:.4f} rad, memory kept by the ticks {allocated} B")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Startup benchmark of the compute path: a fresh interpreter imports the aircraft model, trims it and builds the state
+space model once, as a short-lived worker process would. The legacy run imports sisopy31 first, which is what every
+compute import used to cost (matplotlib, pylab and python-control at import time).
+
+    python benchmarks/bench_startup.py --repeat 5
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import contextlib, io, json, sys, time
+t0 = time.perf_counter()
+{preload}
+from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    aircraft = AircraftStability()
+    aircraft.compute_equilibrium()
+    StateSpaceModel(aircraft).model()
+t2 = time.perf_counter()
+heavy = [name for name in ('matplotlib.pyplot', 'control', 'reportlab', 'scipy.interpolate') if name in sys.modules]
+print(json.dumps({{'import': t1 - t0, 'compute': t2 - t1, 'loaded': heavy}}))
+'''
+
+SCENARIOS = {
+    'compute': '',
+    'legacy': 'import sisopy31',
+}
+
+
+def run(scenario):
+    '''
+    :param scenario: key of SCENARIOS
+    :return: wall time of the whole process (s), import and compute times measured inside it, heavy modules loaded
+    '''
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', WORKER.format(preload=SCENARIOS[scenario])], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the compute-only import path")
+    parser.add_argument('--repeat', type=int, default=5, help="number of fresh processes per scenario")
+    args = parser.parse_args()
+
+    best = {}
+    for scenario in SCENARIOS:
+        runs = [run(scenario) for _ in range(args.repeat)]
+        best[scenario] = min(runs, key=lambda r: r['process'])
+        r = best[scenario]
+        print(f"{scenario:>8}: process {r['process']:.3f} s, import {r['import']:.3f} s, "
+              f"trim + model {r['compute']:.3f} s, heavy modules loaded: {', '.join(r['loaded']) or 'none'}")
+    print(f"compute path takes {best['compute']['process'] / best['legacy']['process']:.0%} of the legacy startup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import argparse
+
+from src.autopilot.fleet import FleetAnalysis, read_fleet
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Autopilot design pipeline over a fleet of aircraft definitions")
+    parser.add_argument('fleet', help="directory of aircraft definitions (.json), or manifest listing them (one name "
+                                      "or path per line, or a json list)")
+    parser.add_argument('--output-dir', default='fleet_results',
+                        help="directory of the summary table and of the per-aircraft artifacts "
+                             "(default: fleet_results)")
+    parser.add_argument('--formats', default='csv', help="comma separated summary formats: csv, parquet (needs "
+                                                         "pandas and pyarrow) (default: csv)")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument('--design-gains', action='store_true',
+                        help="tune the gains of each aircraft instead of using the default gains of AutoPilot")
+    parser.add_argument('--xispec', type=float, default=0.7, help="damping ratio of the tuned loops (default: 0.7)")
+    parser.add_argument('--force', action='store_true',
+                        help="analyse every aircraft again instead of resuming from the previous run")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    formats = tuple(fmt.strip() for fmt in args.formats.split(',') if fmt.strip())
+    if 'parquet' in formats:
+        # fail before the analysis rather than after it
+        import pandas
+        import pyarrow
+
+    fleet = FleetAnalysis(read_fleet(args.fleet), args.output_dir, design_gains=args.design_gains, xispec=args.xispec)
+    fleet.run(max_workers=args.workers, force=args.force)
+    fleet.summary(formats)
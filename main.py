@@ -1,81 +1,137 @@
+import argparse
 import warnings
+
+import matplotlib
+import numpy as np
+
 from src.aircraft.aircraft import AircraftStability, StateSpaceModel
 from src.flight_dynamics.Phugoid import Phugoid
 from src.flight_dynamics.ShortPeriod import ShortPeriod
 from src.autopilot.autopilot import AutoPilot
-from src.misc.report_generator import GenerateReport
-
-if __name__ == '__main__':
-    aircraft = AircraftStability()
-    alpha_eq = aircraft.compute_equilibrium()
-
-    model = StateSpaceModel(aircraft)
-    A, B, C, D, eigen_values = model.model()
-
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=RuntimeWarning)
-        sys, damping = model.control()
+from src.autopilot.state_space import StateSpace
+from src.misc.report_generator import GenerateReport, write_reports
+from src.misc.figures import render_all, rendering
+from src.misc.cache import cache
+from src.misc.tracing import tracer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mirage III autopilot design")
+    parser.add_argument('--headless', action='store_true',
+                        help="non-interactive run: compute every response first, then render and save all the "
+                             "figures in parallel with the Agg backend")
+    parser.add_argument('--output-dir', default=None, help="directory of the figures (default: src/misc/plots)")
+    parser.add_argument('--formats', default='png', help="comma separated figure formats (default: png)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of rendering and report processes (default: all cores)")
+    parser.add_argument('--cache', action='store_true',
+                        help="read and store the trim, models and loops in the disk cache (also on with "
+                             "AUTOPILOT_CACHE=1); entries are keyed on the inputs and the cached method only, clear "
+                             "the cache after editing the code they depend on")
+    parser.add_argument('--cache-dir', default=None,
+                        help="directory of the disk cache (default: $AUTOPILOT_CACHE_DIR or the user cache directory)")
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help="time every stage, save a Chrome/Perfetto trace to PATH and print a summary table")
+    parser.add_argument('--fast-render', action='store_true',
+                        help="draw the glow of the curves as one collection, decimate long responses to the extrema "
+                             "of each pixel column and reuse the figures: same looking figures, rendered faster")
+    parser.add_argument('--force-reports', action='store_true',
+                        help="rebuild the reports even when their inputs did not change")
+    return parser.parse_args()
 
 
-
-    # ------------------- Generate report -------------------
-    write = GenerateReport(A, B, C, D, eigen_values, damping, sys)
-    write.write("aircraft-report")
-    # --------------------------------------------------------
+if __name__ == '__main__':
+    args = parse_args()
+    # printing precision of the matrices in the console and the reports (formerly a side effect of importing sisopy31)
+    np.set_printoptions(precision=4, suppress=True)
+    formats = tuple(fmt.strip() for fmt in args.formats.split(',') if fmt.strip())
+    if args.headless:
+        matplotlib.use('Agg')
+    cache.enabled = cache.enabled or args.cache
+    if args.cache_dir:
+        cache.directory = args.cache_dir
+    rendering.fast = args.fast_render
+    if args.trace:
+        tracer.enable()
+
+    # in headless mode the figures are only described here and rendered at the end
+    figures = []
+
+    def plot(render, data):
+        if args.headless:
+            figures.append((render, data))
+        else:
+            render(data, output_dir=args.output_dir, formats=formats)
+
+    with tracer.span("trim and state space model", 'main'):
+        aircraft = AircraftStability()
+        alpha_eq = aircraft.compute_equilibrium()
+
+        model = StateSpaceModel(aircraft)
+        A, B, C, D, eigen_values = model.model()
+
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=RuntimeWarning)
+            sys, damping = model.control()
+
+    # reports are written together at the end, only when their inputs changed
+    reports = [(GenerateReport(A, B, C, D, eigen_values, damping, sys), "aircraft-report")]
 
     # ------------------- Short Period Response -------------------
-    short_period = ShortPeriod(A, B)
-    print(short_period.__str__())
-    short_period.plot()
-    TqDm_tf = short_period.compute_tf_q()
+    with tracer.span("short period", 'main'):
+        short_period = ShortPeriod(A, B)
+        print(short_period.__str__())
+        plot(short_period.render, short_period.responses())
+        TqDm_ss = StateSpace(short_period.As, short_period.Bs, short_period.Csq, short_period.Ds)
     # --------------------------------------------------------
 
     # ------------------- Phugoid Response -------------------
-    phugoid = Phugoid(A, B)
-    print(phugoid.__str__())
-    phugoid.plot()
+    with tracer.span("phugoid", 'main'):
+        phugoid = Phugoid(A, B)
+        print(phugoid.__str__())
+        plot(phugoid.render, phugoid.responses())
     # --------------------------------------------------------
 
     # ------------------- Auto Pilot -------------------
-    auto_pilot = AutoPilot(A, B)
+    # the loops stay in state space form, away from the ill-conditioned transfer function conversions
+    auto_pilot = AutoPilot(A, B, state_space=True)
 
-    # q feedback
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=RuntimeWarning)
-        Aq, Bq, Cq, Dq, eigen_q, damping_q, freq_q, closed_tf_ss_q = auto_pilot.compute_q_feedback()
+    with tracer.span("autopilot loops", 'main'):
+        # q feedback
+        Aq, Bq, Cq, Dq, eigen_q, damping_q, freq_q, closed_ss_q = auto_pilot.compute_q_feedback()
 
-    auto_pilot.plot_q_feedback(closed_tf_ss_q)
-    auto_pilot.plot_q_open_closed_loop(TqDm_tf)
+        plot(auto_pilot.render_q_feedback, auto_pilot.q_feedback_response(Aq, Bq, Cq, Dq))
+        plot(auto_pilot.render_q_open_closed_loop, auto_pilot.q_open_closed_loop_response(TqDm_ss))
 
-    # 𝛾 feedback
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=RuntimeWarning)
-        Ag, Bg, Cg, Dg, eigen_g, damping_g, freq_g, closed_tf_ss_g = auto_pilot.compute_gamma_feedback(Aq, Bq, Cq, Dq)
+        # 𝛾 feedback
+        Ag, Bg, Cg, Dg, eigen_g, damping_g, freq_g, closed_ss_g = auto_pilot.compute_gamma_feedback(Aq, Bq, Cq, Dq)
 
-    auto_pilot.plot_gamma_feedback(closed_tf_ss_g)
+        plot(auto_pilot.render_gamma_feedback, auto_pilot.gamma_feedback_response(Ag, Bg, Cg, Dg))
 
-    # z feedback
-    with warnings.catch_warnings():
-        warnings.filterwarnings("ignore", category=RuntimeWarning)
-        Az, Bz, Cz, Dz, eigen_z, damping_z, freq_z, closed_tf_ss_z = auto_pilot.compute_z_feedback(Ag, Bg, Cg, Dg)
+        # z feedback
+        Az, Bz, Cz, Dz, eigen_z, damping_z, freq_z, closed_ss_z = auto_pilot.compute_z_feedback(Ag, Bg, Cg, Dg)
 
-    auto_pilot.plot_z_feedback(closed_tf_ss_z)
+        plot(auto_pilot.render_z_feedback, auto_pilot.z_feedback_response(Az, Bz, Cz, Dz))
 
-    # ------------------- Generate report -------------------
-    write = GenerateReport(Aq, Bq, Cq, Dq, eigen_q, damping_q, freq_q)
-    write.write("q-feedback")
+    reports.append((GenerateReport(Aq, Bq, Cq, Dq, eigen_q, damping_q, freq_q), "q-feedback"))
+    reports.append((GenerateReport(Ag, Bg, Cg, Dg, eigen_g, damping_g, freq_g), "gamma-feedback"))
+    reports.append((GenerateReport(Az, Bz, Cz, Dz, eigen_z, damping_z, freq_z), "z-feedback"))
 
-    write = GenerateReport(Ag, Bg, Cg, Dg, eigen_g, damping_g, freq_g)
-    write.write("gamma-feedback")
+    with tracer.span("gamma_max and alpha_max", 'main'):
+        getParams = aircraft.get_params()
+        auto_pilot.compute_gamma_max(Ag, Bg, Cg, Dg, alpha_eq, getParams['alpha_0']['value'])
+        auto_pilot.compute_alpha_max(getParams, alpha_eq)
 
-    write = GenerateReport(Az, Bz, Cz, Dz, eigen_z, damping_z, freq_z)
-    write.write("z-feedback")
+    # ------------------- Generate reports -------------------
+    with tracer.span("reports", 'main'):
+        write_reports(reports, max_workers=args.workers, force=args.force_reports)
     # --------------------------------------------------------
 
-    getParams = aircraft.get_params()
-    auto_pilot.compute_gamma_max(Ag, Bg, Cg, Dg, alpha_eq, getParams['alpha_0']['value'])
-    auto_pilot.compute_alpha_max(getParams, alpha_eq)
-
-
-
+    # ------------------- Figures -------------------
+    if args.headless:
+        with tracer.span("figures", 'main'):
+            render_all(figures, args.output_dir, formats, args.workers, args.fast_render)
 
+    if args.trace:
+        tracer.export(args.trace)
+        tracer.summary()
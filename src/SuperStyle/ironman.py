@@ -1,7 +1,10 @@
 # https://github.com/PhantHive/super-curves/blob/master/src/super_curves/SuperStyle/ironman.py
 
 from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection
+import numpy as np
 from src.SuperStyle.main_style import Global
+from src.misc.figures import decimate, rendering
 
 
 class IronMan(Global):
@@ -22,6 +25,19 @@ class IronMan(Global):
         diff_linewidth = 0.1
         alpha_value = 0.2
 
+        if rendering.fast:
+            # the n_lines glow lines of a curve in one collection, on the extrema of every pixel column
+            ax = plt.gca()
+            buckets = int(ax.get_window_extent().width)
+            linewidths = [2 + (diff_linewidth * n) for n in range(1, n_lines + 1)]
+            for i in range(len(y_list)):
+                x, y = decimate(x_list[i], y_list[i], buckets)
+                ax.add_collection(LineCollection([np.column_stack((x, y))] * n_lines, linewidths=linewidths,
+                                                 alpha=alpha_value, color=self.colors[i], capstyle='projecting',
+                                                 joinstyle='round'))
+            ax.autoscale_view()
+            return
+
         for n in range(1, n_lines + 1):
             for i in range(len(y_list)):
                 plt.plot(x_list[i], y_list[i], linewidth=2 + (diff_linewidth * n),
@@ -1,23 +1,58 @@
-import json
-from sisopy31 import *
 import math
+from math import sqrt
+
+import numpy as np
+
+from src.aircraft.envelope import EnvelopeStability
+from src.aircraft.registry import LazyParams
+from src.misc.cache import cache
+from src.misc.tracing import tracer
+
+# trim quantities of AircraftStability the state space model depends on
+TRIM = ('Q', 'Veq', 'X', 'Y', 'gamma_eq', 'alpha_eq', 'Cz_eq', 'Cx_eq', 'Cx_delta_m', 'Fpx_eq')
+STUDY_POINT_RHO = 0.702  # air density (kg/m³) of the study point
+
+
+def study_point_atmosphere(p):
+    '''
+    :param p: aircraft parameters (params.json layout)
+    :return: air density and speed of sound of the study point, used when no altitude is given
+    '''
+    return STUDY_POINT_RHO, sqrt(p['gamma']['value'] * p['R']['value'] * p['T0']['value'])
 
 
 class Params:
-    with open('src/assets/params.json') as f:
-        p = json.load(f)
+    # parameters of the aircraft named by params_source (params.json by default), loaded on first access
+    params_source = None
+    p = LazyParams()
 
 
 class AircraftStability(Params):
 
-    def __init__(self):
+    def __init__(self, mach=None, altitude=None, aircraft=None, gamma=0.0):
+        '''
+        :param mach: Mach number of the flight condition, defaults to the study point of params.json
+        :param altitude: altitude (m) of the flight condition, when given the air density and the speed of sound
+        are taken from the standard atmosphere (atm_std) instead of the study point values
+        :param aircraft: name or path of the aircraft definition (see ParamsRegistry), params.json by default
+        :param gamma: flight path angle of the trim (rad), > 0 in climb, level flight by default
+        '''
         # ------------------- Import aircraft parameters   -------------------
         super().__init__()
+        self.params_source = aircraft
         # ------------------- Initialization -------------------
-        self.Vsound = sqrt(self.p['gamma']['value'] * self.p['R']['value'] * self.p['T0']['value'])
+        if altitude is None:
+            self.rho, self.Vsound = study_point_atmosphere(self.p)
+        else:
+            from atm_std import get_cte_atm
+            hgeo, rho, a = get_cte_atm(altitude)
+            self.rho = float(rho)
+            self.Vsound = float(a)
         print("Vsound = ", self.Vsound)
-        self.Veq = self.p['Mach']['value'] * self.Vsound
-        self.Q = (1 / 2) * 0.702 * self.Veq ** 2
+        self.Mach = self.p['Mach']['value'] if mach is None else mach
+        self.Veq = self.Mach * self.Vsound
+        self.Q = (1 / 2) * self.rho * self.Veq ** 2
+        self.gamma_eq = gamma
         self.eps = 10 ** -5
         # ------------------- Aircraft X and Y -------------------
         Xf = - self.p['f']['value'] * self.p['lt']['value']
@@ -36,15 +71,21 @@ class AircraftStability(Params):
         self.Cz_eq = None
         self.Cx_eq = None
         self.Cx_delta_m = None
+        self.trim_info = None
 
     def get_params(self):
         return self.p
 
+    @tracer.traced('aircraft')
+    @cache.memoize(lambda self: (self.p, self.Q, self.X, self.Y, self.gamma_eq, self.eps, self.alpha_eq,
+                                 self.alpha_eq_prev, self.Fpx_eq),
+                   state=('alpha_eq', 'alpha_eq_prev', 'Cz_eq', 'Cx_eq', 'Cx_delta_m', 'Fpx_eq'))
     def compute_equilibrium(self):
         count = 0
         while abs(self.alpha_eq - self.alpha_eq_prev) >= self.eps:
             self.Cz_eq = (1 / (self.Q * self.p['S']['value'])) * (
-                    self.p['m']['value'] * self.p['g']['value'] - math.sin(self.alpha_eq_prev) * self.Fpx_eq)
+                    self.p['m']['value'] * self.p['g']['value'] * math.cos(self.gamma_eq)
+                    - math.sin(self.alpha_eq_prev) * self.Fpx_eq)
             self.Cx_eq = self.p['Cx0']['value'] + self.p['k']['value'] * (self.Cz_eq ** 2)
             self.Cx_delta_m = 2 * self.p['k']['value'] * self.Cz_eq * self.p['Cz_delta_m']['value']
             delta_m_eq = self.p['delta_m0']['value'] - (
@@ -56,24 +97,62 @@ class AircraftStability(Params):
             self.alpha_eq_prev = self.alpha_eq
             self.alpha_eq = self.p['alpha_0']['value'] + (self.Cz_eq / self.p['Cz_alpha']['value']) - (
                     self.p['Cz_delta_m']['value'] / self.p['Cz_alpha']['value']) * delta_m_eq
-            self.Fpx_eq = (self.Q * self.p['S']['value'] * self.Cx_eq) / math.cos(self.alpha_eq)
+            self.Fpx_eq = (self.Q * self.p['S']['value'] * self.Cx_eq + self.p['m']['value'] * self.p['g']['value']
+                           * math.sin(self.gamma_eq)) / math.cos(self.alpha_eq)
             count += 1
 
         print("Equilibrium point found in {} iterations:\n> {}".format(count, self.alpha_eq))
         return self.alpha_eq
 
+    @tracer.traced('aircraft')
+    def compute_equilibrium_newton(self, tol=1e-12, max_iter=50):
+        '''
+        Same trim as compute_equilibrium, solved with Newton's method (see NewtonTrim)
+        :param tol: convergence threshold on the largest residual of the trim equations
+        :param max_iter: maximum number of Newton iterations
+        :return: alpha_eq, the convergence info (converged, iterations, residual, halvings) is kept in trim_info
+        '''
+        from src.aircraft.trim import NewtonTrim
+
+        trim = NewtonTrim(self.p, self.Q, self.X, self.Y, self.gamma_eq, tol=tol, max_iter=max_iter).solve()
+        self.alpha_eq, self.Cz_eq, self.Cx_eq, self.Cx_delta_m, self.Fpx_eq = (
+            float(trim[key]) for key in ('alpha_eq', 'Cz_eq', 'Cx_eq', 'Cx_delta_m', 'Fpx_eq'))
+        self.alpha_eq_prev = self.alpha_eq
+        self.trim_info = {key: trim[key].item() for key in ('converged', 'iterations', 'residual', 'halvings')}
+        if not self.trim_info['converged']:
+            raise Exception(f"Equilibrium not reached after {self.trim_info['iterations']} Newton iterations "
+                            f"(residual {self.trim_info['residual']:.3g})")
+        print("Equilibrium point found in {} Newton iterations:\n> {}".format(self.trim_info['iterations'],
+                                                                             self.alpha_eq))
+        return self.alpha_eq
+
+    def compute_equilibrium_batch(self, mach, altitude):
+        '''
+        Compute the equilibrium of the aircraft for a whole set of flight conditions at once
+        :param mach: array of Mach numbers
+        :param altitude: array of altitudes (m), broadcast against mach
+        :return: alpha_eq, Cz_eq, Cx_eq, Fpx_eq arrays, the number of iterations of each point and whether it converged
+        '''
+        envelope = EnvelopeStability(self.p, mach, altitude)
+        return envelope.compute_equilibrium()
+
 
 class StateSpaceModel(Params):
 
-    def __init__(self, aircraft: AircraftStability):
+    def __init__(self, aircraft: AircraftStability, F_tau=0.0):
+        '''
+        :param aircraft: trimmed aircraft, climbing or descending at its gamma_eq
+        :param F_tau: thrust sensitivity to the throttle dF/dτ (N), the throttle column of B is 0 by default
+        '''
         self.aircraft = aircraft
+        self.params_source = aircraft.params_source
         if self.aircraft.Cz_eq is None:
             raise Exception("The compute_equilibrium method must be called before creating a StateSpaceModel instance.")
         self.Iyy = self.p['m']['value'] * self.p['rg']['value'] ** 2  # Initial tensor in y
-        self.gamma_eq = 0
+        self.gamma_eq = self.aircraft.gamma_eq
         self.Cz = self.aircraft.Cz_eq
         self.Cx_alpha = 2 * self.p['k']['value'] * self.Cz * self.p['Cz_alpha']['value']
-        self.F_tau = 0
+        self.F_tau = F_tau
         self.Cm_alpha = (self.aircraft.X / self.p['lref']['value']) * (
                     self.Cx_alpha * math.sin(self.aircraft.alpha_eq) + self.p['Cz_alpha']['value'] * math.cos(
                 self.aircraft.alpha_eq))
@@ -111,15 +190,23 @@ class StateSpaceModel(Params):
         # ------------------- State space model -------------------
         self.A, self.B, self.C, self.D = None, None, None, None
 
-    def model(self):
+    @tracer.traced('aircraft')
+    @cache.memoize(lambda self, throttle=False: (self.p, [getattr(self.aircraft, name) for name in TRIM], self.F_tau,
+                                                 throttle),
+                   state=('A', 'B', 'C', 'D'))
+    def model(self, throttle=False):
+        '''
+        :param throttle: add the throttle τ as a second input, B and D then have the columns (δm, τ)
+        :return: A, B, C, D and the eigenvalues of A
+        '''
         self.A = np.array(
             [[-self.Xv, -self.Xgamma, -self.Xalpha, 0, 0, 0],
-             [self.Zv, 0, self.Zalpha, 0, 0, 0],
-             [-self.Zv, 0, -self.Zalpha, 1, 0, 0],
+             [self.Zv, self.Zgamma, self.Zalpha, 0, 0, 0],
+             [-self.Zv, -self.Zgamma, -self.Zalpha, 1, 0, 0],
              [0, 0, self.m_alpha, self.m_q, 0, 0],
              [0, 0, 0, 1, 0, 0],
-             [0, self.aircraft.Veq, 0, 0, 0, 0]]
-        )
+             [self.aircraft.Veq * math.sin(self.gamma_eq), self.aircraft.Veq * math.cos(self.gamma_eq), 0, 0, 0, 0]]
+        ) + 0.0  # the -Zgamma = -0.0 of level flight is printed as 0 in the reports
         self.B = np.array(
             [[0],
              [self.Zdelta_m],
@@ -128,8 +215,10 @@ class StateSpaceModel(Params):
              [0],
              [0]]
         )
+        if throttle:
+            self.B = np.hstack((self.B, [[-self.Xtau], [-self.Ztau], [self.Ztau], [0], [0], [0]]))
         self.C = np.eye(6)
-        self.D = np.zeros((6, 1))
+        self.D = np.zeros((6, self.B.shape[1]))
 
         print("------------------- State space model -------------------")
         print("A = \n", self.A)
@@ -142,7 +231,12 @@ class StateSpaceModel(Params):
 
         return self.A, self.B, self.C, self.D, eigen_values
 
+    @tracer.traced('aircraft')
+    @cache.memoize(lambda self: (self.A, self.B, self.C, self.D))
     def control(self):
-        sys = ss(self.A, self.B, self.C, self.D)
+        # python-control pulls matplotlib in, it is only imported when the control objects are asked for
+        import control.matlab
+
+        sys = control.ss(self.A, self.B, self.C, self.D)
         dmp = control.matlab.damp(sys)
         return sys, dmp
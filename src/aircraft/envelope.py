@@ -0,0 +1,219 @@
+import numpy as np
+
+from src.aircraft.registry import param_values
+
+
+class EnvelopeStability:
+    '''
+    Batched counterpart of AircraftStability: trims every (Mach, altitude) point of a flight envelope together.
+    The parameters follow the params.json layout, a 'value' may also be an array broadcast against the conditions, or
+    come as a (stacked) NumPy record from the ParamsRegistry to trim many aircraft variants at once.
+    '''
+
+    def __init__(self, p, mach, altitude, gamma=0.0, rho=None, Vsound=None):
+        '''
+        :param p: aircraft parameters (params.json layout or record)
+        :param mach: array of Mach numbers
+        :param altitude: array of altitudes (m), broadcast against mach
+        :param gamma: array of flight path angles (rad), broadcast against mach, e.g. a climb or descent profile
+        :param rho, Vsound: air density (kg/m³) and speed of sound (m/s), broadcast against mach, taken from the
+        standard atmosphere at altitude by default (e.g. study_point_atmosphere to match AircraftStability without
+        altitude)
+        '''
+        from atm_std import get_cte_atm
+
+        self.p = p
+        self.mach, self.altitude, self.gamma_eq = np.broadcast_arrays(np.asarray(mach, dtype=float),
+                                                                      np.asarray(altitude, dtype=float),
+                                                                      np.asarray(gamma, dtype=float))
+        # ------------------- Standard atmosphere -------------------
+        if rho is None or Vsound is None:
+            hgeo, rho_std, a = get_cte_atm(self.altitude)
+            rho = rho_std if rho is None else rho
+            Vsound = a if Vsound is None else Vsound
+        self.rho = np.array(np.broadcast_to(np.asarray(rho, dtype=float), self.mach.shape))
+        self.Vsound = np.array(np.broadcast_to(np.asarray(Vsound, dtype=float), self.mach.shape))
+        self.Veq = self.mach * self.Vsound
+        self.Q = (1 / 2) * self.rho * self.Veq ** 2
+        self.eps = 10 ** -5
+        self.max_iter = 1000
+        # ------------------- Aircraft X and Y -------------------
+        g = param_values(self.p, ('f', 'c', 'f_delta', 'lt'))
+        Xf = - g['f'] * g['lt']
+        Xg = - g['c'] * g['lt']
+        Xf_delta = - g['f_delta'] * g['lt']
+
+        self.X = Xf - Xg
+        self.Y = Xf_delta - Xg
+
+        # ------------------- Aircraft Cz, Cx -------------------
+        self.alpha_eq = None
+        self.Cz_eq = None
+        self.Cx_eq = None
+        self.Cx_delta_m = None
+        self.delta_m_eq = None
+        self.Fpx_eq = None
+
+    def compute_equilibrium(self):
+        '''
+        Same fixed-point iteration as AircraftStability.compute_equilibrium, applied to every point at once.
+        Each point stops being updated as soon as it has converged, or once its iterate is no longer finite (diverged).
+        :return: alpha_eq, Cz_eq, Cx_eq, Fpx_eq arrays, the number of iterations of each point and whether it converged
+        '''
+        p = param_values(self.p, ('m', 'g', 'S', 'Cx0', 'k', 'Cz_alpha', 'Cz_delta_m', 'delta_m0', 'alpha_0'))
+        shape = np.broadcast_shapes(self.Q.shape, np.shape(self.X), np.shape(self.Y),
+                                    *(value.shape for value in p.values()))
+        QS = np.broadcast_to(self.Q * p['S'], shape)
+        weight = p['m'] * p['g']
+
+        alpha_eq_prev = np.zeros(shape)
+        alpha_eq = np.ones(shape)
+        Fpx_eq = np.zeros(shape)
+        Cz_eq = np.zeros(shape)
+        Cx_eq = np.zeros(shape)
+        Cx_delta_m = np.zeros(shape)
+        delta_m_eq = np.zeros(shape)
+        count = np.zeros(shape, dtype=int)
+
+        converged = np.abs(alpha_eq - alpha_eq_prev) < self.eps
+        active = ~converged
+        # diverging points overflow to inf/NaN before they are stopped, without a warning per iteration
+        with np.errstate(over='ignore', invalid='ignore'):
+            while active.any() and count.max() < self.max_iter:
+                sin_prev, cos_prev = np.sin(alpha_eq_prev), np.cos(alpha_eq_prev)
+                Cz = (1 / QS) * (weight * np.cos(self.gamma_eq) - sin_prev * Fpx_eq)
+                Cx = p['Cx0'] + p['k'] * Cz ** 2
+                Cx_dm = 2 * p['k'] * Cz * p['Cz_delta_m']
+                delta_m = p['delta_m0'] - ((Cx * sin_prev + Cz * cos_prev) / (
+                        Cx_dm * sin_prev + p['Cz_delta_m'] * cos_prev)) * (self.X / (self.Y - self.X))
+                alpha = p['alpha_0'] + (Cz / p['Cz_alpha']) - (p['Cz_delta_m'] / p['Cz_alpha']) * delta_m
+
+                # converged points keep their last iterate
+                Cz_eq = np.where(active, Cz, Cz_eq)
+                Cx_eq = np.where(active, Cx, Cx_eq)
+                Cx_delta_m = np.where(active, Cx_dm, Cx_delta_m)
+                delta_m_eq = np.where(active, delta_m, delta_m_eq)
+                alpha_eq_prev = np.where(active, alpha_eq, alpha_eq_prev)
+                alpha_eq = np.where(active, alpha, alpha_eq)
+                Fpx_eq = np.where(active, (QS * Cx + weight * np.sin(self.gamma_eq)) / np.cos(alpha), Fpx_eq)
+                count += active
+
+                # a NaN difference is not a convergence: diverged points are stopped, never counted as converged
+                converged = np.abs(alpha_eq - alpha_eq_prev) < self.eps
+                active = ~converged & np.isfinite(alpha_eq) & np.isfinite(alpha_eq_prev)
+
+        if not converged.all():
+            diverged = np.count_nonzero(~np.isfinite(alpha_eq))
+            print(f"Equilibrium not reached for {np.count_nonzero(~converged)} point(s) after {count.max()} iterations"
+                  f" ({diverged} diverged to non-finite values)")
+
+        self.alpha_eq, self.Cz_eq, self.Cx_eq, self.Fpx_eq = alpha_eq, Cz_eq, Cx_eq, Fpx_eq
+        self.Cx_delta_m, self.delta_m_eq = Cx_delta_m, delta_m_eq
+        return self.alpha_eq, self.Cz_eq, self.Cx_eq, self.Fpx_eq, count, converged
+
+    def compute_equilibrium_newton(self, tol=1e-12, max_iter=50):
+        '''
+        Trim every point with NewtonTrim (analytic Jacobian, line search, iteration limit) instead of the fixed-point
+        iteration
+        :param tol: convergence threshold on the largest residual of the trim equations
+        :param max_iter: maximum number of Newton iterations
+        :return: alpha_eq, Cz_eq, Cx_eq, Fpx_eq arrays and the convergence info of each point (converged,
+        iterations, residual, halvings arrays)
+        '''
+        from src.aircraft.trim import NewtonTrim
+
+        trim = NewtonTrim(self.p, self.Q, self.X, self.Y, self.gamma_eq, tol=tol, max_iter=max_iter).solve()
+        self.alpha_eq, self.Cz_eq, self.Cx_eq, self.Fpx_eq = (trim[key] for key in ('alpha_eq', 'Cz_eq', 'Cx_eq',
+                                                                                      'Fpx_eq'))
+        self.Cx_delta_m, self.delta_m_eq = trim['Cx_delta_m'], trim['delta_m_eq']
+        info = {key: trim[key] for key in ('converged', 'iterations', 'residual', 'halvings')}
+        return self.alpha_eq, self.Cz_eq, self.Cx_eq, self.Fpx_eq, info
+
+
+class EnvelopeStateSpaceModel:
+    '''
+    Batched counterpart of StateSpaceModel: builds the stacked A and B matrices of every trimmed point of an
+    EnvelopeStability at once.
+    '''
+
+    def __init__(self, envelope: EnvelopeStability, F_tau=0.0):
+        '''
+        :param envelope: trimmed envelope, each point climbing or descending at its gamma_eq
+        :param F_tau: thrust sensitivity to the throttle dF/dτ (N), broadcast against the points, the throttle column
+        of B is 0 by default
+        '''
+        self.envelope = envelope
+        if self.envelope.Cz_eq is None:
+            raise Exception("The compute_equilibrium method must be called before creating an "
+                            "EnvelopeStateSpaceModel instance.")
+        p = param_values(self.envelope.p, ('m', 'g', 'S', 'rg', 'lref', 'k', 'Cz_alpha', 'Cz_delta_m', 'Cm_q'))
+        e = self.envelope
+        sin_alpha, cos_alpha = np.sin(e.alpha_eq), np.cos(e.alpha_eq)
+        QS = e.Q * p['S']
+        mV = p['m'] * e.Veq
+
+        self.Iyy = p['m'] * p['rg'] ** 2  # Initial tensor in y
+        self.gamma_eq = e.gamma_eq
+        self.Cx_alpha = 2 * p['k'] * e.Cz_eq * p['Cz_alpha']
+        self.F_tau = np.asarray(F_tau, dtype=float)
+        self.Cm_alpha = (e.X / p['lref']) * (self.Cx_alpha * sin_alpha + p['Cz_alpha'] * cos_alpha)
+        self.Cm_delta_m = (e.Y / p['lref']) * (e.Cx_delta_m * sin_alpha + p['Cz_delta_m'] * cos_alpha)
+
+        # ------------------- State space model final parameters of our matrices -------------------
+        self.Xv = (2 * QS * e.Cx_eq) / mV
+        self.Xalpha = (e.Fpx_eq / mV) * sin_alpha + (QS * self.Cx_alpha) / mV
+        self.Xgamma = p['g'] * np.cos(self.gamma_eq) / e.Veq
+        self.Xdelta_m = (QS * e.Cx_delta_m) / mV
+        self.Xtau = - (self.F_tau * cos_alpha) / mV
+        self.mv = 0
+        self.m_alpha = (QS * p['lref'] * self.Cm_alpha) / self.Iyy
+        self.m_q = (QS * (p['lref'] ** 2) * p['Cm_q']) / (e.Veq * self.Iyy)
+        self.m_delta_m = (QS * p['lref'] * self.Cm_delta_m) / self.Iyy
+        self.Zv = (2 * QS * e.Cz_eq) / mV
+        self.Zalpha = (e.Fpx_eq * cos_alpha) / mV + (QS * p['Cz_alpha']) / mV
+        self.Zgamma = (p['g'] * np.sin(self.gamma_eq)) / e.Veq
+        self.Zdelta_m = (QS * p['Cz_delta_m']) / mV
+        self.Ztau = - (self.F_tau * sin_alpha) / mV
+
+        self.shape = np.broadcast_shapes(np.shape(e.alpha_eq), self.F_tau.shape)
+        self.A, self.B, self.C, self.D = None, None, None, None
+
+    def _fill(self, value):
+        return np.broadcast_to(value, self.shape)
+
+    def model(self, throttle=False):
+        '''
+        :param throttle: add the throttle τ as a second input, B and D then have the columns (δm, τ)
+        :return: A (..., 6, 6), B (..., 6, 1) or (..., 6, 2), C, D and the eigenvalues (..., 6) of every point
+        '''
+        A = np.zeros(self.shape + (6, 6))
+        A[..., 0, 0] = self._fill(-self.Xv)
+        A[..., 0, 1] = self._fill(-self.Xgamma)
+        A[..., 0, 2] = self._fill(-self.Xalpha)
+        A[..., 1, 0] = self._fill(self.Zv)
+        A[..., 1, 1] = self._fill(self.Zgamma)
+        A[..., 1, 2] = self._fill(self.Zalpha)
+        A[..., 2, 0] = self._fill(-self.Zv)
+        A[..., 2, 1] = self._fill(-self.Zgamma)
+        A[..., 2, 2] = self._fill(-self.Zalpha)
+        A[..., 2, 3] = 1
+        A[..., 3, 2] = self._fill(self.m_alpha)
+        A[..., 3, 3] = self._fill(self.m_q)
+        A[..., 4, 3] = 1
+        A[..., 5, 0] = self._fill(self.envelope.Veq * np.sin(self.gamma_eq))
+        A[..., 5, 1] = self._fill(self.envelope.Veq * np.cos(self.gamma_eq))
+
+        B = np.zeros(self.shape + (6, 2 if throttle else 1))
+        B[..., 1, 0] = self._fill(self.Zdelta_m)
+        B[..., 2, 0] = self._fill(-self.Zdelta_m)
+        B[..., 3, 0] = self._fill(self.m_delta_m)
+        if throttle:
+            B[..., 0, 1] = self._fill(-self.Xtau)
+            B[..., 1, 1] = self._fill(-self.Ztau)
+            B[..., 2, 1] = self._fill(self.Ztau)
+
+        self.A, self.B = A, B
+        self.C = np.eye(6)
+        self.D = np.zeros((6, B.shape[-1]))
+        eigen_values = np.linalg.eigvals(A)
+        return self.A, self.B, self.C, self.D, eigen_values
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+DEFAULT_AIRCRAFT = 'params'
+
+
+def to_record(p):
+    '''
+    Flatten parameters in the params.json layout into a NumPy record (one float field per parameter)
+    :param p: aircraft parameters (params.json layout)
+    :return: numpy.record, fields are reached with record['m'] or record.m
+    '''
+    names = [name for name, entry in p.items() if isinstance(entry.get('value'), (int, float))]
+    dtype = np.dtype([(name, float) for name in names])
+    return np.rec.array([tuple(float(p[name]['value']) for name in names)], dtype=dtype)[0]
+
+
+def param_values(p, keys):
+    '''
+    Read parameters from either layout, as float arrays
+    :param p: parameters in the params.json layout, or a (stacked) record from to_record / ParamsRegistry.records
+    :param keys: names of the parameters
+    :return: dict name -> value
+    '''
+    if getattr(getattr(p, 'dtype', None), 'names', None):
+        return {key: np.asarray(p[key], dtype=float) for key in keys}
+    return {key: np.asarray(p[key]['value'], dtype=float) for key in keys}
+
+
+class ParamsRegistry:
+    '''
+    Lazily loads aircraft definitions, by name (a json file of the assets directory) or by path. Parsed parameter
+    sets are cached under the hash of their file, so identical definitions are parsed once.
+    '''
+
+    def __init__(self, directory=ASSETS_DIR):
+        self.directory = directory
+        self._by_hash = {}
+        self._by_path = {}
+
+    def resolve(self, aircraft=DEFAULT_AIRCRAFT):
+        '''
+        :param aircraft: name of a definition of the assets directory, or path to a json file
+        :return: absolute path of the definition
+        '''
+        if os.path.splitext(aircraft)[1] == '.json' or os.path.dirname(aircraft):
+            return os.path.abspath(aircraft)
+        return os.path.join(self.directory, f"{aircraft}.json")
+
+    def names(self):
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def _load(self, aircraft):
+        path = self.resolve(aircraft)
+        stat = os.stat(path)
+        cached = self._by_path.get(path)
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return self._by_hash[cached[1]]
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest not in self._by_hash:
+            p = json.loads(content)
+            self._by_hash[digest] = (p, to_record(p))
+        self._by_path[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+        return self._by_hash[digest]
+
+    def get(self, aircraft=DEFAULT_AIRCRAFT):
+        '''
+        :param aircraft: name or path of the definition
+        :return: parameters in the params.json layout (shared, do not modify in place)
+        '''
+        return self._load(aircraft)[0]
+
+    def record(self, aircraft=DEFAULT_AIRCRAFT):
+        '''
+        :param aircraft: name or path of the definition
+        :return: flat NumPy record of the parameters
+        '''
+        return self._load(aircraft)[1]
+
+    def digest(self, aircraft=DEFAULT_AIRCRAFT):
+        '''
+        :return: sha256 of the definition file
+        '''
+        self._load(aircraft)
+        return self._by_path[self.resolve(aircraft)][1]
+
+    def records(self, aircrafts):
+        '''
+        Stack several definitions into one record array, e.g. to trim thousands of variants at once
+        :param aircrafts: names or paths of the definitions
+        :return: numpy.recarray of shape (len(aircrafts),), restricted to the parameters shared by all of them
+        '''
+        records = [self.record(aircraft) for aircraft in aircrafts]
+        names = [name for name in records[0].dtype.names if all(name in r.dtype.names for r in records)]
+        dtype = np.dtype([(name, float) for name in names])
+        return np.rec.array([tuple(r[name] for name in names) for r in records], dtype=dtype)
+
+
+registry = ParamsRegistry()
+
+
+class LazyParams:
+    '''
+    Descriptor giving the parameters of the aircraft selected by the params_source attribute of the owner instance,
+    loaded from the registry on first access only
+    '''
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return registry.get(DEFAULT_AIRCRAFT)
+        p = registry.get(getattr(instance, 'params_source', None) or DEFAULT_AIRCRAFT)
+        instance.__dict__['p'] = p
+        return p
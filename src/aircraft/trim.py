@@ -0,0 +1,165 @@
+import numpy as np
+
+from src.aircraft.registry import param_values
+from src.misc.tracing import tracer
+
+TRIM_PARAMS = ('m', 'g', 'S', 'Cx0', 'k', 'Cz_alpha', 'Cz_delta_m', 'delta_m0', 'alpha_0')
+
+
+class NewtonTrim:
+    '''
+    Newton solver of the trim equations of AircraftStability.compute_equilibrium, for any number of flight conditions
+    at once. The unknowns are (α, δm, Fpx), with Cz = (mg cos 𝛾 - Fpx sin α) / QS, Cx = Cx0 + k Cz² and
+    Cxδm = 2 k Cz Czδm:
+        lift      Czα (α - α0) + Czδm δm - Cz = 0
+        moment    (δm - δm0)(Cxδm sin α + Czδm cos α)(Y - X) + (Cx sin α + Cz cos α) X = 0
+        thrust    (Fpx cos α - mg sin 𝛾) / QS - Cx = 0
+    The fixed point of compute_equilibrium solves the same equations. Each Newton step uses the analytic Jacobian and is
+    halved until the squared residual decreases (backtracking line search).
+    '''
+
+    def __init__(self, p, Q, X, Y, gamma=0.0, tol=1e-12, max_iter=50, max_halvings=30):
+        '''
+        :param p: aircraft parameters (params.json layout or record)
+        :param Q: dynamic pressures (Pa), array of the flight conditions
+        :param X, Y: lever arms of the aerodynamic center and of the elevator, broadcast against Q
+        :param gamma: flight path angles (rad), broadcast against Q, level flight by default
+        :param tol: convergence threshold on the largest residual
+        :param max_iter: maximum number of Newton iterations
+        :param max_halvings: maximum number of step halvings of the line search
+        '''
+        values = param_values(p, TRIM_PARAMS)
+        values['QS'] = np.asarray(Q, dtype=float) * values['S']
+        values['X'] = np.asarray(X, dtype=float)
+        values['Y'] = np.asarray(Y, dtype=float)
+        values['gamma_eq'] = np.asarray(gamma, dtype=float)
+        self.shape = np.broadcast_shapes(*(value.shape for value in values.values()))
+        # every quantity of every flight condition, flattened so that the points still iterating can be picked out
+        self.values = {key: np.broadcast_to(value, self.shape).ravel() for key, value in values.items()}
+        self.tol = tol
+        self.max_iter = max_iter
+        self.max_halvings = max_halvings
+
+    def _values(self, mask):
+        if mask is None or mask.all():
+            return self.values
+        return {key: value[mask] for key, value in self.values.items()}
+
+    @staticmethod
+    def coefficients(p, alpha, F):
+        '''
+        :param p: quantities of the flight conditions, see values
+        :return: Cz, Cx, Cxδm and their derivatives with respect to α and Fpx
+        '''
+        sin_alpha, cos_alpha = np.sin(alpha), np.cos(alpha)
+        Cz = (p['m'] * p['g'] * np.cos(p['gamma_eq']) - sin_alpha * F) / p['QS']
+        dCz = (-F * cos_alpha / p['QS'], -sin_alpha / p['QS'])
+        Cx = p['Cx0'] + p['k'] * Cz ** 2
+        dCx = tuple(2 * p['k'] * Cz * d for d in dCz)
+        Cx_dm = 2 * p['k'] * Cz * p['Cz_delta_m']
+        dCx_dm = tuple(2 * p['k'] * p['Cz_delta_m'] * d for d in dCz)
+        return Cz, Cx, Cx_dm, dCz, dCx, dCx_dm
+
+    def residuals(self, x, mask=None, jacobian=True):
+        '''
+        :param x: unknowns (..., 3): α, δm, Fpx
+        :param mask: flight conditions of x, all of them by default
+        :param jacobian: also return the Jacobian
+        :return: residuals (..., 3) and their Jacobian (..., 3, 3)
+        '''
+        p = self._values(mask)
+        alpha, delta_m, F = x[..., 0], x[..., 1], x[..., 2]
+        sin_alpha, cos_alpha = np.sin(alpha), np.cos(alpha)
+        Cz, Cx, Cx_dm, dCz, dCx, dCx_dm = self.coefficients(p, alpha, F)
+        arm = p['Y'] - p['X']
+        e = delta_m - p['delta_m0']
+        N = Cx * sin_alpha + Cz * cos_alpha
+        Dn = Cx_dm * sin_alpha + p['Cz_delta_m'] * cos_alpha
+
+        r = np.stack((p['Cz_alpha'] * (alpha - p['alpha_0']) + p['Cz_delta_m'] * delta_m - Cz,
+                      e * Dn * arm + N * p['X'],
+                      (F * cos_alpha - p['m'] * p['g'] * np.sin(p['gamma_eq'])) / p['QS'] - Cx), axis=-1)
+        if not jacobian:
+            return r
+
+        dN = (dCx[0] * sin_alpha + Cx * cos_alpha + dCz[0] * cos_alpha - Cz * sin_alpha,
+              dCx[1] * sin_alpha + dCz[1] * cos_alpha)
+        dDn = (dCx_dm[0] * sin_alpha + Cx_dm * cos_alpha - p['Cz_delta_m'] * sin_alpha,
+               dCx_dm[1] * sin_alpha)
+        J = np.zeros(r.shape + (3,))
+        J[..., 0, 0] = p['Cz_alpha'] - dCz[0]
+        J[..., 0, 1] = p['Cz_delta_m']
+        J[..., 0, 2] = -dCz[1]
+        J[..., 1, 0] = e * dDn[0] * arm + dN[0] * p['X']
+        J[..., 1, 1] = Dn * arm
+        J[..., 1, 2] = e * dDn[1] * arm + dN[1] * p['X']
+        J[..., 2, 0] = -F * sin_alpha / p['QS'] - dCx[0]
+        J[..., 2, 2] = cos_alpha / p['QS'] - dCx[1]
+        return r, J
+
+    def initial_guess(self):
+        '''
+        :return: unknowns of the trim without the normal component of the thrust, at the elevator setting of the
+        moment balance at α = 0
+        '''
+        p = self.values
+        weight = p['m'] * p['g']
+        Cz = weight * np.cos(p['gamma_eq']) / p['QS']
+        Cx = p['Cx0'] + p['k'] * Cz ** 2
+        delta_m = p['delta_m0'] - (Cz * p['X']) / (p['Cz_delta_m'] * (p['Y'] - p['X']))
+        alpha = p['alpha_0'] + (Cz - p['Cz_delta_m'] * delta_m) / p['Cz_alpha']
+        return np.stack((alpha, delta_m, Cx * p['QS'] + weight * np.sin(p['gamma_eq'])), axis=-1)
+
+    @tracer.traced('aircraft')
+    def solve(self, x0=None):
+        '''
+        :param x0: starting unknowns (..., 3), broadcast against the flight conditions, initial_guess() by default
+        :return: dict of arrays of the flight conditions:
+        alpha_eq, delta_m_eq, Fpx_eq, Cz_eq, Cx_eq, Cx_delta_m, the trim,
+        converged, iterations, residual (largest residual left), halvings (total step halvings of the line search)
+        '''
+        if x0 is None:
+            x = self.initial_guess()
+        else:
+            x = np.array(np.broadcast_to(x0, self.shape + (3,)), dtype=float).reshape(-1, 3)
+        residual = np.abs(self.residuals(x, jacobian=False)).max(axis=-1)
+        iterations = np.zeros(len(x), dtype=int)
+        halvings = np.zeros(len(x), dtype=int)
+        active = ~(residual < self.tol)
+
+        for _ in range(self.max_iter):
+            if not active.any():
+                break
+            r, J = self.residuals(x[active], active)
+            try:
+                step = -np.linalg.solve(J, r[..., None])[..., 0]
+            except np.linalg.LinAlgError:
+                step = -(np.linalg.pinv(J) @ r[..., None])[..., 0]
+            x_active, merit = x[active], (r ** 2).sum(axis=-1)
+
+            # backtracking: every point halves its own step until its merit decreases
+            length = np.ones(len(step))
+            pending = np.ones(len(step), dtype=bool)
+            r_new = r
+            for _ in range(self.max_halvings):
+                trial_r = self.residuals(x_active + length[:, None] * step, active, jacobian=False)
+                r_new = np.where(pending[:, None], trial_r, r_new)
+                pending &= ~((trial_r ** 2).sum(axis=-1) < merit)
+                if not pending.any():
+                    break
+                length = np.where(pending, length / 2, length)
+            stalled = pending
+
+            x[active] = x_active + length[:, None] * step
+            iterations[active] += 1
+            halvings[active] += np.round(-np.log2(length)).astype(int)
+            residual[active] = np.abs(r_new).max(axis=-1)
+            # points whose line search found no decrease are left unconverged
+            active[active] = ~stalled & ~(residual[active] < self.tol)
+
+        alpha, delta_m, F = x[:, 0], x[:, 1], x[:, 2]
+        Cz, Cx, Cx_dm = self.coefficients(self.values, alpha, F)[:3]
+        result = {'alpha_eq': alpha, 'delta_m_eq': delta_m, 'Fpx_eq': F, 'Cz_eq': Cz, 'Cx_eq': Cx, 'Cx_delta_m': Cx_dm,
+                  'converged': residual < self.tol, 'iterations': iterations, 'residual': residual,
+                  'halvings': halvings}
+        return {key: value.reshape(self.shape) for key, value in result.items()}
@@ -1,25 +1,41 @@
-from sisopy31 import *
-from matplotlib import pyplot as plt
-from scipy.interpolate import interp1d
-from src.SuperStyle.ironman import IronMan
-import os
+import numpy as np
+
+from src.flight_dynamics.simulation import simulator, ss_step
+from src.flight_dynamics.step_metrics import step_info
+from src.flight_dynamics.time_grid import diverges, final_value, response_grid, settling_horizon
+from src.misc.cache import cache
+from src.misc.figures import finish_figure
+from src.misc.tracing import tracer
 
 from src.autopilot.root_finding import RootFinding
+from src.autopilot.state_space import StateSpace, damp, feedback, gain, series
+from src.autopilot.washout import WashoutDesign
+
+DEFAULT_GAINS = (-0.33057, 14.30915, 0.00272)  # Kr, Kgamma, Kz using sisopy31
+WASHOUT_TAU = 0.7  # time constant (s) of the washout filter of the q loop, see WashoutDesign to choose another one
+LOOP_PLOT_HORIZON = 60.0  # longest window (s) of the step responses of the loops on the figures
 
 
 class AutoPilot:
+    # annotation of the settling time on the figures
+    arrow_width = 0.01
+    arrow_head_length = 4
+    text_offset = 0.25
 
-    def __init__(self, A, B):
+    def __init__(self, A, B, gains=None, state_space=False):
+        '''
+        :param A, B: state space model of the aircraft
+        :param gains: (Kr, Kgamma, Kz), e.g. from a GainSchedule lookup, defaults to the gains tuned with sisopy31
+        :param state_space: keep every loop in state space form (StateSpace instead of python-control transfer
+        functions, interconnections built from block matrices), without importing python-control
+        '''
         self.A = A[1:, 1:]
         self.B = B[1:]
         self.D = np.zeros((1, 1))
-        self.Kr = -0.33057  # using sisopy31
-        self.Kgamma = 14.30915
-        self.Kz = 0.00272
-        self.iron = IronMan()
-        self.arrow_width = 0.01
-        self.arrow_head_length = 4
-        self.text_offset = 0.25
+        if gains is None:
+            gains = DEFAULT_GAINS
+        self.Kr, self.Kgamma, self.Kz = gains
+        self.state_space = state_space
         self.delta_nz = 3.1 # from practical work pdf (we want maximum transverse load factor)
 
     def compute_alpha_feedback(self):
@@ -30,10 +46,32 @@ class AutoPilot:
 
 
 
+    def _closed_loop(self, A, B, C, D):
+        '''
+        Print a closed loop and its poles
+        :return: eigenvalues, damping ratio, frequency (as control.matlab.damp) and the closed loop, as a transfer
+        function or a StateSpace in state space mode
+        '''
+        if self.state_space:
+            closed_loop = StateSpace(A, B, C, D)
+            print(f"State space representation:\nA = {A}\nB = {B}\nC = {C}\nD = {D}")
+            return damp(A) + (closed_loop,)
+
+        import control.matlab
+
+        closed_state_space = control.ss(A, B, C, D)
+        closed_tf = control.tf(closed_state_space)
+        print(f"State space representation: {closed_state_space}")
+        print(f"Transfer function: {closed_tf}")
+        return control.matlab.damp(closed_state_space) + (closed_tf,)
+
+    @tracer.traced('autopilot')
+    @cache.memoize(lambda self: (self.A, self.B, self.D, self.Kr, self.state_space))
     def compute_q_feedback(self):
         '''
         Compute the q feedback loop
-        :return: state space representation, transfer function, eigenvalues, damping ratio, frequency
+        :return: state space representation, eigenvalues, damping ratio, frequency, transfer function (StateSpace in
+        state space mode)
         '''
         Cq = np.array([[0], [0], [1], [0], [0]]).T
 
@@ -41,69 +79,69 @@ class AutoPilot:
         Bq = self.Kr * self.B
         Dq = self.Kr * self.D
 
-        closed_state_space = control.ss(Aq, Bq, Cq, Dq)
-        closed_tf_ss_q = control.tf(closed_state_space)
         print("------------------- q feedback loop ------------------- \n")
-        print(f"State space representation: {closed_state_space}")
-        print(f"Transfer function: {closed_tf_ss_q}")
-        eigen, damp, frequency = control.matlab.damp(closed_state_space)
+        eigen, damping, frequency, closed_tf_ss_q = self._closed_loop(Aq, Bq, Cq, Dq)
 
-        return Aq, Bq, Cq, Dq, eigen, damp, frequency, closed_tf_ss_q
+        return Aq, Bq, Cq, Dq, eigen, damping, frequency, closed_tf_ss_q
 
+    @tracer.traced('autopilot')
+    @cache.memoize(lambda self, *loop: (loop, self.Kgamma, self.state_space))
     def compute_gamma_feedback(self, Aq, Bq, Cq, Dq):
         '''
         Compute the gamma feedback loop
         :param Aq, Bq, Cq, Dq: state space representation of the q feedback loop
-        :return: state space representation, transfer function, eigenvalues, damping ratio, frequency
+        :return: state space representation, eigenvalues, damping ratio, frequency, transfer function (StateSpace in
+        state space mode)
         '''
         Cgamma = np.array([[1], [0], [0], [0], [0]]).T
         Agamma = Aq - self.Kgamma * Bq @ Cgamma
         Bgamma = self.Kgamma * Bq
         Dgamma = self.Kgamma * Dq
-        closed_state_space = control.ss(Agamma, Bgamma, Cgamma, Dgamma)
-        closed_tf_ss_gamma = control.tf(closed_state_space)
         print("\n------------------- 𝛾 feedback loop ------------------- \n")
-        print(f"State space representation: {closed_state_space}")
-        print(f"Transfer function: {closed_tf_ss_gamma}")
-        eigen, damp, frequency = control.matlab.damp(closed_state_space)
-        return Agamma, Bgamma, Cgamma, Dgamma, eigen, damp, frequency, closed_tf_ss_gamma
+        eigen, damping, frequency, closed_tf_ss_gamma = self._closed_loop(Agamma, Bgamma, Cgamma, Dgamma)
+        return Agamma, Bgamma, Cgamma, Dgamma, eigen, damping, frequency, closed_tf_ss_gamma
 
+    @tracer.traced('autopilot')
+    @cache.memoize(lambda self, *loop: (loop, self.Kz, self.state_space))
     def compute_z_feedback(self, Agamma, Bgamma, Cgamma, Dgamma):
         '''
         Compute the z feedback loop
         :param Agamma, Bgamma, Cgamma, Dgamma: state space representation of the gamma feedback loop
-        :return: state space representation, transfer function, eigenvalues, damping ratio, frequency
+        :return: state space representation, eigenvalues, damping ratio, frequency, transfer function (StateSpace in
+        state space mode)
         '''
         Cz = np.array([[0], [0], [0], [0], [1]]).T
         Az = Agamma - self.Kz * Bgamma @ Cz
         Bz = self.Kz * Bgamma
         Dz = self.Kz * Dgamma
-        closed_state_space = control.ss(Az, Bz, Cz, Dz)
-        closed_tf_ss_z = control.tf(closed_state_space)
         print("\n------------------- z feedback loop ------------------- \n")
-        print(f"State space representation: {closed_state_space}")
-        print(f"Transfer function: {closed_tf_ss_z}")
-        eigen, damp, frequency = control.matlab.damp(closed_state_space)
-        return Az, Bz, Cz, Dz, eigen, damp, frequency, closed_tf_ss_z
+        eigen, damping, frequency, closed_tf_ss_z = self._closed_loop(Az, Bz, Cz, Dz)
+        return Az, Bz, Cz, Dz, eigen, damping, frequency, closed_tf_ss_z
 
+    @tracer.traced('autopilot')
     def compute_gamma_max(self, Agamma, Bgamma, Cgamma, Dgamma, alpha_eq, alpha0):
         '''
         Compute the maximum angle of attack
         :param Agamma, Bgamma, Cgamma, Dgamma: state space representation of the gamma feedback loop
         :param alpha_eq: Equilibrium angle of attack
         :param alpha0: Zero lift angle of attack
-        :return: 𝛾_max (rad) and number of iterations
+        :return: 𝛾_max (rad)
         '''
-        SS_sat = control.ss(Agamma, Bgamma, Cgamma, Dgamma)
-        tf_ssat = control.tf(SS_sat)
-
         alpha_max = alpha_eq + (alpha_eq - alpha0) * self.delta_nz
         print("\n------------------- 𝛾_max computing ------------------- \n")
-        print("State space representation y_csat 𝛼: ", SS_sat)
-        print("Transfer function: ", tf_ssat)
+        if self.state_space:
+            SS_sat = StateSpace(Agamma, Bgamma, Cgamma, Dgamma)
+            print(f"State space representation y_csat 𝛼:\nA = {Agamma}\nB = {Bgamma}\nC = {Cgamma}\nD = {Dgamma}")
+        else:
+            import control
+
+            SS_sat = control.ss(Agamma, Bgamma, Cgamma, Dgamma)
+            print("State space representation y_csat 𝛼: ", SS_sat)
+            print("Transfer function: ", control.tf(SS_sat))
         ymax_finder = RootFinding(SS_sat, alpha_max)
-        ymax = ymax_finder.newton(ymax_finder.saturation, ymax_finder.derivative)
-        print(f"We found 𝛾_max = {ymax[0]} rad with {ymax[1]} iterations")
+        ymax = ymax_finder.closed_form()
+        print(f"We found 𝛾_max = {ymax} rad")
+        return ymax
 
     def compute_alpha_max(self, params, alpha_eq):
         '''
@@ -117,34 +155,94 @@ class AutoPilot:
         print("alpha_max = ", alpha_max, " rad")
         return alpha_max
 
-    def plot_q_feedback(self, closed_tf_ss_q):
-        Yqcl, Tqcl = control.matlab.step(closed_tf_ss_q, np.arange(0, 5, 0.01))
-        self.iron.neon_curve([Tqcl], [Yqcl])
-        plt.plot([0, Tqcl[-1]], [Yqcl[-1], Yqcl[-1]], '--', color='#C56D1C', lw=1)
-        plt.plot([0, Tqcl[-1]], [1.05 * Yqcl[-1], 1.05 * Yqcl[-1]], '--', color='#C56D1C', lw=1)
-        plt.plot([0, Tqcl[-1]], [0.95 * Yqcl[-1], 0.95 * Yqcl[-1]], '--', color='#C56D1C', lw=1)
+    @staticmethod
+    def _loop_step(A, B, C, D, name):
+        '''
+        Step response of a loop over at most LOOP_PLOT_HORIZON, and its settling time at 5 %: nan when the loop
+        diverges, taken from the response over the whole settling horizon when it has not settled within the window
+        :param name: name of the loop in the messages
+        :return: time vector, response, settling time (s) and final value (DC gain -C A⁻¹ B + D, see final_value, nan
+        when the loop diverges)
+        '''
+        Y, T = ss_step(A, B, C, D, response_grid(A, B, C, max_horizon=LOOP_PLOT_HORIZON))
+        if diverges(A, B, C):
+            print(f"The {name} loop is unstable, its step response diverges and never settles")
+            return T, Y, np.nan, np.nan
+        y_final = float(final_value(A, B, C, D)[0, 0])
+        if settling_horizon([(A, B, C)]) > T[-1]:
+            Y_settling, T_settling = ss_step(A, B, C, D, response_grid(A, B, C))
+            return T, Y, step_info(T_settling, Y_settling)[2], y_final
+        return T, Y, step_info(T, Y)[2], y_final
+
+    @staticmethod
+    def _settling_band(plt, T, y_final):
+        '''
+        Draw the final value and the ±5 % band of the settling time on a step response figure, not when the loop
+        diverges (nan final value)
+        '''
+        if not np.isfinite(y_final):
+            return
+        for level in (y_final, 1.05 * y_final, 0.95 * y_final):
+            plt.plot([0, T[-1]], [level, level], '--', color='#C56D1C', lw=1)
+
+    @classmethod
+    def _settling_marker(cls, plt, T, Y, Ts):
+        '''
+        Mark the settling time on a step response figure, when it is within the plotted window
+        '''
+        if not T[0] <= Ts <= T[-1]:
+            return
+        from scipy.interpolate import interp1d
+
+        y = interp1d(T, Y)(Ts)
+        plt.plot(Ts, y, 'D', color='#D4F7F9')
+        plt.annotate(round(Ts, 4), xy=(Ts, y), xytext=(Ts + cls.text_offset, y - cls.text_offset),
+                     arrowprops=dict(facecolor='#D4F7F9', edgecolor='#D4F7F9', shrink=0.05, width=cls.arrow_width,
+                                     headlength=cls.arrow_head_length))
+
+    @tracer.traced('autopilot')
+    def q_feedback_response(self, Aq, Bq, Cq, Dq):
+        Tqcl, Yqcl, Tsqcl, yqcl_final = self._loop_step(Aq, Bq, Cq, Dq, 'q')
+        print(f'q Settling time 5% = {Tsqcl} s')
+        return {'T': Tqcl, 'Y': Yqcl, 'Ts': Tsqcl, 'y_final': yqcl_final}
+
+    def plot_q_feedback(self, Aq, Bq, Cq, Dq, output_dir=None, formats=('png',), show=True):
+        self.render_q_feedback(self.q_feedback_response(Aq, Bq, Cq, Dq), output_dir, formats, show)
+
+    @classmethod
+    @tracer.traced('figure')
+    def render_q_feedback(cls, data, output_dir=None, formats=('png',), show=True):
+        from matplotlib import pyplot as plt
+        from src.SuperStyle.ironman import IronMan
+
+        Tqcl, Yqcl, Tsqcl = data['T'], data['Y'], data['Ts']
+        IronMan().neon_curve([Tqcl], [Yqcl])
+        cls._settling_band(plt, Tqcl, data['y_final'])
         plt.minorticks_on()
         plt.title(r'Step response $q/q_c$')
         plt.xlabel('Time (s)')
         plt.ylabel(r'$q$ (rad/s)')
 
-        Osqcl, Trqcl, Tsqcl = step_info(Tqcl, Yqcl)
-        yyqcl = interp1d(Tqcl, Yqcl)
-        plt.plot(Tsqcl, yyqcl(Tsqcl), 'D', color='#D4F7F9')
-        plt.annotate(round(Tsqcl, 4), xy=(Tsqcl, yyqcl(Tsqcl)), xytext=(Tsqcl + self.text_offset, yyqcl(Tsqcl) - self.text_offset),
-                     arrowprops=dict(facecolor='#D4F7F9', edgecolor='#D4F7F9', shrink=0.05, width=self.arrow_width, headlength=self.arrow_head_length))
-        print(f'q Settling time 5% = {Tsqcl} s')
+        cls._settling_marker(plt, Tqcl, Yqcl, Tsqcl)
 
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\q_feedback.png")
-        except:
-            print("Error while saving the figure")
-        plt.show()
+        finish_figure("q_feedback", output_dir, formats, show)
 
-    def plot_q_open_closed_loop(self, TqDm_tf):
+    @tracer.traced('autopilot')
+    def q_open_closed_loop_response(self, TqDm_tf, tau=WASHOUT_TAU):
+        '''
+        α step responses of the aircraft alone and with the q loop, with and without washout filter
+        :param TqDm_tf: short period q/δm, transfer function, or StateSpace in state space mode
+        :param tau: time constant of the washout filter (s)
+        '''
+        if self.state_space:
+            return self._q_open_closed_loop_state_space(TqDm_tf, tau)
 
-        tau = 0.7
+        import control.matlab
+
+        # same time grid as in state space mode
+        ss_TqDm = control.ss(TqDm_tf)
+        TqDm_ss = StateSpace(ss_TqDm.A, ss_TqDm.B, ss_TqDm.C, ss_TqDm.D)
+        t = WashoutDesign(self.A, self.B, TqDm_ss, self.Kr).time_grid([tau])
         tf_washout_filter = control.tf([tau, 0], [tau, 1])
         tf_washout_filter_closed = control.feedback(self.Kr, TqDm_tf * tf_washout_filter)
 
@@ -154,78 +252,102 @@ class AutoPilot:
         tf_α = control.tf(ss_α)
         tf_α_washout = control.series(1 / self.Kr, tf_washout_filter_closed, tf_α)
         tf_α_no_washout = control.series(1 / self.Kr, control.feedback(self.Kr, TqDm_tf), tf_α)
-        t = np.arange(0, 15, 0.01)
 
         y, t = control.matlab.step(tf_α, t)
-        plt.plot(t, y, label="Alpha α", color="#C56D1C")
-        y, t = control.matlab.step(tf_α_no_washout, t)
-        plt.plot(t, y, label="Alpha α no washout", color="#D4F7F9")
-        y, t = control.matlab.step(tf_α_washout, t)
-        plt.plot(t, y, linestyle=(0, (5, 10)), color="#C0AB19", label="Alpha α washout")
+        y_no_washout, t = control.matlab.step(tf_α_no_washout, t)
+        y_washout, t = control.matlab.step(tf_α_washout, t)
+        return {'t': np.asarray(t), 'y': np.asarray(y), 'y_no_washout': np.asarray(y_no_washout),
+                'y_washout': np.asarray(y_washout)}
+
+    def _q_open_closed_loop_state_space(self, TqDm_ss, tau):
+        washout_filter_closed = feedback(gain(self.Kr), series(WashoutDesign.washout_filter(tau), TqDm_ss))
+
+        C_alpha = np.array([[0, 1, 0, 0, 0]])
+        ss_α = StateSpace(self.A, self.B, C_alpha, self.D)
+        ss_α_washout = series(gain(1 / self.Kr), washout_filter_closed, ss_α)
+        ss_α_no_washout = series(gain(1 / self.Kr), feedback(gain(self.Kr), TqDm_ss), ss_α)
+        t = WashoutDesign(self.A, self.B, TqDm_ss, self.Kr).time_grid([tau])
+
+        y = simulator.step(*ss_α, t)[:, 0, 0]
+        y_no_washout = simulator.step(*ss_α_no_washout, t)[:, 0, 0]
+        y_washout = simulator.step(*ss_α_washout, t)[:, 0, 0]
+        return {'t': t, 'y': y, 'y_no_washout': y_no_washout, 'y_washout': y_washout}
+
+    def plot_q_open_closed_loop(self, TqDm_tf, output_dir=None, formats=('png',), show=True, tau=WASHOUT_TAU):
+        self.render_q_open_closed_loop(self.q_open_closed_loop_response(TqDm_tf, tau), output_dir, formats, show)
+
+    @staticmethod
+    @tracer.traced('figure')
+    def render_q_open_closed_loop(data, output_dir=None, formats=('png',), show=True):
+        from matplotlib import pyplot as plt
+        from src.SuperStyle.ironman import IronMan
+
+        t = data['t']
+        IronMan()
+        plt.plot(t, data['y'], label="Alpha α", color="#C56D1C")
+        plt.plot(t, data['y_no_washout'], label="Alpha α no washout", color="#D4F7F9")
+        plt.plot(t, data['y_washout'], linestyle=(0, (5, 10)), color="#C0AB19", label="Alpha α washout")
         plt.title("With/Without washout filter")
         plt.grid(alpha=0.2)
         plt.legend()
         plt.xlabel('Time (s)')
         plt.ylabel(r'$α$')
 
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\q_washout_filter.png")
-        except:
-            print("Error while saving the figure")
+        finish_figure("q_washout_filter", output_dir, formats, show)
 
-        plt.show()
+    @tracer.traced('autopilot')
+    def gamma_feedback_response(self, Agamma, Bgamma, Cgamma, Dgamma):
+        Tgamma, Ygamma, Ts_gamma, ygamma_final = self._loop_step(Agamma, Bgamma, Cgamma, Dgamma, '𝛾')
+        print(f'𝛾 Settling time 5% = {Ts_gamma} s')
+        return {'T': Tgamma, 'Y': Ygamma, 'Ts': Ts_gamma, 'y_final': ygamma_final}
 
-    def plot_gamma_feedback(self, closed_tf_ss_gamma):
-        Ygamma, Tgamma = control.matlab.step(closed_tf_ss_gamma, np.arange(0, 10, 0.01))
-        self.iron.neon_curve([Tgamma], [Ygamma])
-        plt.plot([0, Tgamma[-1]], [Ygamma[-1], Ygamma[-1]], '--', lw=1, color='#C56D1C')
-        plt.plot([0, Tgamma[-1]], [1.05 * Ygamma[-1], 1.05 * Ygamma[-1]], '--', lw=1, color='#C56D1C')
-        plt.plot([0, Tgamma[-1]], [0.95 * Ygamma[-1], 0.95 * Ygamma[-1]], '--', lw=1, color='#C56D1C')
+    def plot_gamma_feedback(self, Agamma, Bgamma, Cgamma, Dgamma, output_dir=None, formats=('png',), show=True):
+        self.render_gamma_feedback(self.gamma_feedback_response(Agamma, Bgamma, Cgamma, Dgamma), output_dir, formats,
+                                   show)
+
+    @classmethod
+    @tracer.traced('figure')
+    def render_gamma_feedback(cls, data, output_dir=None, formats=('png',), show=True):
+        from matplotlib import pyplot as plt
+        from src.SuperStyle.ironman import IronMan
+
+        Tgamma, Ygamma, Ts_gamma = data['T'], data['Y'], data['Ts']
+        IronMan().neon_curve([Tgamma], [Ygamma])
+        cls._settling_band(plt, Tgamma, data['y_final'])
         plt.minorticks_on()
         plt.title(r'Step response $𝛾/𝛾_c$')
         plt.xlabel('Time (s)')
         plt.ylabel(r'$𝛾$ (rad/s)')
         plt.grid(alpha=0.2)
 
-        Os_gamma, Tr_gamma, Ts_gamma = step_info(Tgamma, Ygamma)
-        yy_gamma = interp1d(Tgamma, Ygamma)
-        plt.plot(Ts_gamma, yy_gamma(Ts_gamma), 'D', color='#D4F7F9')
-        plt.annotate(round(Ts_gamma, 4), xy=(Ts_gamma, yy_gamma(Ts_gamma)), xytext=(Ts_gamma + self.text_offset, yy_gamma(Ts_gamma) - self.text_offset),
-                     arrowprops=dict(facecolor='#D4F7F9', edgecolor='#D4F7F9', shrink=0.05, width=self.arrow_width, headlength=self.arrow_head_length))
-        print(f'𝛾 Settling time 5% = {Ts_gamma} s')
+        cls._settling_marker(plt, Tgamma, Ygamma, Ts_gamma)
 
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\gamma_feedback.png")
-        except:
-            print("Error while saving the figure")
-        plt.show()
-
-    def plot_z_feedback(self, closed_tf_ss_z):
-        Yzcl, Tzcl = control.matlab.step(closed_tf_ss_z, np.arange(0, 10, 0.1))
-        self.iron.neon_curve([Tzcl], [Yzcl])
-        plt.plot([0, Tzcl[-1]], [Yzcl[-1], Yzcl[-1]], '--', lw=1, color='#C56D1C')
-        plt.plot([0, Tzcl[-1]], [1.05 * Yzcl[-1], 1.05 * Yzcl[-1]], '--', lw=1, color='#C56D1C')
-        plt.plot([0, Tzcl[-1]], [0.95 * Yzcl[-1], 0.95 * Yzcl[-1]], '--', lw=1, color='#C56D1C')
+        finish_figure("gamma_feedback", output_dir, formats, show)
+
+    @tracer.traced('autopilot')
+    def z_feedback_response(self, Az, Bz, Cz, Dz):
+        Tzcl, Yzcl, Tszcl, yzcl_final = self._loop_step(Az, Bz, Cz, Dz, 'z')
+        print('z Settling time 5%% = %f s' % Tszcl)
+        return {'T': Tzcl, 'Y': Yzcl, 'Ts': Tszcl, 'y_final': yzcl_final}
+
+    def plot_z_feedback(self, Az, Bz, Cz, Dz, output_dir=None, formats=('png',), show=True):
+        self.render_z_feedback(self.z_feedback_response(Az, Bz, Cz, Dz), output_dir, formats, show)
+
+    @classmethod
+    @tracer.traced('figure')
+    def render_z_feedback(cls, data, output_dir=None, formats=('png',), show=True):
+        from matplotlib import pyplot as plt
+        from src.SuperStyle.ironman import IronMan
+
+        Tzcl, Yzcl, Tszcl = data['T'], data['Y'], data['Ts']
+        IronMan().neon_curve([Tzcl], [Yzcl])
+        cls._settling_band(plt, Tzcl, data['y_final'])
         plt.minorticks_on()
         plt.title(r'Step response $z/z_c$')
         plt.xlabel('Time (s)')
         plt.ylabel(r'$z$ (rad/s)')
         plt.grid(alpha=0.2)
 
-        Oszcl, Trzcl, Tszcl = step_info(Tzcl, Yzcl)
-        yyzcl = interp1d(Tzcl, Yzcl)
-        plt.plot(Tszcl, yyzcl(Tszcl), 'D', color='#D4F7F9')
-        plt.annotate(round(Tszcl, 4), xy=(Tszcl, yyzcl(Tszcl)),
-                     xytext=(Tszcl + self.text_offset, yyzcl(Tszcl) - self.text_offset),
-                     arrowprops=dict(facecolor='#D4F7F9', edgecolor='#D4F7F9', shrink=0.05, width=self.arrow_width,
-                                     headlength=self.arrow_head_length))
-        print('z Settling time 5%% = %f s' % Tszcl)
+        cls._settling_marker(plt, Tzcl, Yzcl, Tszcl)
 
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\z_feedback.png")
-        except:
-            print("Error while saving the figure")
-        plt.show()
+        finish_figure("z_feedback", output_dir, formats, show)
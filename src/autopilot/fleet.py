@@ -0,0 +1,254 @@
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.aircraft.registry import registry
+from src.autopilot.robustness import LOOPS, loop_characteristics
+
+# columns of the summary table, in order
+SUMMARY_COLUMNS = (
+    'name', 'status', 'error', 'mach', 'Veq', 'alpha_eq', 'Fpx_eq', 'trim_iterations',
+    'short_period_damping', 'short_period_frequency', 'short_period_alpha_settling_time',
+    'short_period_q_settling_time', 'phugoid_damping', 'phugoid_frequency', 'phugoid_V_settling_time',
+    'phugoid_gamma_settling_time', 'Kr', 'Kgamma', 'Kz',
+    'q_damping', 'q_frequency', 'q_stable', 'q_settling_time',
+    'gamma_damping', 'gamma_frequency', 'gamma_stable', 'gamma_settling_time',
+    'z_damping', 'z_frequency', 'z_stable', 'z_settling_time',
+    'gamma_max', 'alpha_max', 'elapsed', 'digest', 'path',
+)
+SUMMARY_FILE = 'summary.json'
+MODEL_FILE = 'model.npz'
+
+
+def read_fleet(source):
+    '''
+    :param source: directory of aircraft definitions (every .json file in it), or manifest listing them, either a
+    text file (one name or path per line, # for comments) or a json list. Relative paths are taken from the manifest
+    directory, names from the assets directory (see ParamsRegistry).
+    :return: dict name -> absolute path of the definition, names are the file names, made unique with the parent
+    directory when several definitions share one
+    '''
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.endswith('.json')]
+    else:
+        with open(source) as f:
+            if source.endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [line.split('#')[0].strip() for line in f]
+        base = os.path.dirname(os.path.abspath(source))
+        paths = [entry if not (os.path.splitext(entry)[1] == '.json' or os.path.dirname(entry))
+                 else os.path.join(base, entry) for entry in entries if entry]
+    paths = [registry.resolve(path) for path in paths]
+    if not paths:
+        raise Exception(f"No aircraft definition found in {source}")
+
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    fleet = {}
+    for stem, path in zip(stems, paths):
+        name = stem if stems.count(stem) == 1 else f"{os.path.basename(os.path.dirname(path))}-{stem}"
+        if name in fleet:
+            raise Exception(f"{path} and {fleet[name]} are both named {name}")
+        fleet[name] = path
+    return fleet
+
+
+def _digest(path):
+    '''
+    :return: sha256 of a definition file, read from its raw bytes when the registry cannot parse it
+    '''
+    try:
+        return registry.digest(path)
+    except Exception:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+
+def _least_damped(A):
+    damping, frequency, stable = loop_characteristics(np.asarray(A, dtype=float)[None])
+    return float(damping[0]), float(frequency[0]), bool(stable[0])
+
+
+def _save(path, write, mode='w', newline=None):
+    '''
+    :param write: function writing the content to an open file
+    '''
+    # written to a temporary file first, an interrupted run never leaves a partial artifact behind
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, mode, newline=newline) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def analyse_aircraft(name, path, output_dir, options):
+    '''
+    Run the pipeline of main.py on one aircraft definition: trim, state space model, short period and phugoid modes,
+    q, 𝛾 and z loops, 𝛾_max and α_max. The matrices are saved to output_dir/name/model.npz, the summary row to
+    output_dir/name/summary.json, written last so that its presence marks a finished aircraft.
+    :param name: name of the aircraft in the fleet
+    :param path: path of its definition
+    :param output_dir: directory of the per-aircraft artifacts
+    :param options: design_gains (tune the gains of each aircraft with design_gains instead of the default ones) and
+    xispec (damping ratio of the tuned loops)
+    :return: summary row, status 'failed' and the error message when the pipeline raised
+    '''
+    from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+    from src.autopilot.autopilot import AutoPilot
+    from src.autopilot.gain_schedule import design_gains
+    from src.flight_dynamics.Phugoid import Phugoid
+    from src.flight_dynamics.ShortPeriod import ShortPeriod
+
+    directory = os.path.join(output_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    row = {'name': name, 'status': 'ok', 'error': '', 'digest': '', 'path': path}
+    start = time.perf_counter()
+    try:
+        # a malformed definition fails here and is reported in its row like any other failure
+        row['digest'] = _digest(path)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            aircraft = AircraftStability(aircraft=path)
+            alpha_eq = aircraft.compute_equilibrium_newton()
+            row.update(mach=aircraft.Mach, Veq=aircraft.Veq, alpha_eq=alpha_eq, Fpx_eq=aircraft.Fpx_eq,
+                       trim_iterations=aircraft.trim_info['iterations'])
+            A, B, C, D, eigen_values = StateSpaceModel(aircraft).model()
+
+            short_period, phugoid = ShortPeriod(A, B), Phugoid(A, B)
+            row['short_period_damping'], row['short_period_frequency'] = _least_damped(short_period.As)[:2]
+            row['phugoid_damping'], row['phugoid_frequency'] = _least_damped(phugoid.Ap)[:2]
+            responses = short_period.responses()
+            row['short_period_alpha_settling_time'], row['short_period_q_settling_time'] = \
+                responses['Tsa'], responses['Tsq']
+            responses = phugoid.responses()
+            row['phugoid_V_settling_time'], row['phugoid_gamma_settling_time'] = responses['Tsv'], responses['Tsg']
+
+            gains = design_gains(A[1:, 1:], B[1:], options['xispec']) if options['design_gains'] else None
+            auto_pilot = AutoPilot(A, B, gains=gains, state_space=True)
+            row.update(Kr=auto_pilot.Kr, Kgamma=auto_pilot.Kgamma, Kz=auto_pilot.Kz)
+            q = auto_pilot.compute_q_feedback()[:4]
+            gamma = auto_pilot.compute_gamma_feedback(*q)[:4]
+            z = auto_pilot.compute_z_feedback(*gamma)[:4]
+            for loop, system, response in zip(LOOPS, (q, gamma, z), (auto_pilot.q_feedback_response,
+                                                                      auto_pilot.gamma_feedback_response,
+                                                                      auto_pilot.z_feedback_response)):
+                damping, frequency, stable = _least_damped(system[0])
+                row.update({f'{loop}_damping': damping, f'{loop}_frequency': frequency, f'{loop}_stable': stable})
+                # a diverging loop never settles
+                row[f'{loop}_settling_time'] = float(response(*system)['Ts']) if stable else np.nan
+
+            p = aircraft.get_params()
+            row['gamma_max'] = auto_pilot.compute_gamma_max(*gamma, alpha_eq, p['alpha_0']['value'])
+            row['alpha_max'] = auto_pilot.compute_alpha_max(p, alpha_eq)
+
+        matrices = {'A': A, 'B': B, 'C': C, 'D': D, 'eigen_values': eigen_values,
+                    'gains': np.array([auto_pilot.Kr, auto_pilot.Kgamma, auto_pilot.Kz])}
+        for loop, system in zip(LOOPS, (q, gamma, z)):
+            matrices.update({f'{matrix}{loop}': value for matrix, value in zip('ABCD', system)})
+        _save(os.path.join(directory, MODEL_FILE), lambda f: np.savez(f, **matrices), 'wb')
+    except Exception as error:
+        row.update(status='failed', error=f"{type(error).__name__}: {error}")
+        with open(os.path.join(directory, 'error.txt'), 'w') as f:
+            f.write(traceback.format_exc())
+
+    row['elapsed'] = time.perf_counter() - start
+    row = {key: value.item() if isinstance(value, np.generic) else value for key, value in row.items()}
+    _save(os.path.join(directory, SUMMARY_FILE),
+          lambda f: json.dump({'options': options, 'row': row}, f, indent=2))
+    return row
+
+
+class FleetAnalysis:
+
+    def __init__(self, fleet, output_dir, design_gains=False, xispec=0.7):
+        '''
+        :param fleet: dict name -> path of the aircraft definitions, see read_fleet
+        :param output_dir: directory of the summary table and of one artifact directory per aircraft
+        :param design_gains: tune the gains of each aircraft instead of using the default ones
+        :param xispec: damping ratio of the tuned loops
+        '''
+        self.fleet = fleet
+        self.output_dir = output_dir
+        self.options = {'design_gains': design_gains, 'xispec': xispec}
+        self.rows = {}
+
+    def _done(self, name):
+        '''
+        :return: summary row of an aircraft analysed by a previous run with the same options and the same definition
+        file, None otherwise
+        '''
+        try:
+            with open(os.path.join(self.output_dir, name, SUMMARY_FILE)) as f:
+                summary = json.load(f)
+            digest = _digest(self.fleet[name])
+        except (OSError, ValueError):
+            return None
+        row = summary['row']
+        if summary['options'] != self.options or row['digest'] != digest:
+            return None
+        return row
+
+    def run(self, max_workers=None, force=False):
+        '''
+        Analyse every aircraft on a process pool, one task per aircraft. The aircraft already analysed (same
+        definition file and options) are skipped, so an interrupted run resumes where it stopped. The disk cache of
+        the trim, models and loops is left as configured (off unless AUTOPILOT_CACHE=1, which the workers inherit).
+        :param max_workers: number of processes, all the cores by default
+        :param force: analyse every aircraft again
+        :return: summary rows, by name
+        '''
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.rows = {} if force else {name: row for name in self.fleet if (row := self._done(name)) is not None}
+        pending = [name for name in self.fleet if name not in self.rows]
+        print(f"Fleet: {len(self.fleet)} aircraft, {len(self.rows)} already analysed, {len(pending)} to analyse")
+        if not pending:
+            return self.rows
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(pending))) as pool:
+            futures = {pool.submit(analyse_aircraft, name, self.fleet[name], self.output_dir, self.options): name
+                       for name in pending}
+            for count, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                self.rows[row['name']] = row
+                print(f"[{count}/{len(pending)}] {row['name']}: {row['status']}"
+                      + (f" ({row['error']})" if row['error'] else f" in {row['elapsed']:.2f} s"))
+        print(f"Analysed {len(pending)} aircraft in {time.perf_counter() - start:.2f} s")
+        return self.rows
+
+    def summary(self, formats=('csv',)):
+        '''
+        Write the summary table of the fleet, one row per aircraft in the order of the fleet
+        :param formats: csv and/or parquet (needs pandas and pyarrow)
+        :return: paths of the written tables
+        '''
+        if not self.rows:
+            raise Exception("The run method must be called before writing the summary.")
+        rows = [self.rows[name] for name in self.fleet if name in self.rows]
+        paths = []
+        for fmt in formats:
+            path = os.path.join(self.output_dir, f'summary.{fmt}')
+            if fmt == 'csv':
+                def write(f):
+                    writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, restval='')
+                    writer.writeheader()
+                    writer.writerows(rows)
+                _save(path, write, newline='')
+            elif fmt == 'parquet':
+                import pandas as pd
+
+                _save(path, lambda f: pd.DataFrame(rows, columns=list(SUMMARY_COLUMNS)).to_parquet(f, index=False),
+                      'wb')
+            else:
+                raise Exception(f"Unknown summary format {fmt}, expected csv or parquet")
+            paths.append(path)
+
+        failed = [row['name'] for row in rows if row['status'] != 'ok']
+        print(f"Summary of {len(rows)} aircraft written to {', '.join(paths)}"
+              + (f", {len(failed)} failed: {', '.join(failed)}" if failed else ""))
+        return paths
@@ -0,0 +1,138 @@
+import bisect
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.autopilot.gain_tuner import GainTuner
+
+GAIN_NAMES = ('Kr', 'Kgamma', 'Kz')
+
+C_Q = np.array([[0, 0, 1, 0, 0]])
+C_GAMMA = np.array([[1, 0, 0, 0, 0]])
+C_Z = np.array([[0, 0, 0, 0, 1]])
+
+
+def design_gains(A, B, xispec=0.7):
+    '''
+    Design the q, 𝛾 and z cascade of AutoPilot for one linearized model
+    :param A, B: reduced state space model (𝛾, α, q, θ, z) as used by AutoPilot
+    :param xispec: required damping ratio of each loop
+    :return: Kr, Kgamma, Kz
+    '''
+    Kr = GainTuner(A, B, C_Q, xispec=xispec).tune()
+    Aq, Bq = A - Kr * B @ C_Q, Kr * B
+    Kgamma = GainTuner(Aq, Bq, C_GAMMA, xispec=xispec).tune()
+    Agamma, Bgamma = Aq - Kgamma * Bq @ C_GAMMA, Kgamma * Bq
+    Kz = GainTuner(Agamma, Bgamma, C_Z, xispec=xispec).tune()
+    return float(Kr), float(Kgamma), float(Kz)
+
+
+def design_point(condition, xispec=0.7):
+    '''
+    Trim and linearize the aircraft at one flight condition, then design its gains
+    :param condition: (Mach, altitude in m)
+    :return: Kr, Kgamma, Kz
+    '''
+    from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+
+    mach, altitude = condition
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        aircraft = AircraftStability(mach, altitude)
+        aircraft.compute_equilibrium()
+        A, B, C, D, eigen_values = StateSpaceModel(aircraft).model()
+    return design_gains(A[1:, 1:], B[1:], xispec)
+
+
+class GainScheduleBuilder:
+
+    def __init__(self, mach, altitude, xispec=0.7):
+        '''
+        :param mach: increasing Mach numbers of the grid
+        :param altitude: increasing altitudes (m) of the grid
+        :param xispec: required damping ratio of each loop
+        '''
+        self.mach = np.asarray(mach, dtype=float)
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.xispec = xispec
+        self.gains = None
+
+    def build(self, max_workers=None):
+        '''
+        Design the gains of every grid point on a process pool
+        :param max_workers: number of processes, all the cores by default
+        :return: gains table of shape (len(mach), len(altitude), 3)
+        '''
+        conditions = [(m, h) for m in self.mach for h in self.altitude]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            gains = list(pool.map(design_point, conditions, [self.xispec] * len(conditions),
+                                  chunksize=max(1, len(conditions) // (4 * (os.cpu_count() or 1)))))
+        self.gains = np.array(gains).reshape(len(self.mach), len(self.altitude), len(GAIN_NAMES))
+        return self.gains
+
+    def save(self, path):
+        if self.gains is None:
+            raise Exception("The build method must be called before saving the gain schedule.")
+        np.savez(path, mach=self.mach, altitude=self.altitude, gains=self.gains)
+        print(f"Gain schedule saved to {path}")
+
+
+class GainSchedule:
+    '''
+    Bilinear interpolation of a gain table saved by GainScheduleBuilder, clamped to the edges of the grid.
+    Scalar lookups stay in plain Python so that they cost a few microseconds.
+    '''
+
+    def __init__(self, mach, altitude, gains):
+        self.mach = np.asarray(mach, dtype=float)
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.gains = np.asarray(gains, dtype=float)
+        self._mach = self.mach.tolist()
+        self._altitude = self.altitude.tolist()
+        self._gains = [[tuple(point) for point in row] for row in self.gains.tolist()]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as table:
+            return cls(table['mach'], table['altitude'], table['gains'])
+
+    @staticmethod
+    def _locate(grid, x):
+        i = min(max(bisect.bisect_right(grid, x) - 1, 0), max(len(grid) - 2, 0))
+        if len(grid) == 1:
+            return i, i, 0.0
+        t = (x - grid[i]) / (grid[i + 1] - grid[i])
+        return i, i + 1, min(max(t, 0.0), 1.0)
+
+    def __call__(self, mach, altitude):
+        '''
+        :return: Kr, Kgamma, Kz interpolated at (mach, altitude)
+        '''
+        i0, i1, u = self._locate(self._mach, mach)
+        j0, j1, v = self._locate(self._altitude, altitude)
+        g00, g01 = self._gains[i0][j0], self._gains[i0][j1]
+        g10, g11 = self._gains[i1][j0], self._gains[i1][j1]
+        return tuple((1 - u) * ((1 - v) * a + v * b) + u * ((1 - v) * c + v * d)
+                     for a, b, c, d in zip(g00, g01, g10, g11))
+
+    def lookup(self, mach, altitude):
+        '''
+        Vectorized lookup
+        :param mach, altitude: arrays of flight conditions
+        :return: gains array of shape (..., 3)
+        '''
+        mach, altitude = np.broadcast_arrays(np.asarray(mach, dtype=float), np.asarray(altitude, dtype=float))
+        i0, i1, u = self._locate_array(self.mach, mach)
+        j0, j1, v = self._locate_array(self.altitude, altitude)
+        u, v = u[..., None], v[..., None]
+        return ((1 - u) * ((1 - v) * self.gains[i0, j0] + v * self.gains[i0, j1])
+                + u * ((1 - v) * self.gains[i1, j0] + v * self.gains[i1, j1]))
+
+    @staticmethod
+    def _locate_array(grid, x):
+        i = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, max(len(grid) - 2, 0))
+        if len(grid) == 1:
+            return i, i, np.zeros_like(x)
+        t = (x - grid[i]) / (grid[i + 1] - grid[i])
+        return i, i + 1, np.clip(t, 0.0, 1.0)
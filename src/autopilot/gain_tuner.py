@@ -0,0 +1,198 @@
+import numpy as np
+
+from src.flight_dynamics.frequency import frequency_response
+
+
+class GainTuner:
+    '''
+    Headless replacement of the sisopy31 root locus GUI.
+
+    in       _____    _____    out
+    --->O--->[_k_]--->[_G_]--+-->
+      - ^                    |
+        |____________________|
+
+    The closed loop poles of every candidate gain are the eigenvalues of A - k/(1 + kD) B C, evaluated for a whole
+    array of gains with a single stacked eigenvalue call.
+    '''
+
+    def __init__(self, A, B, C, D=None, xispec=0.7, settling_time=None, phase_margin=None,
+                 kmin=1e-4, kmax=1e2, sign=None):
+        '''
+        :param A, B, C, D: open loop state space representation of G (single input, single output)
+        :param xispec: required damping ratio of the closed loop poles
+        :param settling_time: maximum settling time at 5% (s), estimated from the slowest closed loop pole
+        :param phase_margin: minimum phase margin of the open loop k*G (deg)
+        :param kmin, kmax: range of the gain magnitude explored along the root locus
+        :param sign: 1 or -1 to restrict the sign of the gain, both signs are explored by default
+        '''
+        self.A = np.asarray(A, dtype=float)
+        self.B = np.asarray(B, dtype=float).reshape(-1, 1)
+        self.C = np.asarray(C, dtype=float).reshape(1, -1)
+        self.D = 0.0 if D is None else float(np.asarray(D, dtype=float).reshape(-1)[0])
+        self.BC = self.B @ self.C
+        self.xispec = xispec
+        self.settling_time = settling_time
+        self.phase_margin = phase_margin
+        self.kmin = kmin
+        self.kmax = kmax
+        self.signs = (-1, 1) if sign is None else (sign,)
+        self.n_gains = 400
+        self.n_refine = 8
+        self.zero_tol = 1e-8
+        self.omega = np.logspace(-3, 3, 2000)
+        self._G = None
+
+        # characteristics of the tuned gain
+        self.gain = None
+        self.xi = None
+        self.Ts = None
+        self.pm = None
+
+    def closed_loop_poles(self, gains):
+        '''
+        :param gains: array of candidate gains
+        :return: closed loop poles, one row per gain
+        '''
+        gains = np.asarray(gains, dtype=float)
+        scale = gains / (1 + gains * self.D)
+        return np.linalg.eigvals(self.A[None, :, :] - scale[:, None, None] * self.BC[None, :, :])
+
+    def damping(self, gains):
+        '''
+        :param gains: array of candidate gains
+        :return: smallest damping ratio, settling time at 5% (s) and stability of each closed loop
+        '''
+        poles = self.closed_loop_poles(gains)
+        w = np.abs(poles)
+        # integrators left untouched by the loop do not take part in the choice
+        moving = w > self.zero_tol
+        xi = np.where(moving, -poles.real / np.where(moving, w, 1), np.inf).min(axis=1)
+        stable = np.all((poles.real < 0) | ~moving, axis=1)
+        sigma = np.where(moving, -poles.real, np.inf).min(axis=1)
+        Ts = np.where(stable, 3 / np.where(sigma > 0, sigma, 1), np.inf)
+        return xi, Ts, stable
+
+    def margins(self, gains):
+        '''
+        :param gains: array of candidate gains
+        :return: phase margin (deg) of the open loop k*G for each gain, inf when the gain never crosses 0 dB.
+        The margin is the angular distance to the critical point at the worst crossover, stability is checked on the
+        closed loop poles.
+        '''
+        if self._G is None:
+            self._G = frequency_response(self.A, self.B, self.C, [[self.D]], self.omega)[:, 0, 0]
+        gains = np.asarray(gains, dtype=float)
+        magnitude = np.abs(gains)[:, None] * np.abs(self._G)[None, :]
+        phase = np.angle(self._G, deg=True)[None, :] + np.where(gains < 0, 180.0, 0.0)[:, None]
+        pm = 180.0 - np.abs(np.mod(phase + 180.0, 360.0) - 180.0)
+        crossing = (magnitude[:, :-1] - 1) * (magnitude[:, 1:] - 1) <= 0
+        return np.where(crossing, pm[:, :-1], np.inf).min(axis=1)
+
+    def _refine(self, lo, hi):
+        '''
+        Shrink every bracket [lo, hi] of the damping specification together, n_refine times
+        '''
+        n_sub = 9
+        t = np.linspace(0, 1, n_sub)
+        for _ in range(self.n_refine):
+            log_lo, log_hi = np.log(np.abs(lo)), np.log(np.abs(hi))
+            candidates = np.sign(lo)[:, None] * np.exp(log_lo[:, None] + t[None, :] * (log_hi - log_lo)[:, None])
+            xi = self.damping(candidates.ravel())[0].reshape(candidates.shape) - self.xispec
+            change = np.sign(xi[:, :-1]) != np.sign(xi[:, 1:])
+            j = np.argmax(change, axis=1)
+            rows = np.arange(len(lo))
+            lo, hi = candidates[rows, j], candidates[rows, j + 1]
+        return np.sign(lo) * np.sqrt(np.abs(lo) * np.abs(hi))
+
+    def _score(self, gains, reached):
+        '''
+        :return: settling time of each gain (minus the damping ratio when no gain reaches xispec), inf where the gain
+        breaks a specification
+        '''
+        xi, Ts, stable = self.damping(gains)
+        valid = stable.copy()
+        if reached:
+            valid &= xi >= self.xispec
+        if self.settling_time is not None:
+            valid &= Ts <= self.settling_time
+        if self.phase_margin is not None:
+            valid &= self.margins(gains) >= self.phase_margin
+        return np.where(valid, Ts if reached else -xi, np.inf)
+
+    def _golden_section(self, lo, hi, reached, n_iter=40):
+        '''
+        Minimize the score of the gains between lo and hi (same sign) by golden-section search on log|k|
+        :return: best gain found and its score
+        '''
+        sign, ratio = np.sign(lo), (np.sqrt(5) - 1) / 2
+        a, b = np.log(np.abs(lo)), np.log(np.abs(hi))
+
+        def score(log_k):
+            return self._score(np.array([sign * np.exp(log_k)]), reached)[0]
+
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        fc, fd = score(c), score(d)
+        for _ in range(n_iter):
+            if fc <= fd:
+                b, d, fd = d, c, fc
+                c = b - ratio * (b - a)
+                fc = score(c)
+            else:
+                a, c, fc = c, d, fd
+                d = a + ratio * (b - a)
+                fd = score(d)
+        log_k, f = (c, fc) if fc <= fd else (d, fd)
+        return float(sign * np.exp(log_k)), f
+
+    def tune(self):
+        '''
+        Bracket the gains where the least damped closed loop pole crosses xispec and refine them. The fastest gain
+        among these crossings and the grid gains damped beyond xispec, meeting the settling time and phase margin
+        specifications, is kept, then refined by a golden-section search between its neighbouring grid gains so that
+        it does not stay snapped to the grid.
+        :return: the tuned gain
+        '''
+        magnitudes = np.logspace(np.log10(self.kmin), np.log10(self.kmax), self.n_gains)
+        candidates = []
+        for sign in self.signs:
+            gains = sign * magnitudes
+            xi = self.damping(gains)[0] - self.xispec
+            candidates.append(gains[xi >= 0])
+            brackets = np.flatnonzero(np.sign(xi[:-1]) != np.sign(xi[1:]))
+            if len(brackets):
+                candidates.append(self._refine(gains[brackets], gains[brackets + 1]))
+        candidates = np.concatenate(candidates)
+        reached = len(candidates) > 0
+        if not reached:
+            print("No gain reaches the damping specification, keeping the best damped stable loop")
+            candidates = np.concatenate([sign * magnitudes for sign in self.signs])
+
+        xi, Ts, stable = self.damping(candidates)
+        pm = self.margins(candidates)
+        valid = stable.copy()
+        if self.settling_time is not None:
+            valid &= Ts <= self.settling_time
+        if self.phase_margin is not None:
+            valid &= pm >= self.phase_margin
+        if not valid.any():
+            print("No gain meets every specification, keeping the closest stable one")
+            valid = stable if stable.any() else np.ones_like(stable)
+
+        if reached:
+            best = np.argmin(np.where(valid, Ts, np.inf))
+        else:
+            best = np.argmax(np.where(valid, xi, -np.inf))
+        gain = float(candidates[best])
+
+        # the fastest gain is usually an interior minimum of Ts along the root locus, found between the grid gains
+        # around it (a refined crossing may also be beaten by a gain just inside the damped range)
+        i = np.searchsorted(magnitudes, abs(gain))
+        lo, hi = magnitudes[max(i - 1, 0)], magnitudes[min(i + 1, len(magnitudes) - 1)]
+        refined, score = self._golden_section(np.sign(gain) * lo, np.sign(gain) * hi, reached)
+        if score < self._score(np.array([gain]), reached)[0]:
+            gain = refined
+
+        xi, Ts, stable = self.damping([gain])
+        self.gain, self.xi, self.Ts, self.pm = gain, xi[0], Ts[0], self.margins([gain])[0]
+        return self.gain
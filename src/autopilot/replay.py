@@ -0,0 +1,316 @@
+import io
+import mmap
+import os
+
+import numpy as np
+
+from src.flight_dynamics.simulation import simulator
+from src.misc.tracing import tracer
+
+# columns of a flight-test log, in the order of the reduced AutoPilot state (𝛾, α, q, θ, z) when they are measured
+LOG_STATES = {'gamma': 0, 'alpha': 1, 'q': 2, 'theta': 3, 'altitude': 4}
+
+
+class TelemetryLog:
+    '''
+    Flight-test log memory-mapped from a .npy file (2D float array or structured array) or a .csv file (one sample
+    per line, optional header line), read in chunks of a fixed number of samples. Only the current chunk is held in
+    memory, whatever the size of the file.
+    '''
+
+    def __init__(self, path, columns=None, delimiter=','):
+        '''
+        :param path: .npy or .csv file
+        :param columns: names of the columns, read from the structured dtype or the csv header by default
+        :param delimiter: separator of the csv values
+        '''
+        self.path = path
+        self.delimiter = delimiter
+        self.extension = os.path.splitext(path)[1].lower()
+        if self.extension == '.npy':
+            self._array = np.load(path, mmap_mode='r')
+            names = self._array.dtype.names
+            if names is None and self._array.ndim != 2:
+                raise Exception(f"{path} must hold a 2D array or a structured array")
+        elif self.extension == '.csv':
+            self._array = None
+            with open(path, 'rb') as f:
+                first = f.readline()
+                second = f.readline()
+            names = None
+            try:
+                [float(value) for value in first.split(delimiter.encode())]
+                self._data_start = 0
+                sample = first
+            except ValueError:
+                names = tuple(name.strip() for name in first.decode().split(delimiter))
+                self._data_start = len(first)
+                sample = second
+            # bytes per line, to size the blocks parsed at once
+            self._line_bytes = max(len(sample), 1)
+            self._n_values = len(sample.split(delimiter.encode())) if sample.strip() else len(names or ())
+        else:
+            raise Exception(f"Unsupported log format {self.extension}, expected .npy or .csv")
+
+        if columns is not None:
+            names = tuple(columns)
+        if names is None:
+            raise Exception(f"The columns of {path} must be named")
+        self.columns = tuple(names)
+
+    def _index(self, columns):
+        columns = self.columns if columns is None else tuple(columns)
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise Exception(f"Unknown column(s) {', '.join(missing)} in {self.path}, available: {', '.join(self.columns)}")
+        return columns, [self.columns.index(name) for name in columns]
+
+    def _npy_blocks(self, chunk_size, columns, index):
+        array = self._array
+        for start in range(0, len(array), chunk_size):
+            block = array[start:start + chunk_size]
+            if array.dtype.names is None:
+                yield np.array(block[:, index], dtype=float)
+            else:
+                yield np.column_stack([np.asarray(block[name], dtype=float) for name in columns])
+
+    def _bad_line(self, lines, first_line):
+        '''
+        :param lines: lines of a block that failed to parse
+        :param first_line: line number (1-based) of the first one in the file
+        :return: description of the first line without n_values numbers
+        '''
+        for number, line in enumerate(lines, first_line):
+            if not line.strip():
+                continue
+            values = line.split(self.delimiter)
+            try:
+                [float(value) for value in values]
+            except ValueError:
+                return f"line {number} of {self.path} is not numeric: {line.strip()!r}"
+            if len(values) != self._n_values:
+                return f"line {number} of {self.path} holds {len(values)} values instead of {self._n_values}"
+        return f"{self.path} could not be parsed from line {first_line}"
+
+    def _csv_blocks(self, chunk_size, index):
+        n_values = self._n_values
+        line = 2 if self._data_start else 1  # number of the first line of the next block
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = self._data_start
+            block_bytes = max(chunk_size * self._line_bytes, 1 << 16)
+            while start < size:
+                end = min(start + block_bytes, size)
+                if end < size:
+                    # cut after the last complete line of the block, or after the line when it is longer
+                    cut = mm.rfind(b'\n', start, end)
+                    end = cut + 1 if cut >= 0 else (mm.find(b'\n', end) + 1 or size)
+                text = mm[start:end]
+                first_line, line, start = line, line + text.count(b'\n'), end
+                if not text.strip():
+                    continue
+                try:
+                    values = np.loadtxt(io.BytesIO(text), dtype=float, delimiter=self.delimiter, ndmin=2)
+                except ValueError:
+                    raise Exception(self._bad_line(text.decode().splitlines(), first_line)) from None
+                if values.shape[1] != n_values:
+                    raise Exception(self._bad_line(text.decode().splitlines(), first_line))
+                yield values[:, index]
+
+    def chunks(self, chunk_size=1 << 16, columns=None):
+        '''
+        :param chunk_size: number of samples per chunk (the last one may be shorter)
+        :param columns: names of the columns to read, all of them by default
+        :return: generator of float arrays (chunk_size, len(columns))
+        '''
+        columns, index = self._index(columns)
+        blocks = self._npy_blocks(chunk_size, columns, index) if self._array is not None \
+            else self._csv_blocks(chunk_size, index)
+
+        # the csv blocks follow line boundaries, they are cut again to chunk_size samples
+        pending, n_pending = [], 0
+        for block in blocks:
+            pending.append(block)
+            n_pending += len(block)
+            if n_pending < chunk_size:
+                continue
+            merged = np.concatenate(pending) if len(pending) > 1 else pending[0]
+            n_full = (len(merged) // chunk_size) * chunk_size
+            for start in range(0, n_full, chunk_size):
+                yield merged[start:start + chunk_size]
+            pending = [merged[n_full:]] if n_full < len(merged) else []
+            n_pending = len(merged) - n_full
+        if n_pending:
+            yield np.concatenate(pending)
+
+
+class RunningStats:
+    '''
+    Mean, standard deviation, RMS and largest absolute value of every column of a stream of arrays, merged chunk by
+    chunk (Chan's parallel variance update), so that the stream is never held in memory.
+    '''
+
+    def __init__(self, n_columns):
+        self.count = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.max_abs = np.zeros(n_columns)
+
+    def update(self, values):
+        '''
+        :param values: array (n_samples, n_columns)
+        '''
+        n = len(values)
+        if n == 0:
+            return
+        mean = values.mean(axis=0)
+        centered = values - mean
+        m2 = np.einsum('ij,ij->j', centered, centered)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * n / total)
+        self.max_abs = np.maximum(self.max_abs, np.maximum(values.max(axis=0), -values.min(axis=0)))
+        self.count = total
+
+    def summary(self, names):
+        '''
+        :param names: names of the columns
+        :return: dict name -> count, mean, std, rms, max_abs
+        '''
+        variance = self.m2 / self.count if self.count else np.full_like(self.m2, np.nan)
+        return {name: {'count': self.count, 'mean': float(self.mean[i]), 'std': float(np.sqrt(variance[i])),
+                       'rms': float(np.sqrt(variance[i] + self.mean[i] ** 2)), 'max_abs': float(self.max_abs[i])}
+                for i, name in enumerate(names)}
+
+
+class TelemetryReplay:
+    '''
+    Replays logged inputs through a linear model discretized with a zero-order hold at the log rate and compares its
+    outputs with the logged ones, chunk by chunk, the model state being carried from one chunk to the next.
+
+    Samples are propagated by blocks of `block` samples: with the Markov parameters H_0 = D, H_k = C Ad^(k-1) Bd, the
+    outputs of a block are C Ad^j x_0 + Σ H_(j-i) u_i, two matrix products for all the blocks of a chunk, and only the
+    block initial states x_0 follow the recurrence x <- Ad^block x + [Ad^(block-1) Bd ... Bd] u in a loop.
+    '''
+
+    def __init__(self, A, B, C, D, dt, inputs, outputs, offsets=None, block=128):
+        '''
+        :param A, B, C, D: continuous state space model, deviations from trim
+        :param dt: sample time of the log (s)
+        :param inputs: log columns of the model inputs, in the order of the columns of B
+        :param outputs: log columns compared with the model outputs, in the order of the rows of C
+        :param offsets: trim values removed from the log columns, by column name (e.g. the trim altitude)
+        :param block: number of samples propagated together
+        '''
+        A, B, C, D = (np.atleast_2d(np.asarray(M, dtype=float)) for M in (A, B, C, D))
+        if B.shape[1] != len(inputs) or C.shape[0] != len(outputs):
+            raise Exception(f"The model has {B.shape[1]} input(s) and {C.shape[0]} output(s), "
+                            f"{len(inputs)} input and {len(outputs)} output column(s) were given")
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        offsets = {} if offsets is None else offsets
+        self.offsets = np.array([offsets.get(name, 0.0) for name in self.inputs + self.outputs], dtype=float)
+        self.dt = dt
+        self.block = block
+        self.C, self.D = C, D
+        self.Ad, self.Bd = simulator.discretize(A, B, dt)
+
+        n, m, p = A.shape[0], B.shape[1], C.shape[0]
+        powers = [np.eye(n)]
+        for _ in range(block):
+            powers.append(self.Ad @ powers[-1])
+        self.block_A = powers[block]
+        # [Ad^(block-1) Bd ... Bd] and C Ad^j, j < block
+        self.block_B = np.hstack([powers[block - 1 - i] @ self.Bd for i in range(block)])
+        self.observability = np.vstack([C @ powers[j] for j in range(block)])
+        markov = [D] + [C @ powers[k - 1] @ self.Bd for k in range(1, block)]
+        toeplitz = np.zeros((block * p, block * m))
+        for j in range(block):
+            for i in range(j + 1):
+                toeplitz[j * p:(j + 1) * p, i * m:(i + 1) * m] = markov[j - i]
+        self.toeplitz = toeplitz
+        self.x = np.zeros(n)
+
+    @classmethod
+    def open_loop(cls, auto_pilot, dt, elevator='elevator', outputs=('gamma', 'q', 'altitude'), offsets=None,
+                  block=128):
+        '''
+        Replay of the logged elevator through the aircraft alone, the reduced model (𝛾, α, q, θ, z) of AutoPilot
+        :param auto_pilot: AutoPilot holding the reduced model
+        :param elevator: log column of the elevator deflection
+        :param outputs: log columns compared with the model, among gamma, alpha, q, theta and altitude
+        '''
+        C = np.eye(len(LOG_STATES))[[LOG_STATES[name] for name in outputs]]
+        return cls(auto_pilot.A, auto_pilot.B, C, np.zeros((len(outputs), 1)), dt, (elevator,), outputs, offsets,
+                   block)
+
+    @classmethod
+    def closed_loop(cls, A, B, C, D, dt, command='z_c', output='altitude', states=('gamma', 'q'), offsets=None,
+                    block=128):
+        '''
+        Replay of the logged command through a closed loop of the cascade, e.g. (Az, Bz, Cz, Dz) of compute_z_feedback
+        :param A, B, C, D: closed loop state space model, of state (𝛾, α, q, θ, z)
+        :param command: log column of the command of the loop
+        :param output: log column compared with the output C x + D u of the loop
+        :param states: log columns of other states compared with the model, among gamma, alpha, q, theta and altitude
+        '''
+        C = np.vstack((np.atleast_2d(C), np.eye(len(LOG_STATES))[[LOG_STATES[name] for name in states]]))
+        D = np.vstack((np.atleast_2d(D), np.zeros((len(states), 1))))
+        return cls(A, B, C, D, dt, (command,), (output,) + tuple(states), offsets, block)
+
+    def reset(self, x0=None):
+        '''
+        :param x0: state of the model at the first sample, trim (zero) by default
+        '''
+        self.x = np.zeros(len(self.Ad)) if x0 is None else np.array(x0, dtype=float)
+
+    def predict(self, u):
+        '''
+        Outputs of the model over a chunk of inputs, continuing from the state left by the previous chunk
+        :param u: inputs (n_samples, m), deviations from trim
+        :return: outputs (n_samples, p)
+        '''
+        n_samples, m = u.shape
+        p = self.C.shape[0]
+        b = self.block
+        n_blocks = n_samples // b
+        y = np.empty((n_samples, p))
+        x = self.x
+
+        if n_blocks:
+            U = u[:n_blocks * b].reshape(n_blocks, b * m)
+            W = U @ self.block_B.T
+            X = np.empty((n_blocks, len(x)))
+            block_A = self.block_A
+            for k in range(n_blocks):
+                X[k] = x
+                x = block_A @ x + W[k]
+            y[:n_blocks * b] = (X @ self.observability.T + U @ self.toeplitz.T).reshape(n_blocks * b, p)
+
+        # samples left after the last complete block
+        for k in range(n_blocks * b, n_samples):
+            y[k] = self.C @ x + self.D @ u[k]
+            x = self.Ad @ x + self.Bd @ u[k]
+        self.x = x
+        return y
+
+    @tracer.traced('replay')
+    def run(self, log, chunk_size=1 << 16, callback=None):
+        '''
+        Stream a whole log through the model
+        :param log: TelemetryLog
+        :param chunk_size: number of samples per chunk
+        :param callback: called with (measured outputs, predicted outputs) of every chunk, e.g. to plot or save them
+        :return: residual (measured - predicted) statistics by output column: count, mean, std, rms, max_abs
+        '''
+        stats = RunningStats(len(self.outputs))
+        m = len(self.inputs)
+        for chunk in log.chunks(chunk_size, self.inputs + self.outputs):
+            chunk = chunk - self.offsets
+            predicted = self.predict(chunk[:, :m])
+            measured = chunk[:, m:]
+            stats.update(measured - predicted)
+            if callback is not None:
+                callback(measured, predicted)
+        return stats.summary(self.outputs)
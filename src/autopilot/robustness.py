@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.aircraft.envelope import EnvelopeStability, EnvelopeStateSpaceModel
+from src.autopilot.gain_schedule import C_Q, C_GAMMA, C_Z
+
+# relative dispersion of the uncertain parameters: ('normal', standard deviation) or ('uniform', half width)
+DEFAULT_UNCERTAINTIES = {
+    'm': ('normal', 0.05),
+    'rg': ('normal', 0.05),
+    'Cz_alpha': ('normal', 0.10),
+    'Cm_q': ('normal', 0.10),
+    'c': ('uniform', 0.05),
+    'f': ('uniform', 0.05),
+    'f_delta': ('uniform', 0.05),
+}
+
+LOOPS = ('q', 'gamma', 'z')
+
+
+def loop_characteristics(A):
+    '''
+    :param A: stacked closed loop state matrices (n, k, k)
+    :return: damping ratio and pulsation (rad/s) of the least damped pole, and stability of each loop
+    '''
+    poles = np.linalg.eigvals(A)
+    w = np.abs(poles)
+    # integrators left untouched by the loops are ignored
+    moving = w > 1e-8
+    xi = np.where(moving, -poles.real / np.where(moving, w, 1), np.inf)
+    least_damped = np.argmin(xi, axis=1)
+    rows = np.arange(len(A))
+    stable = np.all((poles.real < 0) | ~moving, axis=1)
+    return xi[rows, least_damped], w[rows, least_damped], stable
+
+
+def _run_chunk(monte_carlo, n, seed):
+    return monte_carlo.evaluate(monte_carlo.sample(n, np.random.default_rng(seed)))
+
+
+class MonteCarlo:
+
+    def __init__(self, p=None, gains=None, uncertainties=None, mach=None, altitude=None):
+        '''
+        :param p: nominal aircraft parameters (params.json layout), params.json by default
+        :param gains: (Kr, Kgamma, Kz), the AutoPilot gains by default
+        :param uncertainties: relative dispersion of each uncertain parameter, DEFAULT_UNCERTAINTIES by default
+        :param mach, altitude: flight condition (altitude in m), the study point of params.json by default. Without
+        altitude the air density and speed of sound of the study point are used, as in AircraftStability (and the
+        gains tuned on it), instead of the standard atmosphere at alt_m
+        '''
+        if p is None:
+            from src.aircraft.aircraft import Params
+            p = Params.p
+        if gains is None:
+            from src.autopilot.autopilot import DEFAULT_GAINS
+            gains = DEFAULT_GAINS
+        self.p = p
+        self.gains = tuple(gains)
+        self.uncertainties = DEFAULT_UNCERTAINTIES if uncertainties is None else uncertainties
+        self.mach = self.p['Mach']['value'] if mach is None else mach
+        self.altitude = self.p['alt_m']['value'] if altitude is None else altitude
+        if altitude is None:
+            from src.aircraft.aircraft import study_point_atmosphere
+            self.rho, self.Vsound = study_point_atmosphere(self.p)
+        else:
+            self.rho = self.Vsound = None
+        self.results = None
+
+    def sample(self, n, rng):
+        '''
+        :param n: number of samples
+        :param rng: numpy random generator
+        :return: sampled value of each uncertain parameter
+        '''
+        samples = {}
+        for name, (distribution, dispersion) in self.uncertainties.items():
+            nominal = self.p[name]['value']
+            if distribution == 'normal':
+                samples[name] = nominal * (1 + dispersion * rng.standard_normal(n))
+            elif distribution == 'uniform':
+                samples[name] = nominal * (1 + rng.uniform(-dispersion, dispersion, n))
+            else:
+                raise Exception(f"Unknown distribution {distribution} for {name}")
+        return samples
+
+    def evaluate(self, samples):
+        '''
+        Trim, linearize and close the q, 𝛾 and z loops of every sample at once
+        :param samples: sampled value of each uncertain parameter
+        :return: damping, pulsation and stability of each loop, one value per sample
+        '''
+        p = {key: dict(value) for key, value in self.p.items()}
+        for name, values in samples.items():
+            p[name]['value'] = values
+
+        envelope = EnvelopeStability(p, self.mach, self.altitude, rho=self.rho, Vsound=self.Vsound)
+        envelope.compute_equilibrium()
+        A, B, C, D, eigen_values = EnvelopeStateSpaceModel(envelope).model()
+        A, B = A[..., 1:, 1:], B[..., 1:, :]
+
+        Kr, Kgamma, Kz = self.gains
+        Aq, Bq = A - Kr * B @ C_Q, Kr * B
+        Agamma, Bgamma = Aq - Kgamma * Bq @ C_GAMMA, Kgamma * Bq
+        Az = Agamma - Kz * Bgamma @ C_Z
+
+        results = {}
+        for loop, A_loop in zip(LOOPS, (Aq, Agamma, Az)):
+            damping, frequency, stable = loop_characteristics(A_loop)
+            results[f'{loop}_damping'] = damping
+            results[f'{loop}_frequency'] = frequency
+            results[f'{loop}_stable'] = stable
+        return results
+
+    def run(self, n, chunk_size=10000, max_workers=None, seed=None):
+        '''
+        Evaluate n samples, split in chunks spread over a process pool
+        :param n: number of samples
+        :param chunk_size: number of samples evaluated by one task
+        :param max_workers: number of processes, all the cores by default
+        :param seed: seed of the random generator, the chunks get independent streams spawned from it
+        :return: damping, pulsation and stability of each loop, one value per sample
+        '''
+        sizes = [min(chunk_size, n - start) for start in range(0, n, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        if len(sizes) == 1:
+            chunks = [_run_chunk(self, sizes[0], seeds[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(sizes))) as pool:
+                chunks = list(pool.map(_run_chunk, [self] * len(sizes), sizes, seeds))
+        self.results = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+        return self.results
+
+    def summary(self):
+        '''
+        :return: for each loop, the probability of stability and the mean, standard deviation, 5th and 95th
+        percentiles of the damping ratio and pulsation
+        '''
+        if self.results is None:
+            raise Exception("The run method must be called before asking for a summary.")
+        summary = {}
+        print("------------------- Monte Carlo robustness -------------------")
+        for loop in LOOPS:
+            stable = self.results[f'{loop}_stable']
+            summary[loop] = {'stability_probability': float(np.mean(stable))}
+            print(f"{loop} loop: P(stable) = {summary[loop]['stability_probability']:.4f}")
+            for quantity in ('damping', 'frequency'):
+                values = self.results[f'{loop}_{quantity}']
+                p5, p95 = np.percentile(values, [5, 95])
+                summary[loop][quantity] = {'mean': float(np.mean(values)), 'std': float(np.std(values)),
+                                           'p5': float(p5), 'p95': float(p95)}
+                print(f"    {quantity}: mean = {np.mean(values):.4f}, std = {np.std(values):.4f}, "
+                      f"[p5, p95] = [{p5:.4f}, {p95:.4f}]")
+        return summary
@@ -1,6 +1,38 @@
-import control
 import numpy as np
 
+from src.flight_dynamics.simulation import simulator, ss_step
+from src.flight_dynamics.time_grid import response_grid
+from src.misc.tracing import tracer
+
+
+def alpha_max_from_load_factor(alpha_eq, alpha0, delta_nz):
+    '''
+    :param alpha_eq: equilibrium angle(s) of attack
+    :param alpha0: zero lift angle(s) of attack
+    :param delta_nz: transverse load factor(s)
+    :return: maximum angle(s) of attack, broadcast over the inputs
+    '''
+    return np.asarray(alpha_eq) + (np.asarray(alpha_eq) - np.asarray(alpha0)) * np.asarray(delta_nz)
+
+
+def gamma_max_batch(A, B, C, D, alpha_max, t=None):
+    '''
+    Closed form 𝛾_max for many flight conditions and many limits at once. The loop being linear, the peak of the
+    response to a 𝛾 command scales with the command, so 𝛾_max = alpha_max / peak of the unit step response.
+    :param A, B, C, D: stacked state space matrices of the 𝛾 loops, shape (n_sys, ...)
+    :param alpha_max: limits broadcast against (n_sys, k): a 1-D array is shared by every system, a (n_sys, k) array
+    holds the limits of each system (e.g. from alpha_max_from_load_factor with alpha_eq[:, None])
+    :param t: evenly spaced time vector (s) of the step responses, planned from the poles up to the peaks by default
+    :return: 𝛾_max of shape (n_sys, k), inf where the response never becomes positive
+    '''
+    if t is None:
+        t = response_grid(A, B, C, peak=True)
+    peak = simulator.step(A, B, C, D, t)[..., 0, 0].max(axis=-1)
+    if np.ndim(A) < 3:
+        peak = np.atleast_1d(peak)
+    alpha_max = np.atleast_2d(np.asarray(alpha_max, dtype=float))
+    return np.where(peak[:, None] > 0, alpha_max / np.where(peak > 0, peak, 1)[:, None], np.inf)
+
 
 class RootFinding:
 
@@ -8,16 +40,31 @@ class RootFinding:
         self.SS_sat = SS_sat
         self.alpha_max = alpha_max
         self.nz = 3.1
+        # only the peak of the response matters
+        self.t = response_grid(SS_sat.A, SS_sat.B, SS_sat.C, peak=True)
 
     def saturation(self, gamma):
-        alpha, t = control.matlab.step(gamma * self.SS_sat)
+        alpha, t = ss_step(self.SS_sat.A, gamma * self.SS_sat.B, self.SS_sat.C, gamma * self.SS_sat.D, self.t)
         diff = np.max(alpha) - self.alpha_max
         return diff
 
+    @tracer.traced('autopilot')
+    def closed_form(self):
+        '''
+        Exact 𝛾_max from a single unit step response, the peak scaling linearly with 𝛾
+        :return: gamma_max
+        '''
+        y, t = ss_step(self.SS_sat.A, self.SS_sat.B, self.SS_sat.C, self.SS_sat.D, self.t)
+        peak = np.max(y)
+        if peak <= 0:
+            return np.inf
+        return self.alpha_max / peak
+
     def derivative(self, f, x0, h):
         df = (f(x0 + h) - f(x0)) / h
         return df
 
+    @tracer.traced('autopilot')
     def newton(self, f, df):
         '''
         :param f: saturation
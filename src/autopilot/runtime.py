@@ -0,0 +1,79 @@
+class DiscreteAutoPilot:
+    '''
+    q / 𝛾 / z cascade of the AutoPilot run as a sampled controller, one tick() per sample:
+        δm = δm_eq + Kr (Kgamma (Kz (z_c - z) - 𝛾) - q_f)
+    where q_f is the pitch rate, optionally through the washout filter τs / (τs + 1) discretized with Tustin's method.
+
+    Every coefficient is computed once in the constructor and the filter memory lives in two attributes, so tick()
+    only does scalar arithmetic: no array, list or dict is created per sample.
+    '''
+
+    def __init__(self, gains=None, rate=100.0, washout_tau=None, delta_m_eq=0.0, delta_m_limits=None):
+        '''
+        :param gains: (Kr, Kgamma, Kz), the AutoPilot gains by default
+        :param rate: sampling rate (Hz), typically 100 Hz to 1 kHz
+        :param washout_tau: time constant (s) of the washout filter on q (0.7 s in AutoPilot), no filter by default
+        :param delta_m_eq: trim elevator deflection (rad) added to the command
+        :param delta_m_limits: (min, max) elevator deflection (rad), unlimited by default
+        '''
+        if gains is None:
+            from src.autopilot.autopilot import DEFAULT_GAINS
+            gains = DEFAULT_GAINS
+        if rate <= 0:
+            raise Exception("The sampling rate must be positive.")
+        self.Kr, self.Kgamma, self.Kz = (float(gain) for gain in gains)
+        self.rate = float(rate)
+        self.dt = 1 / self.rate
+        self.delta_m_eq = float(delta_m_eq)
+        self.delta_m_min, self.delta_m_max = (-float('inf'), float('inf')) if delta_m_limits is None \
+            else (float(delta_m_limits[0]), float(delta_m_limits[1]))
+
+        # Tustin: y_k = a y_k-1 + b (u_k - u_k-1)
+        self.washout = washout_tau is not None
+        if self.washout:
+            tau = float(washout_tau)
+            self.washout_a = (2 * tau - self.dt) / (2 * tau + self.dt)
+            self.washout_b = 2 * tau / (2 * tau + self.dt)
+        else:
+            self.washout_a, self.washout_b = 0.0, 1.0
+
+        self.z_c = None
+        self.gamma_c = 0.0
+        self.q_prev = 0.0
+        self.q_filtered = 0.0
+
+    def set_command(self, z_c=None, gamma_c=0.0):
+        '''
+        :param z_c: altitude command (deviation from the trim altitude, m), z hold when given
+        :param gamma_c: flight path angle command (rad), tracked when no altitude is commanded
+        '''
+        self.z_c = None if z_c is None else float(z_c)
+        self.gamma_c = float(gamma_c)
+
+    def reset(self):
+        '''
+        Clear the filter memory, e.g. before engaging the autopilot
+        '''
+        self.q_prev = 0.0
+        self.q_filtered = 0.0
+
+    def tick(self, measurements):
+        '''
+        :param measurements: (𝛾, α, q, θ, z) deviations from trim, the reduced state of AutoPilot
+        :return: elevator deflection δm (rad)
+        '''
+        gamma = measurements[0]
+        q = measurements[2]
+
+        if self.washout:
+            self.q_filtered = self.washout_a * self.q_filtered + self.washout_b * (q - self.q_prev)
+            self.q_prev = q
+            q = self.q_filtered
+
+        gamma_c = self.gamma_c if self.z_c is None else self.Kz * (self.z_c - measurements[4])
+        delta_m = self.delta_m_eq + self.Kr * (self.Kgamma * (gamma_c - gamma) - q)
+        if delta_m < self.delta_m_min:
+            return self.delta_m_min
+        if delta_m > self.delta_m_max:
+            return self.delta_m_max
+        return delta_m
@@ -0,0 +1,68 @@
+import collections
+
+import numpy as np
+
+# continuous state space system, unpacks as (A, B, C, D) and is accepted wherever an object with .A .B .C .D is
+StateSpace = collections.namedtuple('StateSpace', 'A B C D')
+
+
+def gain(k, size=1):
+    '''
+    :return: static gain k, a system without state
+    '''
+    return StateSpace(np.zeros((0, 0)), np.zeros((0, size)), np.zeros((size, 0)), k * np.eye(size))
+
+
+def series(*systems):
+    '''
+    Series interconnection u -> systems[0] -> systems[1] -> ... -> y, the states being stacked in the same order
+    :return: StateSpace
+    '''
+    A1, B1, C1, D1 = systems[0]
+    for A2, B2, C2, D2 in systems[1:]:
+        n1, n2 = A1.shape[0], A2.shape[0]
+        A1 = np.block([[A1, np.zeros((n1, n2))], [B2 @ C1, A2]])
+        B1 = np.vstack((B1, B2 @ D1))
+        C1 = np.hstack((D2 @ C1, C2))
+        D1 = D2 @ D1
+    return StateSpace(A1, B1, C1, D1)
+
+
+def feedback(G, H, sign=-1):
+    '''
+    Closed loop of G with H in its feedback path: y = G e, e = u + sign * H y
+    :param G: forward system
+    :param H: feedback system
+    :param sign: -1 for negative feedback
+    :return: StateSpace, the states of G followed by those of H
+    '''
+    A1, B1, C1, D1 = G
+    A2, B2, C2, D2 = H
+    C2, D2 = -sign * C2, -sign * D2
+    F = np.linalg.inv(np.eye(D1.shape[0]) + D1 @ D2)
+    E = np.linalg.inv(np.eye(D2.shape[0]) + D2 @ D1)
+    A = np.block([[A1 - B1 @ D2 @ F @ C1, -B1 @ E @ C2], [B2 @ F @ C1, A2 - B2 @ F @ D1 @ C2]])
+    B = np.vstack((B1 @ E, B2 @ F @ D1))
+    C = np.hstack((F @ C1, -F @ D1 @ C2))
+    return StateSpace(A, B, C, F @ D1)
+
+
+def damp(A, doprint=True):
+    '''
+    Natural frequencies and damping ratios of the poles, as control.matlab.damp
+    :param A: state matrix
+    :param doprint: print the table of the poles
+    :return: natural frequencies, damping ratios, poles
+    '''
+    poles = np.linalg.eigvals(A)
+    wn = np.abs(poles)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zeta = -poles.real / wn
+    if doprint:
+        print('    Eigenvalue (pole)       Damping     Frequency')
+        for p, z, w in zip(poles, zeta, wn):
+            if abs(p.imag) < 1e-12:
+                print("           %10.4g    %10.4g    %10.4g" % (p.real, 1.0, w))
+            else:
+                print("%10.4g%+10.4gj    %10.4g    %10.4g" % (p.real, p.imag, z, w))
+    return wn, zeta, poles
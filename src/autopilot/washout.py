@@ -0,0 +1,130 @@
+import numpy as np
+
+from src.autopilot.state_space import StateSpace, feedback, gain, series
+from src.flight_dynamics.simulation import simulator
+from src.flight_dynamics.step_metrics import step_metrics
+from src.flight_dynamics.time_grid import common_grid
+from src.misc.tracing import tracer
+
+C_ALPHA = np.array([[0, 1, 0, 0, 0]])
+
+
+class WashoutDesign:
+    '''
+    Design of the washout filter τs / (τs + 1) of the q loop: the α step responses of the aircraft with the q loop and
+    the filter, as in AutoPilot.q_open_closed_loop_response, are built for every candidate (τ, Kr), stacked and
+    simulated together in a single batched state space run.
+    '''
+
+    def __init__(self, A, B, TqDm_ss, Kr, t=None):
+        '''
+        :param A, B: reduced state space model (𝛾, α, q, θ, z), as AutoPilot.A and AutoPilot.B
+        :param TqDm_ss: short period q/δm, StateSpace
+        :param Kr: gain of the q loop, the candidates keep it unless gains are swept
+        :param t: evenly spaced time vector of the step responses (s), planned from the poles of the candidates of each
+        sweep by default
+        '''
+        self.A = np.asarray(A, dtype=float)
+        self.B = np.asarray(B, dtype=float)
+        self.TqDm_ss = StateSpace(*(np.atleast_2d(np.asarray(M, dtype=float)) for M in TqDm_ss))
+        self.Kr = Kr
+        self.t = None if t is None else np.asarray(t, dtype=float)
+        self.ss_alpha = StateSpace(self.A, self.B, C_ALPHA, np.zeros((1, 1)))
+
+    @staticmethod
+    def washout_filter(tau):
+        '''
+        :return: τs / (τs + 1) = 1 - (1/τ) / (s + 1/τ), StateSpace
+        '''
+        return StateSpace(np.array([[-1 / tau]]), np.array([[1.0]]), np.array([[-1 / tau]]), np.array([[1.0]]))
+
+    def candidate(self, tau, Kr):
+        '''
+        :param tau: time constant of the washout filter (s), None for the q loop without filter
+        :param Kr: gain of the q loop
+        :return: α response to the elevator command, StateSpace
+        '''
+        q_feedback = self.TqDm_ss if tau is None else series(self.washout_filter(tau), self.TqDm_ss)
+        return series(gain(1 / Kr), feedback(gain(Kr), q_feedback), self.ss_alpha)
+
+    def time_grid(self, taus, gains=None):
+        '''
+        :return: time vector shared by the α responses of the aircraft alone, of the q loop without filter and of the
+        candidates, long enough for all of them to settle, see common_grid
+        '''
+        gains = np.atleast_1d(self.Kr if gains is None else gains)
+        systems = [self.ss_alpha] + [self.candidate(None, Kr) for Kr in gains]
+        systems += [self.candidate(tau, Kr) for Kr in gains for tau in np.atleast_1d(taus)]
+        return common_grid(systems)
+
+    @staticmethod
+    def _step(systems, t):
+        '''
+        :param systems: StateSpace of the same order
+        :return: step responses (len(systems), len(t))
+        '''
+        A, B, C, D = (np.stack(matrices) for matrices in zip(*systems))
+        return simulator.step(A, B, C, D, t)[..., 0, 0]
+
+    @tracer.traced('autopilot')
+    def sweep(self, taus, gains=None):
+        '''
+        :param taus: time constants of the washout filter (s)
+        :param gains: gains of the q loop, Kr only by default
+        :return: dict of arrays (len(gains), len(taus)):
+        tau, Kr, alpha_retention (steady state α over the one of the aircraft alone), overshoot (%),
+        settling_time (5 %, s), rise_time (66 %, s), and no_washout_retention (len(gains),) of the q loop without filter,
+        t and the α responses (len(gains), len(taus), len(t))
+        '''
+        taus = np.atleast_1d(np.asarray(taus, dtype=float))
+        gains = np.atleast_1d(np.asarray(self.Kr if gains is None else gains, dtype=float))
+        candidates = [self.candidate(tau, Kr) for Kr in gains for tau in taus]
+        no_washout = [self.candidate(None, Kr) for Kr in gains]
+        # once settled, every washout filter gives α back entirely: the retention is read when the aircraft alone and
+        # the q loop without filter have settled, the candidates only bound the step
+        t = common_grid([self.ss_alpha] + no_washout, resolved=candidates) if self.t is None else self.t
+        # every candidate has the same order, they are stacked and stepped together
+        y = self._step(candidates, t)
+        y_no_washout = self._step(no_washout, t)
+        alpha = simulator.step(*self.ss_alpha, t)[-1, 0, 0]
+
+        metrics = step_metrics(t, y)
+        shape = (len(gains), len(taus))
+        Kr, tau = np.meshgrid(gains, taus, indexing='ij')
+        return {
+            'tau': tau,
+            'Kr': Kr,
+            'alpha_retention': (y[:, -1] / alpha).reshape(shape),
+            'overshoot': metrics['overshoot'].reshape(shape),
+            'settling_time': metrics['settling_time_5'].reshape(shape),
+            'rise_time': metrics['rise_time'].reshape(shape),
+            'no_washout_retention': y_no_washout[:, -1] / alpha,
+            't': t,
+            'responses': y.reshape(shape + (len(t),)),
+        }
+
+    @staticmethod
+    def best(result, min_retention=0.9, max_overshoot=None, doprint=True):
+        '''
+        Fastest settling candidate keeping enough α
+        :param result: sweep result
+        :param min_retention: smallest steady state α retention accepted
+        :param max_overshoot: largest overshoot accepted (%), no limit by default
+        :param doprint: print the chosen candidate
+        :return: dict of the values of the chosen candidate (tau, Kr, alpha_retention, overshoot, settling_time,
+        rise_time)
+        '''
+        keys = ('tau', 'Kr', 'alpha_retention', 'overshoot', 'settling_time', 'rise_time')
+        accepted = result['alpha_retention'] >= min_retention
+        if max_overshoot is not None:
+            accepted &= result['overshoot'] <= max_overshoot
+        if not accepted.any():
+            raise Exception(f"No washout candidate keeps {min_retention:.0%} of α"
+                            + ("" if max_overshoot is None else f" with less than {max_overshoot} % overshoot"))
+        index = np.unravel_index(np.argmin(np.where(accepted, result['settling_time'], np.inf)), accepted.shape)
+        chosen = {key: float(result[key][index]) for key in keys}
+        if doprint:
+            print(f"Washout filter: τ = {chosen['tau']:.3f} s, Kr = {chosen['Kr']:.5f}, "
+                  f"α retention {chosen['alpha_retention']:.1%}, overshoot {chosen['overshoot']:.1f} %, "
+                  f"settling time {chosen['settling_time']:.2f} s")
+        return chosen
@@ -1,7 +1,11 @@
-from control.matlab import dcgain
-from sisopy31 import *
-from src.SuperStyle.ironman import IronMan
-import os
+import numpy as np
+
+from src.flight_dynamics.simulation import simulator
+from src.flight_dynamics.step_metrics import step_info
+from src.flight_dynamics.time_grid import response_grid
+from src.misc.figures import finish_figure
+from src.misc.tracing import tracer
+
 
 class Phugoid:
 
@@ -26,38 +30,82 @@ class Phugoid:
                 f"Phugoid DC Gain of γ/δm = {self.compute_dcgain()} \n")
 
     def compute_ss_v(self):
+        import control.matlab
+
         TvDm_ss = control.ss(self.Ap, self.Bp, self.Cpv, self.Dp)
         return TvDm_ss
 
     def compute_ss_g(self):
+        import control.matlab
+
         TgDm_ss = control.ss(self.Ap, self.Bp, self.Cpg, self.Dp)
         return TgDm_ss
 
+    @tracer.traced('flight_dynamics')
     def compute_damp(self):
+        import control.matlab
+
         TvDm_system_info = control.matlab.damp(self.compute_ss_v(), doprint=False)
         return TvDm_system_info
 
+    @tracer.traced('flight_dynamics')
     def compute_tf(self):
+        import control.matlab
+
         TvDm_tf = control.tf(self.compute_ss_v())
         return TvDm_tf
 
+    @tracer.traced('flight_dynamics')
     def compute_tf_g(self):
+        import control.matlab
+
         TgDm_ss2tf = control.ss2tf(self.compute_ss_g())
         return TgDm_ss2tf
 
+    @tracer.traced('flight_dynamics')
     def compute_dcgain(self):
-        TgDm_dcgain = dcgain(self.compute_tf_g())
+        import control.matlab
+
+        TgDm_dcgain = control.matlab.dcgain(self.compute_tf_g())
         return TgDm_dcgain
 
-    def plot(self):
+    @tracer.traced('flight_dynamics')
+    def responses(self):
+        '''
+        Step responses of V and γ with their settling times, everything the figure needs
+        '''
+        # V and γ responses in a single state space simulation, on a grid planned from the phugoid poles
+        C = np.vstack((self.Cpv, self.Cpg))
+        Tv = Tg = response_grid(self.Ap, self.Bp, C)
+        Y = simulator.step(self.Ap, self.Bp, C, np.zeros((2, 1)), Tv)
+        Yv, Yg = Y[:, 0, 0], Y[:, 1, 0]
+
+        Osv, Trv, Tsv = step_info(Tv, Yv)
+        Osg, Trg, Tsg = step_info(Tg, Yg)
+
+        print(f"V Settling time 5% = {Tsv} s")
+        print(f"𝛾 Settling time 5% = {Tsg} s\n")
+        return {'Tv': Tv, 'Yv': Yv, 'Tsv': Tsv, 'Tg': Tg, 'Yg': Yg, 'Tsg': Tsg}
+
+    def plot(self, output_dir=None, formats=('png',), show=True):
+        self.render(self.responses(), output_dir, formats, show)
+
+    @staticmethod
+    @tracer.traced('figure')
+    def render(data, output_dir=None, formats=('png',), show=True):
+        Tv, Yv, Tsv = data['Tv'], data['Yv'], data['Tsv']
+        Tg, Yg, Tsg = data['Tg'], data['Yg'], data['Tsg']
+
+        # matplotlib is only needed to draw, not to compute the responses
+        from matplotlib import pyplot as plt
+        from scipy.interpolate import interp1d
+        from src.SuperStyle.ironman import IronMan
 
         iron = IronMan()
 
         plt.title(r'Phugoid approximation $V/δm$ et $γ/δm$')
         plt.xlabel('Time (s)')
         plt.ylabel(r'$V$ (m/s) & $γ$ (rad)')
-        Yv, Tv = control.matlab.step(self.compute_tf(), arange(0, 700, 0.1))
-        Yg, Tg = control.matlab.step(self.compute_tf_g(), arange(0, 700, 0.1))
         iron.neon_curve([Tv, Tg], [Yv, Yg])
 
         # Plotting 5% margin around the steady-state value
@@ -69,9 +117,6 @@ class Phugoid:
         plt.plot([0, Tg[-1]], [1.05 * Yg[-1], 1.05 * Yg[-1]], '--', lw=1, color='#D4F7F9')
         plt.plot([0, Tg[-1]], [0.95 * Yg[-1], 0.95 * Yg[-1]], '--', lw=1, color='#D4F7F9')
 
-        Osv, Trv, Tsv = step_info(Tv, Yv)
-        Osg, Trg, Tsg = step_info(Tg, Yg)
-
         # Plotting the settling time (interpolation of the step_info function) and the overshoot value
         arrow_width = 0.01
         arrow_head_length = 4
@@ -86,19 +131,10 @@ class Phugoid:
         plt.annotate(round(Tsg, 4), xy=(Tsg, yyg(Tsg)), xytext=(Tsg - text_offset, yyg(Tsg) - text_offset),
                      arrowprops=dict(facecolor='#D4F7F9', edgecolor='#D4F7F9', shrink=0.05, width=arrow_width, headlength=arrow_head_length))
 
-        print(f"V Settling time 5% = {Tsv} s")
-        print(f"𝛾 Settling time 5% = {Tsg} s\n")
-
         plt.minorticks_on()
         plt.legend((r'$V/δm$', r'$γ/δm$'))
 
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\phugoid.png")
-        except:
-            print("Error while saving the figure")
-
-        plt.show()
+        finish_figure("phugoid", output_dir, formats, show)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,11 @@
-from control.matlab import dcgain
-from sisopy31 import *
-from src.SuperStyle.ironman import IronMan
-import os
+import numpy as np
+
+from src.flight_dynamics.simulation import simulator
+from src.flight_dynamics.step_metrics import step_info
+from src.flight_dynamics.time_grid import response_grid
+from src.misc.figures import finish_figure
+from src.misc.tracing import tracer
+
 
 class ShortPeriod:
 
@@ -26,38 +30,82 @@ class ShortPeriod:
                 f"Short Period DC Gain of q/δm = {self.compute_dcgain()} \n")
 
     def compute_ss_a(self):
+        import control.matlab
+
         TaDm_ss = control.ss(self.As, self.Bs, self.Csa, self.Ds)
         return TaDm_ss
 
     def compute_ss_q(self):
+        import control.matlab
+
         TqDm_ss = control.ss(self.As, self.Bs, self.Csq, self.Ds)
         return TqDm_ss
 
+    @tracer.traced('flight_dynamics')
     def compute_damp(self):
+        import control.matlab
+
         TaDm_system_info = control.matlab.damp(self.compute_ss_a(), doprint=False)
         return TaDm_system_info
 
+    @tracer.traced('flight_dynamics')
     def compute_tf(self):
+        import control.matlab
+
         TaDm_tf = control.tf(self.compute_ss_a())
         return TaDm_tf
 
+    @tracer.traced('flight_dynamics')
     def compute_tf_q(self):
+        import control.matlab
+
         TqDm_ss2tf = control.ss2tf(self.compute_ss_q())
         return TqDm_ss2tf
 
+    @tracer.traced('flight_dynamics')
     def compute_dcgain(self):
-        TqDm_dcgain = dcgain(self.compute_tf_q())
+        import control.matlab
+
+        TqDm_dcgain = control.matlab.dcgain(self.compute_tf_q())
         return TqDm_dcgain
 
-    def plot(self):
+    @tracer.traced('flight_dynamics')
+    def responses(self):
+        '''
+        Step responses of α and q with their settling times, everything the figure needs
+        '''
+        # α and q responses in a single state space simulation, on a grid planned from the short period poles
+        C = np.vstack((self.Csa, self.Csq))
+        Ta = Tq = response_grid(self.As, self.Bs, C)
+        Y = simulator.step(self.As, self.Bs, C, np.zeros((2, 1)), Ta)
+        Ya, Yq = Y[:, 0, 0], Y[:, 1, 0]
+
+        Osa, Tra, Tsa = step_info(Ta, Ya)
+        Osq, Trq, Tsq = step_info(Tq, Yq)
+
+        print(f"α Settling time 5% = {Tsa} s")
+        print(f"q Settling time 5% = {Tsq} s \n")
+        return {'Ta': Ta, 'Ya': Ya, 'Tsa': Tsa, 'Tq': Tq, 'Yq': Yq, 'Tsq': Tsq}
+
+    def plot(self, output_dir=None, formats=('png',), show=True):
+        self.render(self.responses(), output_dir, formats, show)
+
+    @staticmethod
+    @tracer.traced('figure')
+    def render(data, output_dir=None, formats=('png',), show=True):
+        Ta, Ya, Tsa = data['Ta'], data['Ya'], data['Tsa']
+        Tq, Yq, Tsq = data['Tq'], data['Yq'], data['Tsq']
+
+        # matplotlib is only needed to draw, not to compute the responses
+        from matplotlib import pyplot as plt
+        from scipy.interpolate import interp1d
+        from src.SuperStyle.ironman import IronMan
 
         iron = IronMan()
 
         plt.title(r'Short Period approximation $α/δm$ et $q/δm$')
         plt.xlabel('Time (s)')
         plt.ylabel(r'$α$ (rad) & $q$ (rad/s)')
-        Ya, Ta = control.matlab.step(self.compute_tf(), arange(0, 10, 0.1))
-        Yq, Tq = control.matlab.step(self.compute_tf_q(), arange(0, 10, 0.1))
         iron.neon_curve([Ta, Tq], [Ya, Yq])
 
         # Plotting 5% of margin around the steady-state value
@@ -74,8 +122,6 @@ class ShortPeriod:
         arrow_head_length = 4
         text_offset = 1.5
 
-        Osa, Tra, Tsa = step_info(Ta, Ya)
-        Osq, Trq, Tsq = step_info(Tq, Yq)
         yya = interp1d(Ta, Ya)
         plt.plot(Tsa, yya(Tsa), "D", color="#C56D1C", markersize=10)
         plt.annotate(round(Tsa, 4), xy=(Tsa, yya(Tsa)), xytext=(Tsa + text_offset, yya(Tsa) + text_offset),
@@ -88,16 +134,7 @@ class ShortPeriod:
         plt.minorticks_on()
         plt.legend((r'$α/δm$', r'$q/δm$'))
 
-        print(f"α Settling time 5% = {Tsa} s")
-        print(f"q Settling time 5% = {Tsq} s \n")
-
-        # get current dir absolute path
-        path = os.path.abspath(os.getcwd())
-        try:
-            savefig(f"{path}\\src\\misc\\plots\\shortperiod.png")
-        except:
-            print("Error while saving the figure")
-        plt.show()
+        finish_figure("shortperiod", output_dir, formats, show)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+import numpy as np
+
+from src.misc.tracing import tracer
+
+# eigenvector bases worse conditioned than this are treated as defective, see frequency_response
+MAX_CONDITION = 1e8
+
+
+def _stack(A, B, C, D):
+    matrices = [np.asarray(M) for M in (A, B, C, D)]
+    batched = any(M.ndim == 3 for M in matrices)
+    matrices = [M if M.ndim == 3 else M[None] for M in matrices]
+    n_sys = max(M.shape[0] for M in matrices)
+    A, B, C, D = (np.broadcast_to(M, (n_sys,) + M.shape[1:]) for M in matrices)
+    return A, B, C, D, batched
+
+
+def _schur_response(A, B, C, D, jw):
+    '''
+    G(jω) of stacked systems from their complex Schur forms A = Z T Z*, (jωI - T) being triangular its solve is a back
+    substitution carried out for every system and frequency at once
+    '''
+    from scipy.linalg import schur
+
+    T, Z = (np.array(M) for M in zip(*(schur(a, output='complex') for a in A)))
+    ZB = Z.conj().transpose(0, 2, 1) @ B
+    n = A.shape[1]
+    x = np.zeros((len(A), len(jw), n, B.shape[2]), dtype=complex)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(n - 1, -1, -1):
+            rhs = ZB[:, None, i, :] + np.einsum('sj,swjm->swm', T[:, i, i + 1:], x[:, :, i + 1:, :])
+            x[:, :, i, :] = rhs / (jw[None, :, None] - T[:, i, i, None, None])
+    return np.einsum('spn,swnm->swpm', C @ Z, x) + D[:, None]
+
+
+@tracer.traced('frequency')
+def frequency_response(A, B, C, D, w):
+    '''
+    G(jω) = C (jωI - A)⁻¹ B + D of stacked systems over a frequency grid, without any solve per frequency.
+
+    Each A is diagonalized once, A = V Λ V⁻¹, so that G(jω) = Σk (C V)[:, k] (V⁻¹ B)[k, :] / (jω - λk) + D is a sum of
+    first order terms over the whole grid. Systems with repeated poles and dependent eigenvectors (e.g. the integrators
+    of the AutoPilot model) are reduced to their triangular Schur form instead.
+    :param A, B, C, D: state space matrices, optionally stacked along a leading axis
+    :param w: frequencies (rad/s)
+    :return: complex responses of shape (len(w), p, m), or (n_sys, len(w), p, m) for stacked systems
+    '''
+    A, B, C, D, batched = _stack(A, B, C, D)
+    jw = 1j * np.asarray(w, dtype=float)
+
+    eigen_values, V = np.linalg.eig(A)
+    condition = np.linalg.cond(V)
+    G = np.empty((A.shape[0], len(jw), C.shape[1], B.shape[2]), dtype=complex)
+
+    modal = np.isfinite(condition) & (condition < MAX_CONDITION)
+    if modal.any():
+        CV = C[modal] @ V[modal]
+        VB = np.linalg.solve(V[modal], B[modal].astype(complex))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            resolvent = 1 / (jw[None, :, None] - eigen_values[modal][:, None, :])
+        G[modal] = np.einsum('spk,swk,skm->swpm', CV, resolvent, VB) + D[modal][:, None]
+    if not modal.all():
+        G[~modal] = _schur_response(A[~modal], B[~modal], C[~modal], D[~modal], jw)
+
+    return G if batched else G[0]
+
+
+def bode(G, w):
+    '''
+    :param G: responses (..., len(w)) of single input, single output systems
+    :param w: frequencies (rad/s)
+    :return: magnitude (dB) and phase (deg), unwrapped along the frequencies
+    '''
+    with np.errstate(divide='ignore'):
+        magnitude = 20 * np.log10(np.abs(G))
+    phase = np.rad2deg(np.unwrap(np.angle(G), axis=-1))
+    return magnitude, phase
+
+
+def _crossing(x, level):
+    '''
+    :param x: values sampled along the last axis
+    :param level: values crossed, broadcast against the intervals between the samples
+    :return: mask of the intervals where x crosses level, and the position of the crossing within them (0 to 1)
+    '''
+    before = x[..., :-1] - level
+    after = x[..., 1:] - level
+    crossing = before * after <= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.nan_to_num(np.clip(before / (before - after), 0.0, 1.0))
+    return crossing, fraction
+
+
+def _interpolate(x, k, fraction):
+    '''
+    :return: x interpolated within the interval k (last axis) at the given fraction
+    '''
+    k = k[..., None]
+    start = np.take_along_axis(x[..., :-1], k, axis=-1)[..., 0]
+    return start + fraction * (np.take_along_axis(x[..., 1:], k, axis=-1)[..., 0] - start)
+
+
+def margins(G, w):
+    '''
+    Stability margins of open loops L(jω) of single input, single output systems (negative feedback), taken at the worst
+    crossover when the gain or the phase crosses several times. Crossovers are interpolated linearly in log ω.
+    :param G: open loop responses (..., len(w))
+    :param w: frequencies (rad/s)
+    :return: dict of arrays of shape G.shape[:-1]:
+    gain_margin (dB) at the phase crossover w_phase, inf when the phase never crosses -180° (mod 360°),
+    phase_margin (deg) at the gain crossover w_gain, inf when the gain never crosses 0 dB
+    '''
+    log_w = np.broadcast_to(np.log10(np.asarray(w, dtype=float)), np.shape(G))
+    magnitude, phase = bode(G, w)
+
+    # phase margin: angular distance to the critical point at every 0 dB crossing
+    crossing, fraction = _crossing(magnitude, 0.0)
+    phase_cross = phase[..., :-1] + fraction * np.diff(phase, axis=-1)
+    pm = np.where(crossing, 180.0 - np.abs(np.mod(phase_cross + 180.0, 360.0) - 180.0), np.inf)
+    k = np.argmin(pm, axis=-1)
+    phase_margin = np.take_along_axis(pm, k[..., None], axis=-1)[..., 0]
+    fraction_k = np.take_along_axis(fraction, k[..., None], axis=-1)[..., 0]
+    w_gain = np.where(np.isfinite(phase_margin), 10 ** _interpolate(log_w, k, fraction_k), np.nan)
+
+    # gain margin: attenuation where the phase crosses an odd multiple of 180°
+    turns = np.floor((phase + 180.0) / 360.0)
+    crossing, fraction = _crossing(phase, np.maximum(turns[..., :-1], turns[..., 1:]) * 360.0 - 180.0)
+    crossing &= turns[..., 1:] != turns[..., :-1]
+    gm = np.where(crossing, -(magnitude[..., :-1] + fraction * np.diff(magnitude, axis=-1)), np.inf)
+    k = np.argmin(gm, axis=-1)
+    gain_margin = np.take_along_axis(gm, k[..., None], axis=-1)[..., 0]
+    fraction_k = np.take_along_axis(fraction, k[..., None], axis=-1)[..., 0]
+    w_phase = np.where(np.isfinite(gain_margin), 10 ** _interpolate(log_w, k, fraction_k), np.nan)
+
+    return {'gain_margin': gain_margin, 'w_phase': w_phase, 'phase_margin': phase_margin, 'w_gain': w_gain}
+
+
+def bandwidth(G, w, drop=-3.0):
+    '''
+    :param G: closed loop responses (..., len(w))
+    :param w: frequencies (rad/s), the first one standing for the static gain
+    :param drop: attenuation (dB) defining the bandwidth
+    :return: first frequency where the gain falls drop dB below its low frequency value, nan if it never does
+    '''
+    log_w = np.broadcast_to(np.log10(np.asarray(w, dtype=float)), np.shape(G))
+    magnitude = bode(G, w)[0]
+    relative = magnitude - magnitude[..., :1] - drop
+    below = relative < 0
+    k = np.maximum(np.argmax(below, axis=-1) - 1, 0)
+    fraction = np.take_along_axis(_crossing(relative, 0.0)[1], k[..., None], axis=-1)[..., 0]
+    return np.where(below.any(axis=-1), 10 ** _interpolate(log_w, k, fraction), np.nan)
+
+
+def loop_responses(A, B, gains, w):
+    '''
+    Open and closed loop responses of the q, 𝛾 and z loops of the AutoPilot cascade, for stacked aircraft models
+    :param A, B: reduced models (𝛾, α, q, θ, z) of AutoPilot, shape (5, 5) and (5, 1), optionally stacked
+    :param gains: (Kr, Kgamma, Kz), each broadcast against the stacked models
+    :param w: frequencies (rad/s)
+    :return: dict loop -> {'open': L(jω), 'closed': T(jω), 'margins': ..., 'bandwidth': ...}, arrays of shape
+    (len(w),) or (n_sys, len(w))
+    '''
+    from src.autopilot.gain_schedule import C_Q, C_GAMMA, C_Z
+
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    batched = A.ndim == 3
+    if not batched:
+        A, B = A[None], B[None]
+    Kr, Kgamma, Kz = (np.broadcast_to(np.asarray(gain, dtype=float), A.shape[:1])[:, None, None] for gain in gains)
+    D = np.zeros((1, 1))
+
+    # each loop is opened at its own feedback, the inner loops being closed
+    Aq, Bq = A - Kr * B @ C_Q, Kr * B
+    Agamma, Bgamma = Aq - Kgamma * Bq @ C_GAMMA, Kgamma * Bq
+    Az, Bz = Agamma - Kz * Bgamma @ C_Z, Kz * Bgamma
+    loops = {
+        'q': (A, Kr * B, C_Q, Aq, Bq),
+        'gamma': (Aq, Kgamma * Bq, C_GAMMA, Agamma, Bgamma),
+        'z': (Agamma, Kz * Bgamma, C_Z, Az, Bz),
+    }
+
+    results = {}
+    for loop, (A_open, B_open, C, A_closed, B_closed) in loops.items():
+        L = frequency_response(np.concatenate((A_open, A_closed)), np.concatenate((B_open, B_closed)), C, D, w)
+        L, T = L[:len(A), :, 0, 0], L[len(A):, :, 0, 0]
+        result = {'open': L, 'closed': T, 'margins': margins(L, w), 'bandwidth': bandwidth(T, w)}
+        if not batched:
+            result = {'open': L[0], 'closed': T[0], 'margins': {key: value[0] for key, value in result['margins'].items()},
+                      'bandwidth': result['bandwidth'][0]}
+        results[loop] = result
+    return results
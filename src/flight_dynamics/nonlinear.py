@@ -0,0 +1,170 @@
+import numpy as np
+
+from src.aircraft.envelope import EnvelopeStability
+from src.aircraft.registry import param_values
+
+# order of the state, the same as the linear StateSpaceModel: V (m/s), γ, α (rad), q (rad/s), θ (rad), z (m)
+STATES = ('V', 'gamma', 'alpha', 'q', 'theta', 'z')
+
+
+def rk4_step(f, x, u, dt):
+    '''
+    One classical Runge-Kutta step of x' = f(x, u), the input being held over the step (zero-order hold)
+    :param f: derivative function, vectorized over the leading axis of x
+    :param x: states (n, n_states)
+    :param u: inputs (n,)
+    :param dt: time step (s)
+    '''
+    k1 = f(x, u)
+    k2 = f(x + (dt / 2) * k1, u)
+    k3 = f(x + (dt / 2) * k2, u)
+    k4 = f(x + dt * k3, u)
+    return x + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+class NonlinearLongitudinal:
+    '''
+    Nonlinear longitudinal model (point mass plus pitch) of many aircraft / flight conditions integrated in lockstep.
+
+    The aerodynamic model is the one AircraftStability trims: Cz = Cz_alpha (α - α0) + Cz_delta_m δm,
+    Cx = Cx0 + k Cz², and a pitching moment made of the normal force at the centering arms X (wing) and Y (elevator)
+        Cm = (X CN + (Y - X) CN_δm (δm - δm0)) / lref + Cm_q q lref / V,   CN = Cx sin α + Cz cos α
+    whose zero is the trim elevator deflection of AircraftStability. The thrust, along the body axis, is held at its
+    trim value and the air density follows the standard atmosphere (atm_std) with the altitude z.
+    '''
+
+    def __init__(self, p, mach, altitude, gamma=0.0):
+        '''
+        :param p: aircraft parameters (params.json layout or record), values may be arrays to fly many variants
+        :param mach: Mach number(s) of the trim points
+        :param altitude: altitude(s) (m) of the trim points, broadcast against mach and the parameters
+        :param gamma: flight path angle(s) (rad) of the trim points, level flight by default
+        '''
+        from atm_std import get_cte_atm
+
+        self.envelope = EnvelopeStability(p, mach, altitude, gamma)
+        alpha_eq, Cz_eq, Cx_eq, Fpx_eq, count, converged = self.envelope.compute_equilibrium()
+        self.shape = np.shape(alpha_eq)
+        self.n = int(np.prod(self.shape))
+
+        def flat(value):
+            return np.broadcast_to(value, self.shape).ravel().copy()
+
+        c = param_values(p, ('m', 'g', 'S', 'rg', 'lref', 'Cx0', 'k', 'Cz_alpha', 'Cz_delta_m', 'Cm_q', 'delta_m0',
+                             'alpha_0'))
+        self.c = {name: flat(value) for name, value in c.items()}
+        self.c['Iyy'] = self.c['m'] * self.c['rg'] ** 2
+        self.c['X'] = flat(self.envelope.X)
+        self.c['Y'] = flat(self.envelope.Y)
+        self.thrust = flat(Fpx_eq)
+        self.delta_m_eq = flat(self.envelope.delta_m_eq)
+
+        # trimmed flight, the initial state of the simulations
+        self.x_eq = np.zeros((self.n, len(STATES)))
+        self.x_eq[:, 0] = flat(self.envelope.Veq)
+        self.x_eq[:, 1] = flat(self.envelope.gamma_eq)
+        self.x_eq[:, 2] = flat(alpha_eq)
+        self.x_eq[:, 4] = flat(alpha_eq + self.envelope.gamma_eq)
+        self.x_eq[:, 5] = flat(self.envelope.altitude)
+
+        # air density tabulated once, interpolated linearly at every stage
+        self.z_table = np.linspace(0, 25000, 2501)
+        self.rho_table = np.asarray(get_cte_atm(self.z_table)[1], dtype=float)
+
+    def coefficients(self, x, delta_m):
+        '''
+        :param x: states (n, 6)
+        :param delta_m: elevator deflections (n,)
+        :return: dynamic pressure times wing area, Cx, Cz and Cm
+        '''
+        c = self.c
+        V, alpha, q, z = x[:, 0], x[:, 2], x[:, 3], x[:, 5]
+        QS = 0.5 * np.interp(z, self.z_table, self.rho_table) * V ** 2 * c['S']
+        Cz = c['Cz_alpha'] * (alpha - c['alpha_0']) + c['Cz_delta_m'] * delta_m
+        Cx = c['Cx0'] + c['k'] * Cz ** 2
+        sin_alpha, cos_alpha = np.sin(alpha), np.cos(alpha)
+        CN = Cx * sin_alpha + Cz * cos_alpha
+        CN_delta_m = 2 * c['k'] * Cz * c['Cz_delta_m'] * sin_alpha + c['Cz_delta_m'] * cos_alpha
+        Cm = ((c['X'] * CN + (c['Y'] - c['X']) * CN_delta_m * (delta_m - c['delta_m0'])) / c['lref']
+              + c['Cm_q'] * q * c['lref'] / V)
+        return QS, Cx, Cz, Cm
+
+    def derivatives(self, x, delta_m):
+        '''
+        :param x: states (n, 6)
+        :param delta_m: elevator deflections (n,)
+        :return: time derivatives of the states (n, 6)
+        '''
+        c = self.c
+        V, gamma, alpha, q = x[:, 0], x[:, 1], x[:, 2], x[:, 3]
+        QS, Cx, Cz, Cm = self.coefficients(x, delta_m)
+        sin_alpha, cos_alpha = np.sin(alpha), np.cos(alpha)
+
+        dx = np.empty_like(x)
+        dx[:, 0] = (self.thrust * cos_alpha - QS * Cx) / c['m'] - c['g'] * np.sin(gamma)
+        dx[:, 1] = (self.thrust * sin_alpha + QS * Cz) / (c['m'] * V) - c['g'] * np.cos(gamma) / V
+        dx[:, 2] = q - dx[:, 1]
+        dx[:, 3] = QS * c['lref'] * Cm / c['Iyy']
+        dx[:, 4] = q
+        dx[:, 5] = V * np.sin(gamma)
+        return dx
+
+    def load_factor(self, x, delta_m):
+        '''
+        :return: load factor normal to the trajectory nz = (L + F sin α) / (m g)
+        '''
+        QS, Cx, Cz, Cm = self.coefficients(x, delta_m)
+        return (QS * Cz + self.thrust * np.sin(x[:, 2])) / (self.c['m'] * self.c['g'])
+
+    def simulate(self, t, controller=None, x0=None):
+        '''
+        Integrate every aircraft together with a fixed-step RK4, the elevator being computed at the beginning of each
+        step and held over it (as a sampled autopilot would)
+        :param t: evenly spaced time vector (s)
+        :param controller: callable (t, x) -> δm (n,), the trim deflection is held by default
+        :param x0: initial states (n, 6) or (6,), the trim states by default
+        :return: states (n, len(t), 6) and elevator deflections (n, len(t))
+        '''
+        t = np.asarray(t, dtype=float)
+        dt = t[1] - t[0]
+        if not np.allclose(np.diff(t), dt):
+            raise Exception("The time vector must be evenly spaced.")
+        x = self.x_eq.copy() if x0 is None else np.broadcast_to(np.asarray(x0, dtype=float), self.x_eq.shape).copy()
+
+        X = np.empty((self.n, len(t), len(STATES)))
+        U = np.empty((self.n, len(t)))
+        for k in range(len(t)):
+            delta_m = self.delta_m_eq if controller is None else controller(t[k], x)
+            X[:, k], U[:, k] = x, delta_m
+            x = rk4_step(self.derivatives, x, delta_m, dt)
+        return X, U
+
+
+class CascadeController:
+    '''
+    q / 𝛾 / z cascade of the AutoPilot as a nonlinear control law around the trim point:
+        δm = δm_eq + Kr (Kgamma (Kz (z_c - z) - 𝛾) - q)
+    Without an altitude command the z loop is open and 𝛾_c is tracked instead.
+    '''
+
+    def __init__(self, model: NonlinearLongitudinal, gains, gamma_c=None, z_c=None, delta_m_limits=None):
+        '''
+        :param model: NonlinearLongitudinal giving the trim states and deflections
+        :param gains: (Kr, Kgamma, Kz), broadcast against the aircraft
+        :param gamma_c: flight path angle command(s) (rad), used when z_c is None, the trim flight path angle(s) of the
+        model by default (level flight, climb or descent)
+        :param z_c: altitude command(s) (m)
+        :param delta_m_limits: (min, max) elevator deflection (rad), unlimited by default
+        '''
+        self.Kr, self.Kgamma, self.Kz = (np.asarray(gain, dtype=float) for gain in gains)
+        self.delta_m_eq = model.delta_m_eq
+        self.gamma_c = model.x_eq[:, 1] if gamma_c is None else np.asarray(gamma_c, dtype=float)
+        self.z_c = None if z_c is None else np.asarray(z_c, dtype=float)
+        self.delta_m_limits = delta_m_limits
+
+    def __call__(self, t, x):
+        gamma_c = self.gamma_c if self.z_c is None else self.Kz * (self.z_c - x[:, 5])
+        delta_m = self.delta_m_eq + self.Kr * (self.Kgamma * (gamma_c - x[:, 1]) - x[:, 3])
+        if self.delta_m_limits is not None:
+            delta_m = np.clip(delta_m, *self.delta_m_limits)
+        return delta_m
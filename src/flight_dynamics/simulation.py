@@ -0,0 +1,148 @@
+import numpy as np
+
+from src.misc.tracing import tracer
+
+
+class StateSpaceSimulator:
+    '''
+    Time responses computed directly on (A, B, C, D), without going through transfer functions.
+
+    The zero-order-hold discretization of each (system, dt) is computed once and cached. Systems of the same order can
+    be stacked along a leading axis (A: (n_sys, n, n), B: (n_sys, n, m), ...) and every input channel is simulated
+    as its own experiment, so a single call propagates all systems and all channels together.
+    '''
+
+    def __init__(self, max_cache=256):
+        self.max_cache = max_cache
+        self._cache = {}
+
+    @tracer.traced('simulation')
+    def discretize(self, A, B, dt):
+        '''
+        Zero-order-hold discretization: exp([[A, B], [0, 0]] dt) = [[Ad, Bd], [0, I]]
+        :param A, B: continuous (stacked) state space matrices
+        :param dt: sample time (s)
+        :return: Ad, Bd
+        '''
+        A = np.ascontiguousarray(A, dtype=float)
+        B = np.ascontiguousarray(B, dtype=float)
+        key = (A.shape, B.shape, A.tobytes(), B.tobytes(), float(dt))
+        if key not in self._cache:
+            from scipy.linalg import expm
+
+            n, m = A.shape[-1], B.shape[-1]
+            M = np.zeros(A.shape[:-2] + (n + m, n + m))
+            M[..., :n, :n] = A
+            M[..., :n, n:] = B
+            E = expm(M * dt)
+            if len(self._cache) >= self.max_cache:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (E[..., :n, :n], E[..., :n, n:])
+        return self._cache[key]
+
+    @staticmethod
+    def _time_step(t):
+        t = np.asarray(t, dtype=float)
+        dt = t[1] - t[0]
+        if not np.allclose(np.diff(t), dt):
+            raise Exception("The time vector must be evenly spaced.")
+        return t, dt
+
+    @staticmethod
+    def _stack(A, B, C, D):
+        matrices = [np.asarray(M, dtype=float) for M in (A, B, C, D)]
+        batched = any(M.ndim == 3 for M in matrices)
+        matrices = [M if M.ndim == 3 else M[None] for M in matrices]
+        n_sys = max(M.shape[0] for M in matrices)
+        A, B, C, D = (np.broadcast_to(M, (n_sys,) + M.shape[1:]) for M in matrices)
+        return A, B, C, D, batched
+
+    @tracer.traced('simulation')
+    def lsim(self, A, B, C, D, u, t, x0=None):
+        '''
+        Response to arbitrary inputs, held constant over each sample
+        :param A, B, C, D: state space matrices, optionally stacked along a leading axis
+        :param u: inputs of shape (len(t), m), or (n_sys, len(t), m) for stacked systems
+        :param t: evenly spaced time vector (s)
+        :param x0: initial state, zero by default
+        :return: outputs of shape (len(t), p), or (n_sys, len(t), p) for stacked systems
+        '''
+        t, dt = self._time_step(t)
+        A, B, C, D, batched = self._stack(A, B, C, D)
+        u = np.asarray(u, dtype=float).reshape((-1, len(t), B.shape[-1]))
+        u = np.broadcast_to(u, (A.shape[0],) + u.shape[1:])
+        Ad, Bd = self.discretize(A, B, dt)
+
+        x = np.zeros(A.shape[:2]) if x0 is None else np.broadcast_to(np.asarray(x0, dtype=float), A.shape[:2]).copy()
+        x = x[..., None]
+        y = np.empty((A.shape[0], len(t), C.shape[1]))
+        for k in range(len(t)):
+            uk = u[:, k, :, None]
+            y[:, k] = (C @ x + D @ uk)[..., 0]
+            x = Ad @ x + Bd @ uk
+        return y if batched else y[0]
+
+    @staticmethod
+    def _propagate(Ad, Bu, C, Du, n_steps, x):
+        '''
+        Propagate x <- Ad x + Bu, y = C x + Du for every system and every input channel, the columns of x being the
+        channels
+        '''
+        y = np.empty((Ad.shape[0], n_steps, C.shape[1], x.shape[-1]))
+        for k in range(n_steps):
+            y[:, k] = C @ x + Du
+            x = Ad @ x + Bu
+        return y
+
+    @tracer.traced('simulation')
+    def step(self, A, B, C, D, t):
+        '''
+        Unit step response of each input channel, exact at the samples
+        :param A, B, C, D: state space matrices, optionally stacked along a leading axis
+        :param t: evenly spaced time vector (s)
+        :return: outputs of shape (len(t), p, m), or (n_sys, len(t), p, m) for stacked systems
+        '''
+        t, dt = self._time_step(t)
+        A, B, C, D, batched = self._stack(A, B, C, D)
+        Ad, Bd = self.discretize(A, B, dt)
+        y = self._propagate(Ad, Bd, C, D, len(t), np.zeros(B.shape))
+        return y if batched else y[0]
+
+    @tracer.traced('simulation')
+    def impulse(self, A, B, C, D, t):
+        '''
+        Unit impulse response C exp(At) B of each input channel, exact at the samples (the direct term D is dropped)
+        :param A, B, C, D: state space matrices, optionally stacked along a leading axis
+        :param t: evenly spaced time vector (s)
+        :return: outputs of shape (len(t), p, m), or (n_sys, len(t), p, m) for stacked systems
+        '''
+        t, dt = self._time_step(t)
+        A, B, C, D, batched = self._stack(A, B, C, D)
+        Ad, Bd = self.discretize(A, B, dt)
+        y = self._propagate(Ad, 0, C, 0, len(t), np.array(B))
+        return y if batched else y[0]
+
+
+simulator = StateSpaceSimulator()
+
+
+def ss_step(A, B, C, D, T):
+    '''
+    Drop-in replacement of control.matlab.step for a single input, single output state space model
+    :param A, B, C, D: state space matrices
+    :param T: evenly spaced time vector (s)
+    :return: y, T
+    '''
+    y = simulator.step(A, B, C, D, T)
+    return y[:, 0, 0], np.asarray(T, dtype=float)
+
+
+def ss_impulse(A, B, C, D, T):
+    '''
+    Drop-in replacement of control.matlab.impulse for a single input, single output state space model
+    :param A, B, C, D: state space matrices
+    :param T: evenly spaced time vector (s)
+    :return: y, T
+    '''
+    y = simulator.impulse(A, B, C, D, T)
+    return y[:, 0, 0], np.asarray(T, dtype=float)
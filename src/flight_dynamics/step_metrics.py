@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def step_metrics(t, Y, reference=1.0, rise_level=0.66, interpolate=True):
+    '''
+    Step response characteristics of many responses sharing the same time vector, computed with array reductions
+    :param t: time vector (s), shape (N,)
+    :param Y: responses, shape (n, N) (a single response of shape (N,) is accepted)
+    :param reference: commanded value, for the steady state error
+    :param rise_level: fraction of the steady state value defining the rise time (66 % as in sisopy31.step_info)
+    :param interpolate: locate the crossings between samples (linear interpolation, parabolic for the peak) instead of
+    returning sample times (last sample below the rise level, first sample back inside the settling band), so that
+    coarse time grids still give accurate times
+    :return: dict of arrays of shape (n,): overshoot (%), rise_time, settling_time_2, settling_time_5, peak_time (s)
+    and steady_state_error
+    '''
+    t = np.asarray(t, dtype=float)
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    n, N = Y.shape
+    rows = np.arange(n)
+    y_final = Y[:, -1]
+    # responses normalized by their steady state value, so that negative gains behave like positive ones
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = Y / y_final[:, None]
+
+    # ------------------- Peak -------------------
+    i_peak = np.argmax(r, axis=1)
+    r_peak = r[rows, i_peak]
+    t_peak = t[i_peak]
+    if interpolate:
+        inner = (i_peak > 0) & (i_peak < N - 1)
+        i = np.clip(i_peak, 1, N - 2)
+        r0, r1, r2 = r[rows, i - 1], r[rows, i], r[rows, i + 1]
+        curvature = r0 - 2 * r1 + r2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shift = np.where(inner & (curvature < 0), 0.5 * (r0 - r2) / curvature, 0.0)
+        dt = np.where(shift >= 0, t[np.minimum(i + 1, N - 1)] - t[i], t[i] - t[i - 1])
+        t_peak = np.where(inner, t[i] + shift * dt, t_peak)
+        r_peak = np.where(inner, r1 - 0.25 * (r0 - r2) * shift, r_peak)
+    overshoot = (r_peak - 1.0) * 100.0
+
+    # ------------------- Rise time -------------------
+    above = r > rise_level
+    i_rise = np.argmax(above, axis=1)
+    reached = above[rows, i_rise]
+    if interpolate:
+        i = np.maximum(i_rise, 1)
+        r0, r1 = r[rows, i - 1], r[rows, i]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.clip((rise_level - r0) / (r1 - r0), 0.0, 1.0)
+        rise_time = np.where(i_rise > 0, t[i - 1] + fraction * (t[i] - t[i - 1]), t[0]) - t[0]
+    else:
+        rise_time = t[np.maximum(i_rise - 1, 0)] - t[0]
+    rise_time = np.where(reached, rise_time, np.nan)
+
+    # ------------------- Settling times -------------------
+    error = np.abs(r - 1.0)
+    settling = {}
+    for band in (0.02, 0.05):
+        outside = error > band
+        # last sample outside the band, -1 when the response never leaves it
+        k = N - 1 - np.argmax(outside[:, ::-1], axis=1)
+        k = np.where(outside.any(axis=1), k, -1)
+        if interpolate:
+            kc = np.clip(k, 0, N - 2)
+            e0, e1 = error[rows, kc], error[rows, kc + 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fraction = np.clip((e0 - band) / (e0 - e1), 0.0, 1.0)
+            ts = t[kc] + fraction * (t[kc + 1] - t[kc])
+        else:
+            ts = t[np.clip(k + 1, 0, N - 1)]
+        settling[band] = np.where(k >= 0, ts - t[0], 0.0)
+
+    return {
+        'overshoot': overshoot,
+        'rise_time': rise_time,
+        'settling_time_2': settling[0.02],
+        'settling_time_5': settling[0.05],
+        'peak_time': t_peak - t[0],
+        'steady_state_error': reference - y_final,
+    }
+
+
+def step_info(t, yout, interpolate=True):
+    '''
+    Drop-in replacement of sisopy31.step_info computed by step_metrics:
+    Overshoot OS (%), rise time at 66 % and settling time within 5 % of the steady state response
+    '''
+    metrics = step_metrics(t, yout, interpolate=interpolate)
+    return float(metrics['overshoot'][0]), float(metrics['rise_time'][0]), float(metrics['settling_time_5'][0])
@@ -0,0 +1,174 @@
+import numpy as np
+
+from src.misc.tracing import tracer
+
+
+def _nice(x, up=False):
+    '''
+    :return: 1, 2 or 5 times a power of ten, the closest below x (above x when up)
+    '''
+    exponent = np.floor(np.log10(x))
+    mantissas = np.array([1.0, 2.0, 5.0, 10.0])
+    scaled = x / 10 ** exponent
+    if up:
+        mantissa = mantissas[np.searchsorted(mantissas, scaled - 1e-9)]
+    else:
+        mantissa = mantissas[np.searchsorted(mantissas, scaled + 1e-9) - 1]
+    return float(mantissa * 10 ** exponent)
+
+
+def _residues(A, B, C, integrator_tol):
+    '''
+    :return: poles of A other than its integrators and the residues (C v)(w* B) / (w* v) of their step responses,
+    None without B and C
+    '''
+    from scipy.linalg import eig
+
+    A = np.asarray(A, dtype=float)
+    poles, w, v = eig(A, left=True, right=True)
+    keep = np.abs(poles) > integrator_tol * max(np.abs(poles).max(), 1.0)
+    poles, w, v = poles[keep], w[:, keep], v[:, keep]
+    if B is None or C is None:
+        return poles, None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        residues = np.einsum('pi,im->ipm', np.asarray(C, dtype=float) @ v, w.conj().T @ np.asarray(B, dtype=float))
+        residues /= np.einsum('ji,ji->i', w.conj(), v)[:, None, None]
+    return poles, residues
+
+
+def modes(A, B=None, C=None, integrator_tol=1e-9):
+    '''
+    Poles of a system and their weight in its step responses: for a simple pole λ with right and left eigenvectors v and
+    w, the step response holds (C v)(w* B) / (w* v) (e^λt - 1) / λ, whose largest magnitude over the input and output
+    channels is the weight of λ. Without B and C every pole weighs 1.
+    :param A, B, C: state space matrices
+    :param integrator_tol: poles of smaller magnitude, relative to the largest one, are integrators and left out
+    :return: poles, weights
+    '''
+    poles, residues = _residues(A, B, C, integrator_tol)
+    if residues is None:
+        return poles, np.ones(len(poles))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.abs(residues / poles[:, None, None]).max(axis=(1, 2))
+    return poles, np.nan_to_num(weights)
+
+
+def final_value(A, B, C, D, integrator_tol=1e-9):
+    '''
+    Final value of the step responses of a stable system, its DC gain -C A⁻¹ B + D. The integrators that take no part
+    in the responses (e.g. z or θ in a q loop, which make A singular) are left out, as in modes.
+    :param A, B, C, D: state space matrices
+    :param integrator_tol: see modes
+    :return: (outputs, inputs) array
+    '''
+    poles, residues = _residues(A, B, C, integrator_tol)
+    return np.asarray(D, dtype=float) - (residues / poles[:, None, None]).sum(axis=0).real
+
+def response_grid(A, B=None, C=None, **options):
+    '''
+    Time grid of the step responses of a system, see common_grid
+    :param A, B, C: state space matrices, optionally stacked along a leading axis, B and C to weigh the poles by their
+    part in the responses
+    :param options: options of common_grid
+    :return: evenly spaced time vector (s) starting at 0
+    '''
+    A = np.asarray(A, dtype=float)
+    if A.ndim == 2:
+        return common_grid([(A, B, C)], **options)
+    B = [None] * len(A) if B is None else np.broadcast_to(B, (len(A),) + np.shape(B)[-2:])
+    C = [None] * len(A) if C is None else np.broadcast_to(C, (len(A),) + np.shape(C)[-2:])
+    return common_grid(list(zip(A, B, C)), **options)
+
+
+def diverges(A, B=None, C=None, participation=1e-3):
+    '''
+    :param A, B, C: state space matrices, B and C to leave out the modes that take no part in the responses
+    :param participation: relative weight under which a mode is ignored
+    :return: True when a mode of the responses grows (pole with a positive real part)
+    '''
+    poles, weights = modes(A, B, C)
+    if not len(poles):
+        return False
+    kept = weights >= participation * weights.max()
+    return bool(np.any(poles[kept].real > 1e-9 * np.abs(poles[kept])))
+
+
+def _plan(systems, tol, margin, participation, default_horizon, resolved, peak):
+    '''
+    :return: horizon (s) of common_grid and the magnitude of the modes the step must resolve
+    '''
+    settling, magnitude = [], []
+    for system in resolved:
+        poles, weights = modes(*system[:3])
+        magnitude.append(np.abs(poles[weights >= participation * weights.max()]) if len(poles) else poles.real)
+    for system in systems:
+        poles, weights = modes(*system[:3])
+        if not len(poles):
+            continue
+        kept = weights >= participation * weights.max()
+        poles, weights = poles[kept], weights[kept] / weights[kept].max()
+        sigma = -poles.real
+        decaying = sigma > 1e-9 * np.abs(poles)
+        growing = sigma < -1e-9 * np.abs(poles)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            times = np.where(decaying, np.log(np.maximum(weights / tol, 1.0)) / sigma, np.log(1 / tol) / np.abs(poles))
+            # a diverging mode never settles, it is followed until it has grown 1 / tol times
+            times = np.where(growing, np.log(1 / tol) / np.abs(sigma), times)
+            if peak:
+                oscillating = np.abs(poles.imag) > 1e-9 * np.abs(poles)
+                times = np.where(oscillating, np.pi / np.abs(poles.imag), times)
+        settling.append(times)
+        magnitude.append(np.abs(poles))
+
+    magnitude = np.concatenate(magnitude) if magnitude else np.zeros(0)
+    if settling:
+        horizon = margin * max(np.concatenate(settling).max(), np.log(1 / tol) / magnitude.max())
+    else:
+        horizon = default_horizon
+    return horizon, magnitude
+
+
+def settling_horizon(systems, tol=0.02, margin=1.5, participation=1e-3, default_horizon=10.0, peak=False):
+    '''
+    :return: horizon (s) of common_grid before any max_horizon cap, see common_grid
+    '''
+    return _plan(systems, tol, margin, participation, default_horizon, (), peak)[0]
+
+
+@tracer.traced('simulation')
+def common_grid(systems, tol=0.02, margin=1.5, points_per_cycle=40, min_samples=200, max_samples=50000,
+                participation=1e-3, default_horizon=10.0, resolved=(), peak=False, max_horizon=None):
+    '''
+    Time grid shared by the step responses of several systems, planned from their poles:
+    - the horizon is margin times the time the slowest mode takes to fall below tol of the response, a mode of weight
+    a and decay rate σ needing ln(a / (tol max a)) / σ, and ln(1 / tol) / |λ| for the modes that do not decay; a
+    diverging mode is followed until it has grown 1 / tol times, ln(1 / tol) / |σ| (see diverges);
+    - the step resolves the fastest mode with points_per_cycle samples per period 2π / |λ| (at least 2 by Nyquist,
+    more to locate the peaks and the band crossings of the step metrics),
+    both among the modes weighing more than participation times the heaviest one of their system. The step is rounded
+    down to 1, 2 or 5 times a power of ten, then widened or narrowed to keep the number of samples within
+    [min_samples, max_samples].
+    :param systems: sequence of (A, B, C, ...) of any orders, B and C may be None
+    :param tol: settling band, relative to the largest mode of each system
+    :param margin: horizon over the settling time of the slowest mode
+    :param points_per_cycle: samples per period of the fastest mode
+    :param min_samples, max_samples: bounds of the number of samples
+    :param participation: relative weight under which a mode is ignored
+    :param default_horizon: horizon (s) when no system has any mode (integrators and static gains only)
+    :param resolved: other systems whose modes only bound the step, observed over the horizon of systems
+    :param peak: only the peak of the responses is needed, the oscillatory modes are followed up to their first
+    overshoot, half a period π / ω, instead of until they settle
+    :param max_horizon: largest horizon (s), e.g. the window of a figure, the responses may not have settled within it
+    (compare with settling_horizon)
+    :return: evenly spaced time vector (s) starting at 0
+    '''
+    horizon, magnitude = _plan(systems, tol, margin, participation, default_horizon, resolved, peak)
+    if max_horizon is not None:
+        horizon = min(horizon, max_horizon)
+    dt = _nice(2 * np.pi / (points_per_cycle * magnitude.max())) if len(magnitude) else _nice(horizon / min_samples)
+
+    if horizon / dt > max_samples:
+        dt = _nice(horizon / max_samples, up=True)
+    elif horizon / dt < min_samples:
+        dt = _nice(horizon / min_samples)
+    return np.arange(int(np.ceil(horizon / dt)) + 1) * dt
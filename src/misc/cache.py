@@ -0,0 +1,228 @@
+import contextlib
+import copyreg
+import functools
+import hashlib
+import io
+import os
+import pickle
+import sys
+
+import numpy as np
+
+
+
+def user_cache_dir(name='aircraft-autopilot'):
+    '''
+    :return: cache directory of the user (%LOCALAPPDATA% on Windows, ~/Library/Caches on macOS, $XDG_CACHE_HOME or
+    ~/.cache elsewhere), outside of the source tree
+    '''
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(os.path.join('~', 'AppData', 'Local'))
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser(os.path.join('~', 'Library', 'Caches'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache'))
+    return os.path.join(base, name)
+
+
+# the cache is off unless a script turns it on (main.py) or AUTOPILOT_CACHE=1 is set, AUTOPILOT_CACHE_DIR moves it
+CACHE_DIR = os.environ.get('AUTOPILOT_CACHE_DIR') or user_cache_dir()
+
+
+def digest(*parts):
+    '''
+    Content hash of nested dicts, lists, tuples, NumPy arrays, numbers, strings and bytes. Numbers are hashed as arrays,
+    so 1 and 1.0 differ but 0.702 and np.float64(0.702) do not.
+    :return: sha256 hex digest
+    '''
+    h = hashlib.sha256()
+
+    def update(part):
+        if isinstance(part, dict):
+            h.update(b'{')
+            for key in sorted(part, key=str):
+                update(str(key))
+                update(part[key])
+            h.update(b'}')
+        elif isinstance(part, (list, tuple)):
+            h.update(b'[')
+            for item in part:
+                update(item)
+            h.update(b']')
+        elif isinstance(part, str):
+            h.update(b's' + part.encode() + b'\0')
+        elif isinstance(part, bytes):
+            h.update(b'b' + part + b'\0')
+        elif part is None:
+            h.update(b'N')
+        elif isinstance(part, (int, float, complex, np.ndarray, np.generic)):
+            array = np.ascontiguousarray(part)
+            h.update(f"a{array.shape}{array.dtype.str}".encode())
+            h.update(array.tobytes())
+        else:
+            raise Exception(f"Cannot hash an object of type {type(part).__name__}")
+
+    for part in parts:
+        update(part)
+    return h.hexdigest()
+
+
+def _code(code):
+    '''
+    :return: bytecode and constants of a function, nested functions included (their repr holds an address)
+    '''
+    consts = [_code(const) if hasattr(const, 'co_code') else repr(const) for const in code.co_consts]
+    return [code.co_code, consts]
+
+
+def _state_space(A, B, C, D, dt):
+    import control
+    return control.ss(A, B, C, D, dt)
+
+
+def _reduce_state_space(sys_):
+    return _state_space, (sys_.A, sys_.B, sys_.C, sys_.D, sys_.dt)
+
+
+def _dump(value, f):
+    '''
+    Pickle a value into f. python-control state space objects keep lambdas, they are stored by their matrices through
+    the dispatch table of this pickler only, the pickling of StateSpace elsewhere in the process is left untouched.
+    '''
+    pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+    control = sys.modules.get('control')
+    if control is not None:
+        pickler.dispatch_table = copyreg.dispatch_table.copy()
+        pickler.dispatch_table[control.StateSpace] = _reduce_state_space
+    pickler.dump(value)
+
+
+class DiskCache:
+    '''
+    Content-addressed cache of pickled results on disk. Entries are files named by the hash of their inputs, a hit
+    refreshes the modification time of its file and the least recently used files are removed once the cache grows
+    above max_bytes.
+    '''
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=64 * 2 ** 20, enabled=True):
+        '''
+        :param directory: directory of the entries, the user cache directory by default (see user_cache_dir)
+        :param max_bytes: size above which the least recently used entries are evicted
+        :param enabled: when False, memoized methods are always computed and nothing is written
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        '''
+        :param key: hash of the inputs
+        :return: (True, value) on a hit, (False, None) otherwise
+        '''
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except Exception:
+            # missing, partially removed or unreadable (e.g. written by another version) entries are recomputed
+            self.misses += 1
+            return False, None
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    def set(self, key, value):
+        '''
+        Store a value, written to a temporary file first so that readers never see a partial entry
+        :param key: hash of the inputs
+        :param value: picklable value
+        '''
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            _dump(value, f)
+        os.replace(tmp, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        '''
+        :return: (path, size, last use) of every entry
+        '''
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.pkl'):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((os.path.join(root, name), stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the cache fits in max_bytes
+        '''
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        for path, size, _ in self._entries():
+            os.remove(path)
+        self._size = 0
+
+    def memoize(self, inputs, state=()):
+        '''
+        Decorator caching a method under the hash of its inputs and of its bytecode (editing the method invalidates
+        its entries, editing the functions it calls does not: clear the cache or run without it after such a change).
+        What the method prints is stored with its result and printed again on a hit, so cached runs read the same.
+        :param inputs: function (instance, *args, **kwargs) -> everything the result depends on
+        :param state: names of the instance attributes set by the method, restored on a hit
+        '''
+        def decorator(method):
+            code = _code(method.__code__)
+
+            @functools.wraps(method)
+            def wrapper(instance, *args, **kwargs):
+                if not self.enabled:
+                    return method(instance, *args, **kwargs)
+                key = digest(method.__qualname__, code, inputs(instance, *args, **kwargs))
+                hit, entry = self.get(key)
+                if hit:
+                    result, attributes, output = entry
+                    instance.__dict__.update(attributes)
+                    sys.stdout.write(output)
+                    return result
+                with contextlib.redirect_stdout(io.StringIO()) as f:
+                    result = method(instance, *args, **kwargs)
+                output = f.getvalue()
+                sys.stdout.write(output)
+                self.set(key, (result, {name: getattr(instance, name) for name in state}, output))
+                return result
+
+            return wrapper
+
+        return decorator
+
+
+cache = DiskCache(enabled=os.environ.get('AUTOPILOT_CACHE') == '1')
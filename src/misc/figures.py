@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.misc.tracing import tracer
+
+PLOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plots')
+
+
+class Rendering:
+    '''
+    Rendering options of the figures of the process. In fast mode, the glow of the neon curves is drawn as one
+    LineCollection per curve, long series are decimated to the extrema of each pixel column, and a saved figure is cleared
+    and reused for the next figure instead of being closed.
+    '''
+
+    def __init__(self):
+        self.fast = False
+
+
+rendering = Rendering()
+
+
+def decimate(x, y, buckets):
+    '''
+    Shape preserving decimation of an evenly sampled series: the samples are split into buckets (one per pixel column)
+    and only the minimum and the maximum of each bucket are kept, in time order, with the first and last samples
+    :param x, y: series
+    :param buckets: number of buckets, the width of the axes in pixels
+    :return: x, y decimated, or the series itself when it is not longer than 4 samples per bucket
+    '''
+    x, y = np.asarray(x), np.asarray(y)
+    N = len(y)
+    if buckets < 1 or N <= 4 * buckets:
+        return x, y
+    size = -(-N // buckets)
+    n = (N // size) * size
+    blocks = y[:n].reshape(-1, size)
+    starts = np.arange(0, n, size)
+    index = np.unique(np.concatenate(([0], starts + blocks.argmin(axis=1), starts + blocks.argmax(axis=1),
+                                      np.arange(n, N), [N - 1])))
+    return x[index], y[index]
+
+
+@tracer.traced('figure')
+def finish_figure(name, output_dir=None, formats=('png',), show=True):
+    '''
+    Save the current figure as <output_dir>/<name>.<format> for every format, then show or close it
+    :param name: file name of the figure, without extension
+    :param output_dir: directory of the figures, src/misc/plots by default
+    :param formats: file formats understood by matplotlib (png, pdf, svg...)
+    :param show: block on plt.show() (interactive use) or close the figure (batch use), in fast rendering mode a figure
+    with a single axes is cleared and kept for the next one
+    '''
+    from matplotlib import pyplot as plt
+
+    output_dir = PLOTS_DIR if output_dir is None else output_dir
+    figure = plt.gcf()
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        for fmt in formats:
+            # Figure.savefig, as plt.savefig draws the figure a second time on its canvas afterwards
+            figure.savefig(os.path.join(output_dir, f"{name}.{fmt}"))
+    except Exception:
+        print("Error while saving the figure")
+    if show:
+        plt.show()
+    elif rendering.fast and len(figure.axes) == 1:
+        figure.clear()
+    else:
+        plt.close()
+
+
+def render_figure(render, data, output_dir=None, formats=('png',), fast=False):
+    '''
+    Render one figure off screen, run on the workers of render_all
+    :param render: render method of the plotting class (e.g. ShortPeriod.render)
+    :param data: responses computed beforehand by the plotting class
+    :param fast: fast rendering mode, see Rendering
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    rendering.fast = fast
+    render(data, output_dir=output_dir, formats=formats, show=False)
+
+
+@tracer.traced('figure')
+def render_all(figures, output_dir=None, formats=('png',), max_workers=None, fast=False):
+    '''
+    Render and save figures in parallel on a process pool
+    :param figures: list of (render, data) pairs
+    :param output_dir: directory of the figures, src/misc/plots by default
+    :param formats: file formats of each figure
+    :param max_workers: number of processes, all the cores by default
+    :param fast: fast rendering mode, see Rendering
+    '''
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [tracer.submit(pool, render_figure, render, data, output_dir, formats, fast)
+                   for render, data in figures]
+        for future in futures:
+            tracer.result(future)
+    print(f"{len(figures)} figure(s) saved to {PLOTS_DIR if output_dir is None else output_dir}")
@@ -1,10 +1,48 @@
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+
+from src.misc.tracing import tracer
+
+REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report')
+TABLES = ('A', 'B', 'C', 'D', 'eigen_values', 'damping')
+
+
+def _to_json(array):
+    '''
+    :param array: numpy array, complex values are split into their real and imaginary parts
+    :return: nested lists, json serializable
+    '''
+    if np.iscomplexobj(array):
+        return {'real': array.real.tolist(), 'imag': array.imag.tolist()}
+    return array.tolist()
+
+
+def _write(data, digest, file_name, output_dir=None, pdf=True):
+    '''
+    Build <file_name>.pdf, then its machine-readable copies <file_name>.json and <file_name>.npz. The json is written
+    last and holds the digest of the inputs, so an interrupted build is never taken as up to date.
+    :param data: arrays of the report, by table name
+    :param digest: hash of the inputs, see GenerateReport.digest
+    :param pdf: build the pdf, False to only write the json and npz next to an existing pdf
+    '''
+    output_dir = REPORT_DIR if output_dir is None else output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, file_name)
+
+    if pdf:
+        GenerateReport.build_pdf(data, f"{base}.pdf")
+    np.savez(f"{base}.npz", **data)
+    with open(f"{base}.json", 'w') as f:
+        json.dump({'name': file_name, 'digest': digest, **{key: _to_json(data[key]) for key in TABLES}}, f, indent=2)
+    if pdf:
+        print(f"Report {file_name} generated successfully!")
+    else:
+        print(f"Report {file_name} exports written, existing pdf kept")
+
 
 class GenerateReport:
 
@@ -17,16 +55,80 @@ class GenerateReport:
         self.damping = np.array(damping)
         self.sys = sys
 
-    def write(self, file_name):
-        path = os.getcwd()
-        doc = SimpleDocTemplate(f"{path}/src/misc/report/{file_name}.pdf", pagesize=letter)
+    def data(self):
+        '''
+        :return: arrays written in the report, by table name
+        '''
+        return {key: np.asarray(getattr(self, key)) for key in TABLES}
+
+    def digest(self):
+        '''
+        :return: sha256 of the report inputs and of the print options used to format them in the pdf
+        '''
+        h = hashlib.sha256()
+        for key, array in self.data().items():
+            array = np.ascontiguousarray(array)
+            h.update(f"{key}{array.shape}{array.dtype.str}".encode())
+            h.update(array.tobytes())
+        options = np.get_printoptions()
+        h.update(f"{options['precision']}{options['suppress']}".encode())
+        return h.hexdigest()
+
+    def up_to_date(self, file_name, output_dir=None):
+        '''
+        :return: True when the report was already generated from the same inputs
+        '''
+        base = os.path.join(REPORT_DIR if output_dir is None else output_dir, file_name)
+        if not os.path.exists(f"{base}.pdf") or not os.path.exists(f"{base}.json"):
+            return False
+        try:
+            with open(f"{base}.json") as f:
+                return json.load(f).get('digest') == self.digest()
+        except (OSError, ValueError):
+            return False
+
+    def exports_missing(self, file_name, output_dir=None):
+        '''
+        :return: True when the pdf exists without its json and npz exports, as in a fresh checkout where only the
+        pdfs are tracked. The exports are then written next to it instead of rebuilding the pdf.
+        '''
+        base = os.path.join(REPORT_DIR if output_dir is None else output_dir, file_name)
+        return os.path.exists(f"{base}.pdf") and not os.path.exists(f"{base}.json")
+
+    @tracer.traced('report')
+    def write(self, file_name, output_dir=None, force=False):
+        '''
+        Write <file_name>.pdf, .json and .npz, unless they are up to date. Only the json and npz are written when the
+        pdf exists without them (see exports_missing).
+        :param file_name: name of the report, without extension
+        :param output_dir: directory of the reports, src/misc/report by default
+        :param force: rebuild the report even if its inputs did not change
+        :return: True if the report was (re)generated
+        '''
+        if not force and self.up_to_date(file_name, output_dir):
+            print(f"Report {file_name} is up to date")
+            return False
+        pdf = force or not self.exports_missing(file_name, output_dir)
+        _write(self.data(), self.digest(), file_name, output_dir, pdf)
+        return True
+
+    @staticmethod
+    @tracer.traced('report')
+    def build_pdf(data, path):
+        # reportlab is only loaded when a report is actually written
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib import colors
+
+        doc = SimpleDocTemplate(path, pagesize=letter)
         elements = []
         styles = getSampleStyleSheet()
 
         # Add matrices A and B in the same row
         elements.append(Paragraph("Matrix A and Matrix B", styles['Title']))
         elements.append(Spacer(1, 12))
-        elements.append(Table([["Matrix A", "Matrix B"], [np.array2string(self.A), np.array2string(self.B)]], style=[
+        elements.append(Table([["Matrix A", "Matrix B"], [np.array2string(data['A']), np.array2string(data['B'])]], style=[
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
         ]))
@@ -35,7 +137,7 @@ class GenerateReport:
         # Add matrices C and D in the same row
         elements.append(Paragraph("Matrix C and Matrix D", styles['Title']))
         elements.append(Spacer(1, 12))
-        elements.append(Table([["Matrix C", "Matrix D"], [np.array2string(self.C), np.array2string(self.D)]], style=[
+        elements.append(Table([["Matrix C", "Matrix D"], [np.array2string(data['C']), np.array2string(data['D'])]], style=[
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
         ]))
@@ -44,7 +146,7 @@ class GenerateReport:
         # Add eigen values
         elements.append(Paragraph("Eigen Values", styles['Title']))
         elements.append(Spacer(1, 12))
-        elements.append(Table([[np.array2string(self.eigen_values)]], style=[
+        elements.append(Table([[np.array2string(data['eigen_values'])]], style=[
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
         ]))
@@ -53,7 +155,7 @@ class GenerateReport:
         # Add damping table
         elements.append(Paragraph("Damping Table", styles['Title']))
         elements.append(Spacer(1, 12))
-        elements.append(Table([[np.array2string(self.damping)]], style=[
+        elements.append(Table([[np.array2string(data['damping'])]], style=[
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
         ]))
@@ -61,6 +163,45 @@ class GenerateReport:
 
         doc.build(elements)
 
-        print("Report generated successfully!")
 
+def _write_with_options(data, digest, file_name, output_dir, pdf, printoptions):
+    # the pdf text depends on the print options of the parent process
+    with np.printoptions(**printoptions):
+        _write(data, digest, file_name, output_dir, pdf)
+
+
+@tracer.traced('report')
+def write_reports(reports, output_dir=None, max_workers=None, force=False):
+    '''
+    Write several reports concurrently on a process pool, skipping the ones whose inputs did not change and only
+    writing the exports of the ones whose pdf exists without them
+    :param reports: list of (GenerateReport, file name) pairs
+    :param output_dir: directory of the reports, src/misc/report by default
+    :param max_workers: number of processes, all the cores by default
+    :param force: rebuild every report even if its inputs did not change
+    :return: names of the reports that were (re)generated
+    '''
+    pending = []
+    for report, file_name in reports:
+        if not force and report.up_to_date(file_name, output_dir):
+            print(f"Report {file_name} is up to date")
+        else:
+            pending.append((report.data(), report.digest(), file_name,
+                            force or not report.exports_missing(file_name, output_dir)))
 
+    # the exports alone are cheap, only the pdf builds go to the process pool
+    for data, digest, file_name, pdf in pending:
+        if not pdf:
+            _write(data, digest, file_name, output_dir, pdf)
+    builds = [(data, digest, file_name) for data, digest, file_name, pdf in pending if pdf]
+    if len(builds) == 1:
+        _write(*builds[0], output_dir)
+    elif builds:
+        printoptions = np.get_printoptions()
+        with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(builds))) as pool:
+            futures = [tracer.submit(pool, _write_with_options, data, digest, file_name, output_dir, True,
+                                     printoptions)
+                       for data, digest, file_name in builds]
+            for future in futures:
+                tracer.result(future)
+    return [file_name for _, _, file_name, _ in pending]
@@ -0,0 +1,165 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    '''
+    Timing spans of the pipeline stages, exported as a Chrome / Perfetto trace (chrome://tracing, ui.perfetto.dev)
+    and summarized per stage (calls, total, self and max time).
+
+    Disabled by default: a traced method then only costs an attribute test, and span() returns a shared null context.
+    '''
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self.stats = {}
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+        self._null = contextlib.nullcontext()
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self.stats = {}
+        self._origin = time.perf_counter_ns()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def _span(self, name, category, args):
+        stack = self._stack()
+        # time spent in the children of the span, subtracted to get its self time
+        stack.append(0)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += duration
+            event = {'name': name, 'cat': category, 'ph': 'X', 'ts': (start - self._origin) / 1000,
+                     'dur': duration / 1000, 'pid': os.getpid(), 'tid': threading.get_ident()}
+            if args:
+                event['args'] = {key: str(value) for key, value in args.items()}
+            self.events.append(event)
+            calls, total, self_time, longest = self.stats.get(name, (0, 0, 0, 0))
+            self.stats[name] = (calls + 1, total + duration, self_time + duration - children, max(longest, duration))
+
+    def span(self, name, category='stage', **args):
+        '''
+        Context manager timing a block
+        :param name: name of the span in the trace and the summary
+        :param category: category of the span (e.g. aircraft, autopilot, report, figure)
+        :param args: extra values shown with the span in the trace viewer
+        '''
+        if not self.enabled:
+            return self._null
+        return self._span(name, category, args)
+
+    def traced(self, category='stage', name=None):
+        '''
+        Decorator timing every call of a function or method
+        :param category: category of the spans
+        :param name: name of the spans, the qualified name of the function by default
+        '''
+        def decorator(function):
+            span_name = function.__qualname__ if name is None else name
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self._span(span_name, category, None):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def submit(self, pool, function, *args, **kwargs):
+        '''
+        pool.submit(function, *args, **kwargs), with the spans of the worker recorded when the tracer is enabled. The
+        worker times on the clock of this process (perf_counter is system wide), so that its spans line up with the
+        ones of the parent under the worker pid/tid.
+        :return: future, to be read with result()
+        '''
+        if not self.enabled:
+            return pool.submit(function, *args, **kwargs)
+        return pool.submit(_traced_call, self._origin, function, *args, **kwargs)
+
+    def result(self, future):
+        '''
+        :param future: future returned by submit
+        :return: result of the function, its worker spans merged into this tracer
+        '''
+        if not self.enabled:
+            return future.result()
+        result, events, stats = future.result()
+        self.merge(events, stats)
+        return result
+
+    def merge(self, events, stats):
+        '''
+        Add spans recorded by another tracer (e.g. in a worker process)
+        '''
+        self.events.extend(events)
+        for name, (calls, total, self_time, longest) in stats.items():
+            c, t, s, m = self.stats.get(name, (0, 0, 0, 0))
+            self.stats[name] = (c + calls, t + total, s + self_time, max(m, longest))
+
+    def export(self, path):
+        '''
+        Write the spans as a Chrome trace JSON file
+        :param path: path of the trace
+        '''
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        print(f"Trace of {len(self.events)} span(s) saved to {path}")
+
+    def summary(self):
+        '''
+        Print the spans grouped by name, the most expensive first
+        :return: dict name -> calls, total, self and max time (ms)
+        '''
+        summary = {name: {'calls': calls, 'total': total / 1e6, 'self': self_time / 1e6, 'max': longest / 1e6}
+                   for name, (calls, total, self_time, longest) in self.stats.items()}
+        print("------------------- Trace summary -------------------")
+        print(f"{'span':<45} {'calls':>6} {'total (ms)':>11} {'self (ms)':>10} {'max (ms)':>10}")
+        for name, s in sorted(summary.items(), key=lambda item: item[1]['total'], reverse=True):
+            print(f"{name:<45} {s['calls']:>6} {s['total']:>11.2f} {s['self']:>10.2f} {s['max']:>10.2f}")
+        return summary
+
+
+tracer = Tracer()
+
+
+def _traced_call(origin, function, *args, **kwargs):
+    '''
+    Run function in a worker process with its tracer enabled on the clock of the parent
+    :param origin: time origin (perf_counter_ns) of the parent tracer
+    :return: result of the function, events and stats of the spans recorded during the call
+    '''
+    tracer.enabled = True
+    tracer.events, tracer.stats = [], {}
+    tracer._origin = origin
+    try:
+        result = function(*args, **kwargs)
+        return result, tracer.events, tracer.stats
+    finally:
+        tracer.enabled = False
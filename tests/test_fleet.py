@@ -0,0 +1,31 @@
+import csv
+import json
+import os
+import shutil
+
+from src.aircraft.registry import registry
+from src.autopilot.fleet import FleetAnalysis, read_fleet
+
+
+def test_malformed_definition_fails_its_row_only(tmp_path):
+    fleet_dir = tmp_path / 'fleet'
+    fleet_dir.mkdir()
+    for name in ('mirage_a', 'mirage_b'):
+        shutil.copy(registry.resolve('params'), fleet_dir / f'{name}.json')
+    (fleet_dir / 'not_params.json').write_text(json.dumps({'x': 1}))
+    (fleet_dir / 'not_json.json').write_text('not json')
+    output_dir = str(tmp_path / 'out')
+
+    fleet = FleetAnalysis(read_fleet(str(fleet_dir)), output_dir)
+    rows = fleet.run(max_workers=1)
+    fleet.summary()
+
+    assert {name: row['status'] for name, row in rows.items()} == {
+        'mirage_a': 'ok', 'mirage_b': 'ok', 'not_params': 'failed', 'not_json': 'failed'}
+    with open(os.path.join(output_dir, 'summary.csv')) as f:
+        assert len(list(csv.DictReader(f))) == 4
+
+    # every aircraft, the failed ones included, is resumed instead of analysed again
+    resumed = FleetAnalysis(read_fleet(str(fleet_dir)), output_dir)
+    assert resumed.run(max_workers=1).keys() == rows.keys()
+    assert all(resumed.rows[name]['elapsed'] == row['elapsed'] for name, row in rows.items())
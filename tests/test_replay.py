@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from src.autopilot.replay import TelemetryLog
+
+
+def test_csv_chunks_match_the_file(tmp_path):
+    data = np.random.default_rng(0).normal(size=(1000, 3))
+    path = tmp_path / 'log.csv'
+    np.savetxt(path, data, delimiter=',', header='a,b,c', comments='')
+
+    chunks = list(TelemetryLog(str(path)).chunks(64, columns=('c', 'a')))
+    assert [len(chunk) for chunk in chunks[:-1]] == [64] * (len(chunks) - 1)
+    assert np.allclose(np.concatenate(chunks), data[:, [2, 0]])
+
+
+@pytest.mark.parametrize('text, message', [
+    ('a,b,c\n1,2,3\n4,5,6\n7,8\n', 'line 4 of .* holds 2 values instead of 3'),
+    ('a,b,c\n1,2,3\n\n4,x,6\n', "line 4 of .* is not numeric: '4,x,6'"),
+])
+def test_malformed_csv_line_is_reported(tmp_path, text, message):
+    path = tmp_path / 'log.csv'
+    path.write_text(text)
+    with pytest.raises(Exception, match=message):
+        list(TelemetryLog(str(path)).chunks(16))
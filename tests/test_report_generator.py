@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+
+from src.misc.report_generator import GenerateReport, write_reports
+
+
+def _report():
+    A = np.diag([-1.0, -2.0])
+    return GenerateReport(A, np.ones((2, 1)), np.eye(2), np.zeros((2, 1)), np.linalg.eigvals(A), [1.0, 1.0], None)
+
+
+def test_existing_pdf_without_exports_is_kept(tmp_path):
+    pdf = tmp_path / 'report.pdf'
+    pdf.write_bytes(b'tracked pdf')
+
+    assert write_reports([(_report(), 'report')], output_dir=str(tmp_path)) == ['report']
+    assert pdf.read_bytes() == b'tracked pdf'
+    assert os.path.exists(tmp_path / 'report.json') and os.path.exists(tmp_path / 'report.npz')
+    assert _report().up_to_date('report', str(tmp_path))
+
+    assert _report().write('report', str(tmp_path), force=True)
+    assert pdf.read_bytes() != b'tracked pdf'
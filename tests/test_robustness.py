@@ -0,0 +1,27 @@
+import contextlib
+import io
+
+import numpy as np
+
+from src.aircraft.aircraft import AircraftStability, StateSpaceModel
+from src.autopilot.autopilot import AutoPilot
+from src.autopilot.robustness import LOOPS, MonteCarlo, loop_characteristics
+
+
+def test_zero_dispersion_sample_is_the_main_pipeline():
+    with contextlib.redirect_stdout(io.StringIO()):
+        aircraft = AircraftStability()
+        aircraft.compute_equilibrium()
+        A, B, C, D, eigen_values = StateSpaceModel(aircraft).model()
+        auto_pilot = AutoPilot(A, B, state_space=True)
+        q = auto_pilot.compute_q_feedback()[:4]
+        gamma = auto_pilot.compute_gamma_feedback(*q)[:4]
+        z = auto_pilot.compute_z_feedback(*gamma)[:4]
+
+    monte_carlo = MonteCarlo(uncertainties={'m': ('normal', 0.0)})
+    results = monte_carlo.evaluate(monte_carlo.sample(1, np.random.default_rng(0)))
+    for loop, system in zip(LOOPS, (q, gamma, z)):
+        damping, frequency, stable = loop_characteristics(system[0][None])
+        assert np.allclose(results[f'{loop}_damping'], damping, rtol=1e-6, atol=1e-9)
+        assert np.allclose(results[f'{loop}_frequency'], frequency, rtol=1e-6)
+        assert np.array_equal(results[f'{loop}_stable'], stable)
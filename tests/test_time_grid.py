@@ -0,0 +1,16 @@
+import numpy as np
+
+from src.flight_dynamics.time_grid import final_value
+
+
+def test_final_value_is_the_dc_gain():
+    A = np.array([[-1.0, 2.0], [-3.0, -4.0]])
+    B, C, D = np.array([[1.0], [0.5]]), np.array([[1.0, 1.0]]), np.array([[0.2]])
+    assert np.allclose(final_value(A, B, C, D), D - C @ np.linalg.solve(A, B))
+
+
+def test_final_value_leaves_out_the_integrators_the_output_does_not_see():
+    # θ integrates q and is not measured: A is singular, the q step response still settles
+    A = np.array([[-2.0, 0.0], [1.0, 0.0]])
+    B, C, D = np.array([[4.0], [0.0]]), np.array([[1.0, 0.0]]), np.zeros((1, 1))
+    assert np.allclose(final_value(A, B, C, D), 2.0)